@@ -0,0 +1,101 @@
+"""Import-time cost of a lambda's module load (the INIT phase of a cold start).
+
+Starts fresh interpreters that import lambda_function with -X importtime and
+reports the wall-clock init time (p50/p95 over --runs) and the slowest
+top-level imports. Run it once per variant to compare, e.g. before and after
+prune_layer.py or a lazy-import change:
+
+    python bench/bench_cold_start.py lambda/embedding-lambda \\
+      --site-packages lambda/embedding-lambda/python/lib/python3.12/site-packages
+
+No database is needed. Use the Lambda runtime's Python for numbers that
+match the REPORT line's Init Duration.
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import common
+
+SHARED_DIR = Path(__file__).resolve().parent.parent / "lambda" / "shared"
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once(function_dir, site_packages, extra_imports):
+    paths = [str(function_dir), str(SHARED_DIR)] + ([str(site_packages)] if site_packages else [])
+    script = f"import sys; sys.path[:0] = {paths!r}; import lambda_function"
+    for name in extra_imports:
+        script += f"; import {name}"
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"Import failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def top_level_imports(importtime_output, extra_imports):
+    """{import: cumulative us} for lambda_function itself, each module it
+    imports directly and the --import modules.
+
+    -X importtime prints children before their parent, indented two spaces
+    per level below the script's own imports.
+    """
+    totals, children = {}, {}
+    for line in importtime_output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        name, cumulative = match.group(4), int(match.group(2))
+        if depth == 1:
+            children[name] = cumulative
+        elif depth == 0:
+            if name == "lambda_function":
+                totals[name] = cumulative
+                totals.update({f"  {child}": us for child, us in children.items()})
+            elif name in extra_imports:
+                totals[name] = cumulative
+            children = {}
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("function_dir", type=Path)
+    parser.add_argument("--site-packages", type=Path, help="vendored layer to put on sys.path")
+    parser.add_argument("--import", dest="extra_imports", action="append", default=[],
+                        help="also import a lazily loaded module (e.g. voyageai) to see its cost")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    run_once(args.function_dir, args.site_packages, args.extra_imports)  # warm the OS file cache
+    timings, outputs = [], []
+    for _ in range(args.runs):
+        elapsed, output = run_once(args.function_dir, args.site_packages, args.extra_imports)
+        timings.append(elapsed)
+        outputs.append(output)
+
+    totals = {}
+    for output in outputs:
+        for name, us in top_level_imports(output, args.extra_imports).items():
+            totals[name] = totals.get(name, 0) + us / len(outputs)
+    slowest = sorted(totals.items(), key=lambda item: -item[1])[:args.top + 1]
+
+    modules = sum(1 for line in outputs[0].splitlines() if IMPORTTIME_LINE.match(line))
+    print(f"{args.function_dir}: {modules} modules imported")
+    print(f"process init p50 {common.percentile(timings, 50):.0f} ms, p95 {common.percentile(timings, 95):.0f} ms "
+          f"(includes ~interpreter startup)")
+    print()
+    print(common.format_table(
+        ["import", "cumulative ms"],
+        [[name, f"{us / 1000:.1f}"] for name, us in slowest]
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""Replays generated API Gateway / Function URL events against the lambda
+handlers and reports throughput, latency percentiles, allocations and peak
+RSS per task, optionally failing on regressions (including more failed
+requests) against a stored baseline.
+
+Handlers are imported from lambda/<function>/lambda_function.py and run
+either in one worker process (one request at a time) or from a process pool
+(warm workers, concurrent requests). Every task gets freshly spawned
+workers, so its peak RSS is not inflated by the tasks before it. Upstreams
+are the local fakes:
+
+    python bench/fake_upstreams.py --latency deepseek=lognormal:800:0.4 &
+    python bench/bench_handlers.py --requests 200 --save-baseline baseline.json
+    python bench/bench_handlers.py --mode pool --workers 8 --baseline baseline.json
+
+--record DIR / --replay DIR switch on archive_common.cassette: record the
+upstream responses (and timings) of a run, or serve a recording back, e.g.
+one captured from deployed functions with HTTP_CASSETTE_MODE=record.
+
+The functions' own dependencies must be importable, e.g.
+    pip install -r lambda/deepseek-call/requirements.txt -r lambda/embedding-lambda/requirements.txt
+
+Tasks: query_parser, quick_insight, analysis (deepseek-analysis),
+search_only, rag_chat (deepseek-call), embedding (embedding-lambda),
+compression (data-compression).
+"""
+import argparse
+import base64
+import contextlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import common
+
+LAMBDA_DIR = Path(__file__).resolve().parent.parent / "lambda"
+sys.path.insert(0, str(LAMBDA_DIR / "shared"))
+
+KOREAN = "오늘은 친구들과 한강에서 자전거를 타고 저녁에는 새로운 식당에서 밥을 먹었다. "
+TAGS = ["운동", "친구", "맛집", "공부", "여행", "가족"]
+USER_COUNT = 20
+
+
+def fake_token(user_id):
+    """Unsigned JWT-shaped token; the fakes only read its claims."""
+    def part(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+    claims = {"sub": user_id, "role": "authenticated", "aud": "authenticated", "exp": int(time.time()) + 86400}
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part(claims)}.fake"
+
+
+def use_fakes(host, deepseek_port, voyage_port, supabase_port):
+    os.environ.update({
+        "SUPABASE_URL": f"{host}:{supabase_port}",
+        "SUPABASE_KEY": fake_token("service_role"),
+        "DEEPSEEK_BASE_URL": f"{host}:{deepseek_port}",
+        "DEEPSEEK_API_KEY": "fake",
+        "VOYAGE_BASE_URL": f"{host}:{voyage_port}/v1",
+        "VOYAGE_KEY": "fake",
+    })
+
+
+def random_board(rng, user_id):
+    return {
+        "board_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_id": user_id,
+        "description": KOREAN * rng.randint(1, 6),
+        "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "tags": [{"tag_name": t} for t in rng.sample(TAGS, 2)],
+    }
+
+
+def proxy_event(body, user_id, path):
+    """REST API proxy integration event (authorizer context included)."""
+    token = fake_token(user_id)
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": "POST",
+        "headers": {"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        "requestContext": {
+            "requestId": str(uuid.uuid4()),
+            "stage": "prod",
+            "authorizer": {"principalId": user_id, "userId": user_id},
+        },
+        "body": json.dumps(body, ensure_ascii=False),
+        "isBase64Encoded": False,
+    }
+
+
+def function_url_event(body, path):
+    """Lambda Function URL (HTTP API v2) event."""
+    return {
+        "version": "2.0",
+        "rawPath": path,
+        "headers": {"content-type": "application/json"},
+        "requestContext": {"requestId": str(uuid.uuid4()), "http": {"method": "POST", "path": path}},
+        "body": json.dumps(body, ensure_ascii=False),
+        "isBase64Encoded": False,
+    }
+
+
+def direct_event(fields, user_id):
+    """deepseek-call reads its fields from the event (mapping template)."""
+    return {**fields, "user_id": user_id, "access_token": fake_token(user_id), "refresh_token": "fake-refresh"}
+
+
+def query_parser_event(rng, user_id):
+    return function_url_event({
+        "task": "query_parser",
+        "query": rng.choice(["지난주 운동 기록 보여줘", "최근 5개 맛집", "주말에 뭐했지?", "show my study boards"]),
+        "current_date": "2025-06-01",
+    }, "/analysis")
+
+
+def quick_insight_event(rng, user_id):
+    return function_url_event({
+        "task": "quick_insight",
+        "target_board": random_board(rng, user_id),
+        "related_boards": [random_board(rng, user_id) for _ in range(5)],
+        "stats": {"total_boards": rng.randint(10, 500)},
+        "history": KOREAN * 4,
+        "cache": False,
+    }, "/analysis")
+
+
+def analysis_event(rng, user_id):
+    return function_url_event({
+        "task": "analysis",
+        "boards": [random_board(rng, user_id) for _ in range(rng.randint(5, 30))],
+        "history": KOREAN * 10,
+        "metrics": [{"label": "연속 기록", "value": rng.randint(1, 30)}],
+        "cache": False,
+    }, "/analysis")
+
+
+def search_only_event(rng, user_id):
+    return direct_event({"task": "search_only", "query": KOREAN[:rng.randint(10, 40)]}, user_id)
+
+
+def rag_chat_event(rng, user_id):
+    turns = rng.randint(1, 6)
+    messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": KOREAN * rng.randint(1, 3)}
+                for i in range(2 * turns - 1)]
+    return direct_event({"query": messages, "model": "deepseek-chat", "cache": False}, user_id)
+
+
+def embedding_event(rng, user_id):
+    board = random_board(rng, user_id)
+    board["tags"] = [t["tag_name"] for t in board["tags"]]
+    return proxy_event(board, user_id, "/boards/vectorize")
+
+
+def compression_event(rng, user_id):
+    return proxy_event({"boards": [random_board(rng, user_id) for _ in range(rng.randint(3, 15))]},
+                       user_id, "/compression")
+
+
+TASKS = {
+    "query_parser": ("deepseek-analysis", query_parser_event),
+    "quick_insight": ("deepseek-analysis", quick_insight_event),
+    "analysis": ("deepseek-analysis", analysis_event),
+    "search_only": ("deepseek-call", search_only_event),
+    "rag_chat": ("deepseek-call", rag_chat_event),
+    "embedding": ("embedding-lambda", embedding_event),
+    "compression": ("data-compression", compression_event),
+}
+
+_handlers = {}
+
+
+def load_handler(function):
+    """Import lambda/<function>/lambda_function.py under its own module name."""
+    if function not in _handlers:
+        path = LAMBDA_DIR / function / "lambda_function.py"
+        spec = importlib.util.spec_from_file_location(f"{function.replace('-', '_')}_handler", path)
+        module = importlib.util.module_from_spec(spec)
+        with quiet():
+            spec.loader.exec_module(module)
+        _handlers[function] = module.lambda_handler
+    return _handlers[function]
+
+
+class FakeContext:
+    function_name = "bench"
+    memory_limit_in_mb = 1024
+    aws_request_id = "bench"
+
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discard handler prints and log records."""
+    import logging
+    sink = io.StringIO()
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def invoke(task, seed):
+    """Run one request; returns (seconds, status code or exception name, peak RSS KB)."""
+    function, make_event = TASKS[task]
+    handler = load_handler(function)
+    rng = random.Random(seed)
+    event = make_event(rng, f"00000000-0000-0000-0000-{rng.randrange(USER_COUNT):012d}")
+    start = time.perf_counter()
+    try:
+        with quiet():
+            response = handler(event, FakeContext())
+        status = response.get("statusCode", 200) if isinstance(response, dict) else 200
+    except Exception as e:
+        status = type(e).__name__
+    elapsed = time.perf_counter() - start
+    return elapsed, status, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_allocations(task, samples, seed):
+    """Median peak traced allocation of one warm request, in bytes."""
+    if samples <= 0:
+        return None
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            invoke(task, seed + i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return common.percentile(peaks, 50)
+
+
+def _init_worker(task, env, preload):
+    os.environ.update(env)
+    if preload:
+        load_handler(TASKS[task][0])
+
+
+def worker_pool(task, workers, preload):
+    """Spawned (not forked) workers: a forked child's ru_maxrss starts at the
+    parent's peak."""
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(task, dict(os.environ), preload))
+
+
+def run_sequential(task, seeds, warmup, alloc_samples, alloc_seed):
+    start = time.perf_counter()
+    invoke(task, seeds[0])
+    first = time.perf_counter() - start  # includes importing the handler
+    for seed in seeds[1:warmup]:
+        invoke(task, seed)
+    wall_start = time.perf_counter()
+    results = [invoke(task, seed) for seed in seeds[warmup:]]
+    wall = time.perf_counter() - wall_start
+    return first, results, wall, measure_allocations(task, alloc_samples, alloc_seed)
+
+
+def run_task(task, args):
+    seeds = [args.seed * 1_000_003 + i for i in range(args.warmup + args.requests)]
+    if args.mode == "inprocess":
+        with worker_pool(task, 1, preload=False) as pool:
+            first, results, wall, alloc = pool.submit(
+                run_sequential, task, seeds, args.warmup, args.alloc_samples, args.seed
+            ).result()
+    else:
+        with worker_pool(task, args.workers, preload=True) as pool:
+            first = pool.submit(invoke, task, seeds[0]).result()[0]
+            list(pool.map(invoke, [task] * (args.warmup - 1), seeds[1:args.warmup]))
+            wall_start = time.perf_counter()
+            results = list(pool.map(invoke, [task] * args.requests, seeds[args.warmup:]))
+            wall = time.perf_counter() - wall_start
+        alloc = None
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in results]
+    errors = [status for _, status, _ in results if not (isinstance(status, int) and status < 400)]
+    return {
+        "rps": len(results) / wall,
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99),
+        "first_ms": first * 1000,
+        "alloc_peak_bytes": alloc,
+        "rss_peak_bytes": max(rss for _, _, rss in results) * 1024,
+        "errors": len(errors),
+        "error_sample": sorted(set(map(str, errors)))[:3],
+    }
+
+
+# (metric, direction): a regression is a move in the bad direction by more
+# than the tolerance
+COMPARED = [("p50_ms", 1), ("p95_ms", 1), ("p99_ms", 1), ("rps", -1), ("alloc_peak_bytes", 1), ("rss_peak_bytes", 1)]
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for task, current in results.items():
+        previous = baseline.get(task)
+        if not previous:
+            continue
+        # Any extra failed request is a regression; failures are also fast,
+        # so they would otherwise improve the latency numbers
+        old_errors, new_errors = previous.get("errors", 0), current["errors"]
+        if new_errors > old_errors:
+            change = (new_errors - old_errors) / old_errors if old_errors else float("inf")
+            found.append((task, "errors", old_errors, new_errors, change))
+        for metric, direction in COMPARED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction > tolerance:
+                found.append((task, metric, old, new, change))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", default=",".join(TASKS), help="comma-separated subset of tasks")
+    parser.add_argument("--mode", choices=["inprocess", "pool"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=4, help="process pool size (--mode pool)")
+    parser.add_argument("--requests", type=int, default=100, help="measured requests per task")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per task (first one is reported)")
+    parser.add_argument("--alloc-samples", type=int, default=20,
+                        help="requests traced with tracemalloc per task (in-process only, 0 disables)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fakes-host", default="http://127.0.0.1")
+    parser.add_argument("--fake-ports", default="8101,8102,8103", help="deepseek,voyage,supabase")
+    parser.add_argument("--no-fakes", action="store_true", help="use the upstream settings already in the environment")
+    parser.add_argument("--record", metavar="DIR", help="record upstream responses to DIR (HTTP_CASSETTE_MODE=record)")
+    parser.add_argument("--replay", metavar="DIR", help="serve recorded responses from DIR instead of the fakes")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="multiplier for recorded durations, 0 = none")
+    parser.add_argument("--baseline", help="JSON results to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change before failing")
+    parser.add_argument("--save-baseline", help="write these results as a baseline")
+    args = parser.parse_args()
+    args.warmup = max(1, args.warmup)
+
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = [t for t in tasks if t not in TASKS]
+    if unknown:
+        parser.error(f"unknown tasks: {', '.join(unknown)}")
+    if not args.no_fakes:
+        use_fakes(args.fakes_host, *args.fake_ports.split(","))
+    if args.record or args.replay:
+        os.environ.update({
+            "HTTP_CASSETTE_MODE": "record" if args.record else "replay",
+            "HTTP_CASSETTE_DIR": args.record or args.replay,
+            "HTTP_CASSETTE_SPEED": str(args.replay_speed),
+        })
+
+    results = {}
+    for task in tasks:
+        print(f"{task}: {args.requests} requests ({args.mode})...", flush=True)
+        results[task] = run_task(task, args)
+        if results[task]["errors"]:
+            print(f"  {results[task]['errors']} failed requests, e.g. {results[task]['error_sample']}")
+
+    rows = [[
+        task, f"{r['rps']:.1f}", f"{r['p50_ms']:.1f}", f"{r['p95_ms']:.1f}", f"{r['p99_ms']:.1f}",
+        f"{r['first_ms']:.0f}",
+        common.format_bytes(r["alloc_peak_bytes"]) if r["alloc_peak_bytes"] is not None else "-",
+        common.format_bytes(r["rss_peak_bytes"]), r["errors"],
+    ] for task, r in results.items()]
+    print()
+    print(common.format_table(
+        ["task", "req/s", "p50 ms", "p95 ms", "p99 ms", "first ms", "alloc/req", "peak RSS", "errors"], rows))
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2))
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        found = regressions(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if found:
+            print(f"\nRegressions (> {args.tolerance:.0%}) against {args.baseline}:")
+            print(common.format_table(["task", "metric", "baseline", "current", "change"], [
+                [task, metric, f"{old:.1f}", f"{new:.1f}", f"{change:+.0%}"]
+                for task, metric, old, new, change in found
+            ]))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
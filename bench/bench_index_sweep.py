@@ -0,0 +1,233 @@
+"""Index parameter sweep for the board search path.
+
+For each per-user corpus size, loads a synthetic corpus (generate_corpus.py)
+into a scratch schema and measures match_boards with no vector index
+(exact: user_id btree + sort), HNSW for each m / ef_construction / ef_search
+and IVFFlat for each lists / probes, at each concurrency level. Reports
+recall@k against the exact results, p50/p95 latency, throughput, index build
+time and size, and which plan Postgres picked: with the user_id filter it
+often prefers the btree over the ANN index for small per-user corpora, and an
+ANN scan that filters afterwards can return fewer than k rows. The plan is
+the one match_boards' own query ran with once PL/pgSQL's plan cache has
+settled, logged by auto_explain, so loading auto_explain needs a superuser
+(the plan column reads "unknown" otherwise).
+
+    python bench/bench_index_sweep.py --users 50 --sizes 200,2000,20000 --concurrency 1,8
+    python bench/bench_index_sweep.py --hnsw-m 16,32 --hnsw-ef-search 40,100,200 --csv sweep.csv
+
+--iterative-scan relaxed_order additionally runs the ANN configurations
+with pgvector >= 0.8 iterative index scans, which keep scanning until the
+user filter yields k rows.
+"""
+import argparse
+import csv
+import json
+import time
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import common
+import generate_corpus
+
+SCHEMA = "bench_index_sweep"
+INDEX_NAME = "board_vector_sweep_idx"
+SEARCH_SQL = "SELECT board_id FROM match_boards(%s::vector, %s::uuid, 0.0, %s)"
+# Sends the plans of statements run inside match_boards to the client
+AUTO_EXPLAIN_SETTINGS = [
+    "LOAD 'auto_explain'",
+    "SET auto_explain.log_min_duration = 0",
+    "SET auto_explain.log_nested_statements = on",
+    "SET auto_explain.log_level = notice",
+]
+# PL/pgSQL may switch to a generic plan after 5 executions of a statement
+PLAN_CACHE_EXECUTIONS = 6
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def load_corpus(args, boards_per_user):
+    conn = common.connect(args.database_url)
+    common.reset_schema(conn, SCHEMA)
+    common.create_board_table(conn)
+    conn.execute("DROP INDEX board_user_id_idx")
+    corpus_args = Namespace(
+        database_url=args.database_url, schema=SCHEMA, boards_per_user=boards_per_user, count_sigma=0.0,
+        topic_concentration=0.5, spread=0.35, user_shift=0.3, image_rate=0.35,
+        end_date="2025-06-30", span_days=730, seed=args.seed,
+    )
+    generate_corpus.load_users(corpus_args, 0, args.users)
+    conn.execute("CREATE INDEX board_user_id_idx ON board (user_id)")
+    conn.execute("ANALYZE board")
+    common.apply_sql(conn, "match_boards.sql")
+    return conn
+
+
+def make_queries(conn, args, rng):
+    """(user_id, query vector) pairs near a random board of a random user."""
+    queries = []
+    for _ in range(args.queries):
+        user_id = f"00000000-0000-0000-0000-{rng.integers(args.users):012d}"
+        text = conn.execute(
+            "SELECT vector::text FROM board WHERE user_id = %s ORDER BY random() LIMIT 1", (user_id,)
+        ).fetchone()[0]
+        base = np.array(json.loads(text), dtype=np.float32)
+        query = base + 0.3 * rng.standard_normal(common.DIM).astype(np.float32) / np.sqrt(common.DIM)
+        queries.append((user_id, common.vector_literal(query)))
+    return queries
+
+
+def run_queries(args, settings, queries, concurrency):
+    """Returns (latencies ms, results per query, wall seconds)."""
+    def worker(indexes):
+        conn = common.connect(args.database_url)
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        for statement in settings:
+            conn.execute(statement)
+        for i in indexes[:5]:  # warm up
+            conn.execute(SEARCH_SQL, (queries[i][1], queries[i][0], args.k)).fetchall()
+        timings = []
+        for i in indexes:
+            started = time.perf_counter()
+            rows = conn.execute(SEARCH_SQL, (queries[i][1], queries[i][0], args.k)).fetchall()
+            timings.append((i, (time.perf_counter() - started) * 1000, [row[0] for row in rows]))
+        conn.close()
+        return timings
+
+    chunks = [list(range(start, len(queries), concurrency)) for start in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = [t for chunk in pool.map(worker, chunks) for t in chunk]
+    wall = time.perf_counter() - started
+    timings.sort()
+    return [t[1] for t in timings], [t[2] for t in timings], wall
+
+
+def chosen_plan(args, settings, query):
+    """"ann" or "exact" for the plan match_boards ran its query with, as the
+    benchmark connections see it after warm-up; "unknown" without
+    auto_explain."""
+    import psycopg
+    conn = common.connect(args.database_url)
+    try:
+        conn.execute(f"SET search_path TO {SCHEMA}, public")
+        for statement in settings:
+            conn.execute(statement)
+        try:
+            for statement in AUTO_EXPLAIN_SETTINGS:
+                conn.execute(statement)
+        except psycopg.Error as e:
+            print(f"  auto_explain unavailable, plan not reported: {str(e).strip()}")
+            return "unknown"
+        for _ in range(PLAN_CACHE_EXECUTIONS - 1):
+            conn.execute(SEARCH_SQL, (query[1], query[0], args.k)).fetchall()
+        notices = []
+        conn.add_notice_handler(lambda diagnostic: notices.append(diagnostic.message_primary or ""))
+        conn.execute(SEARCH_SQL, (query[1], query[0], args.k)).fetchall()
+    finally:
+        conn.close()
+    return "ann" if any(INDEX_NAME in notice for notice in notices) else "exact"
+
+
+def recall_at_k(results, truth):
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def configurations(args, rows):
+    """(index kind, CREATE INDEX sql or None, [(params label, SET statements)])."""
+    iterative = [None] + ([args.iterative_scan] if args.iterative_scan else [])
+    configs = [("exact", None, [("-", [])])]
+    for m in args.hnsw_m:
+        for ef_construction in args.hnsw_ef_construction:
+            create = (f"CREATE INDEX {INDEX_NAME} ON board USING hnsw (vector vector_cosine_ops) "
+                      f"WITH (m = {m}, ef_construction = {ef_construction})")
+            searches = [
+                (f"m={m} efc={ef_construction} ef={ef}" + (f" {mode}" if mode else ""),
+                 [f"SET hnsw.ef_search = {ef}"] + ([f"SET hnsw.iterative_scan = {mode}"] if mode else []))
+                for ef in args.hnsw_ef_search for mode in iterative
+            ]
+            configs.append(("hnsw", create, searches))
+    for lists in args.ivf_lists:
+        lists = lists or max(1, int(np.sqrt(rows)))  # 0 = sqrt(rows)
+        create = f"CREATE INDEX {INDEX_NAME} ON board USING ivfflat (vector vector_cosine_ops) WITH (lists = {lists})"
+        searches = [
+            # ivfflat only supports relaxed_order
+            (f"lists={lists} probes={probes}" + (" relaxed_order" if mode else ""),
+             [f"SET ivfflat.probes = {probes}"] + (["SET ivfflat.iterative_scan = relaxed_order"] if mode else []))
+            for probes in args.ivf_probes if probes <= lists for mode in iterative
+        ]
+        configs.append(("ivfflat", create, searches))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=common.DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sizes", type=int_list, default=[100, 1000, 10000], help="boards per user to sweep")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8])
+    parser.add_argument("--hnsw-m", type=int_list, default=[16, 32])
+    parser.add_argument("--hnsw-ef-construction", type=int_list, default=[64, 128])
+    parser.add_argument("--hnsw-ef-search", type=int_list, default=[40, 100, 200])
+    parser.add_argument("--ivf-lists", type=int_list, default=[0], help="0 = sqrt(total rows)")
+    parser.add_argument("--ivf-probes", type=int_list, default=[1, 10, 40])
+    parser.add_argument("--iterative-scan", choices=["relaxed_order", "strict_order"],
+                        help="also run ANN configs with this iterative scan mode (pgvector >= 0.8)")
+    parser.add_argument("--csv", help="also write every result row to this CSV file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    headers = ["per user", "index", "params", "build s", "size", "conc", "qps", "p50 ms", "p95 ms",
+               f"recall@{args.k}", "plan"]
+    all_rows = []
+    for size in args.sizes:
+        print(f"\nLoading {args.users} users x {size} boards...", flush=True)
+        conn = load_corpus(args, size)
+        queries = make_queries(conn, args, rng)
+        _, truth, _ = run_queries(args, [], queries, 1)
+
+        rows = []
+        for kind, create, searches in configurations(args, args.users * size):
+            build_seconds, index_size = 0.0, None
+            if create:
+                print(f"  building {kind}: {create.split('WITH')[1].strip()}", flush=True)
+                started = time.perf_counter()
+                conn.execute(create)
+                build_seconds = time.perf_counter() - started
+                index_size = common.relation_size(conn, INDEX_NAME)
+            for label, settings in searches:
+                plan = chosen_plan(args, settings, queries[0])
+                for concurrency in args.concurrency:
+                    latencies, results, wall = run_queries(args, settings, queries, concurrency)
+                    rows.append([
+                        size, kind, label, f"{build_seconds:.1f}",
+                        common.format_bytes(index_size) if index_size is not None else "-",
+                        concurrency, f"{len(queries) / wall:.0f}",
+                        f"{common.percentile(latencies, 50):.2f}", f"{common.percentile(latencies, 95):.2f}",
+                        f"{recall_at_k(results, truth):.3f}", plan,
+                    ])
+            if create:
+                conn.execute(f"DROP INDEX {INDEX_NAME}")
+        print()
+        print(common.format_table(headers, rows))
+        all_rows.extend(rows)
+        conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.close()
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(all_rows)
+        print(f"\nWrote {len(all_rows)} rows to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Per-request logging and JSON overhead: the old full-event/full-payload
+prints vs archive_common.log (summary + sampled, redacted, capped fields)
+and archive_common.jsoncodec (orjson when installed).
+
+Output is captured in memory, so the numbers are CPU time plus the bytes a
+request would send to CloudWatch. No database is needed.
+
+    python bench/bench_logging.py --boards 20 --iterations 2000
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import common
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda" / "shared"))
+from archive_common import jsoncodec  # noqa: E402
+from archive_common.log import log_event, log_fields  # noqa: E402
+
+KOREAN = "오늘은 친구들과 한강에서 자전거를 타고 저녁에는 새로운 식당에서 밥을 먹었다. "
+
+
+def sample_request(boards):
+    """A deepseek-call request and what it logs/returns (tokens, chat history,
+    matched boards, completion)."""
+    rng = random.Random(7)
+    event = {
+        "access_token": "eyJ" + "a" * 900,
+        "refresh_token": "r" * 40,
+        "user_id": "00000000-0000-0000-0000-000000000001",
+        "model": "deepseek-chat",
+        "query": [{"role": "user" if i % 2 == 0 else "assistant", "content": KOREAN * 3} for i in range(10)],
+    }
+    relevant_boards = [{
+        "board_id": f"00000000-0000-0000-0000-{i:012d}",
+        "user_id": event["user_id"],
+        "description": KOREAN * rng.randint(1, 6),
+        "date": "2025-01-01",
+        "tags": ["운동", "친구", "맛집"],
+        "similarity": rng.random(),
+    } for i in range(boards)]
+    boards_dict = {f"board{i + 1}": b for i, b in enumerate(relevant_boards)}
+    completion = {
+        "id": "chatcmpl-1", "model": "deepseek-chat",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": KOREAN * 20}}],
+        "usage": {"prompt_tokens": 2400, "completion_tokens": 600},
+    }
+    return event, boards_dict, completion
+
+
+def old_path(event, boards_dict, completion, body):
+    json.loads(body)
+    print(f"Received event: {json.dumps(event)}")
+    print(f"Boards JSON: {json.dumps(boards_dict)}")
+    print(f"Response: {completion['choices'][0]['message']['content']}")
+    return json.dumps(completion)
+
+
+def new_path(event, boards_dict, completion, body):
+    jsoncodec.loads(body)
+    log_event(event)
+    log_fields("boards", count=len(boards_dict), dates=[b["date"] for b in boards_dict.values()])
+    log_fields("boards_sample", sampled_only=True, boards=boards_dict)
+    log_fields("completion", content=completion['choices'][0]['message']['content'], usage=completion.get('usage'))
+    return jsoncodec.dumps(completion)
+
+
+def measure(fn, args, iterations):
+    latencies, written = [], 0
+    for _ in range(iterations):
+        sink = io.StringIO()
+        with contextlib.redirect_stdout(sink):
+            started = time.perf_counter()
+            fn(*args)
+            latencies.append((time.perf_counter() - started) * 1e6)
+        written += len(sink.getvalue().encode("utf-8"))
+    return latencies, written / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boards", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    event, boards_dict, completion = sample_request(args.boards)
+    body = json.dumps(event)
+    request = (event, boards_dict, completion, body)
+
+    rows = []
+    for name, fn in [("full prints + json", old_path), ("archive_common.log + jsoncodec", new_path)]:
+        measure(fn, request, 50)  # warm up
+        latencies, written = measure(fn, request, args.iterations)
+        rows.append([
+            name,
+            f"{common.percentile(latencies, 50):.0f}",
+            f"{common.percentile(latencies, 95):.0f}",
+            common.format_bytes(int(written)),
+        ])
+
+    print(f"JSON codec: {'orjson' if jsoncodec.orjson is not None else 'stdlib json (orjson not installed)'}")
+    print()
+    print(common.format_table(["path", "p50 us", "p95 us", "log bytes/request"], rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""Memory sizing for the lambdas: peak memory per phase and a recommended
+Lambda memory setting.
+
+Each function is loaded in a fresh process and run over payload variants
+(small / typical / large boards lists, text-only and image boards) against
+fake_upstreams.py. Per variant it reports:
+
+  - CPU and wall time per request, measured without tracing overhead;
+  - peak traced Python allocations (tracemalloc) and peak RSS (sampled from
+    /proc/self/statm every --rss-interval-ms) per phase: the handler as a
+    whole and the calls inside it that hold the big objects: upstream HTTP
+    calls including response bodies, JSON encode/decode, image decode and
+    the function's own helpers (load_image, embed_boards, cache_get, ...).
+
+Phases nest, so a phase's peak includes the phases inside it. Images for the
+image variants are served from this process as PNGs (a phone photo decodes
+to 36 MB of RGB whatever its file size).
+
+The estimated "Max Memory Used" of a function is --runtime-mb (what
+CloudWatch reports for a no-op Python handler) plus what importing the
+handler and its worst request added to RSS. With --headroom on top it picks,
+among --memory-sizes:
+
+  cheapest  lowest cost per request;
+  balanced  smallest size whose modelled duration is within --latency-slack
+            (or --latency-slack-ms, whichever is larger) of the duration with
+            a full vCPU.
+
+Lambda allocates CPU in proportion to memory (one vCPU at 1769 MB), so the
+model stretches a request's CPU time by 1769 / memory below that and keeps
+its I/O wait as measured. --cpu-factor scales local CPU time to Lambda's
+(e.g. 1.3 when this machine is faster).
+
+    python bench/fake_upstreams.py --latency deepseek=lognormal:800:0.4 &
+    python bench/bench_memory.py
+    python bench/bench_memory.py --functions embedding-lambda --image-sizes 1024x768,4000x3000 --arch arm64
+"""
+import argparse
+import functools
+import importlib
+import inspect
+import math
+import multiprocessing
+import os
+import random
+import resource
+import struct
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common
+import bench_handlers
+from bench_handlers import KOREAN, direct_event, function_url_event, proxy_event, random_board
+
+# Lambda pricing (us-east-1) per GB-second and per request
+GB_SECOND_PRICE = {"x86_64": 0.0000166667, "arm64": 0.0000133334}
+REQUEST_PRICE = 0.20 / 1_000_000
+FULL_VCPU_MB = 1769
+MEMORY_SIZES = [128, 256, 384, 512, 768, 1024, 1536, 1769, 2048, 3008]
+
+# Helpers in each handler module wrapped as phases (module globals, so the
+# names the handler actually calls)
+FUNCTION_PHASES = {
+    "embedding-lambda": ["load_image", "embed_boards", "encode_vector", "pregenerate_insight",
+                         "enqueue_embedding", "board_content_hash"],
+    "deepseek-analysis": ["cache_get", "cache_put", "store_board_insight"],
+    "deepseek-call": ["authenticated_user_id", "semantic_cache_lookup", "semantic_cache_store"],
+    "data-compression": [],
+}
+# Library calls wrapped as phases in every function: (module, attribute path, label)
+LIBRARY_PHASES = [
+    ("requests.adapters", "HTTPAdapter.send", "http (requests)"),
+    ("requests.models", "Response.json", "parse response"),
+    ("httpx", "HTTPTransport.handle_request", "http (httpx)"),
+    ("archive_common.jsoncodec", "loads", "json decode"),
+    ("archive_common.jsoncodec", "dumps", "json encode"),
+    ("PIL.ImageFile", "ImageFile.load", "image decode"),
+]
+
+
+def boards(rng, user_id, count):
+    return [random_board(rng, user_id) for _ in range(count)]
+
+
+def embedding_variant(image_url):
+    def make(rng, user_id):
+        board = random_board(rng, user_id)
+        board["tags"] = [t["tag_name"] for t in board["tags"]]
+        if image_url:
+            board["image"] = image_url
+        return proxy_event(board, user_id, "/boards/vectorize")
+    return make
+
+
+def compression_variant(count):
+    return lambda rng, user_id: proxy_event({"boards": boards(rng, user_id, count)}, user_id, "/compression")
+
+
+def analysis_variant(count):
+    return lambda rng, user_id: function_url_event({
+        "task": "analysis", "boards": boards(rng, user_id, count), "history": KOREAN * 10,
+        "metrics": [{"label": "연속 기록", "value": 7}], "cache": False,
+    }, "/analysis")
+
+
+def quick_insight_variant(related):
+    return lambda rng, user_id: function_url_event({
+        "task": "quick_insight", "target_board": random_board(rng, user_id),
+        "related_boards": boards(rng, user_id, related), "stats": {"total_boards": 120},
+        "history": KOREAN * 4, "cache": False,
+    }, "/analysis")
+
+
+def rag_chat_variant(turns):
+    def make(rng, user_id):
+        messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": KOREAN * 2}
+                    for i in range(2 * turns - 1)]
+        return direct_event({"query": messages, "model": "deepseek-chat", "cache": False}, user_id)
+    return make
+
+
+def variants(function, args, image_base):
+    """[(label, event factory)] per function."""
+    if function == "embedding-lambda":
+        return [("text", embedding_variant(None))] + [
+            (f"image {size}", embedding_variant(f"{image_base}/{size}.png")) for size in args.image_sizes
+        ]
+    if function == "data-compression":
+        return [(f"{n} boards", compression_variant(n)) for n in args.board_counts]
+    if function == "deepseek-analysis":
+        return ([("query_parser", bench_handlers.query_parser_event), ("quick_insight 5", quick_insight_variant(5)),
+                 ("quick_insight 20", quick_insight_variant(20))]
+                + [(f"analysis {n} boards", analysis_variant(n)) for n in args.board_counts])
+    if function == "deepseek-call":
+        return [("search_only", bench_handlers.search_only_event)] + [
+            (f"rag_chat {t} turns", rag_chat_variant(t)) for t in (1, 5, 20)
+        ]
+    raise ValueError(f"Unknown function: {function}")
+
+
+def png_bytes(width, height):
+    """An RGB PNG of noisy gradient bands: decodes to width x height x 3
+    bytes like a photo and is about as large as a phone's JPEG."""
+    rng = random.Random(width * height)
+    row_bytes = width * 3
+    noise = rng.randbytes(4096)
+    noise = noise * (row_bytes // 4096 + 2)
+    base = int.from_bytes(bytes(x * 255 // max(1, row_bytes - 1) for x in range(row_bytes)), "big")
+    mask = int.from_bytes(b"\x0f" * row_bytes, "big")
+    rows = []
+    for y in range(height):
+        offset = (y // 8 * 37) % 4096  # rows repeat in bands, like smooth areas
+        tint = int.from_bytes(noise[offset:offset + row_bytes], "big") & mask
+        rows.append(b"\x00" + (base ^ tint).to_bytes(row_bytes, "big"))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+
+def serve_images(sizes):
+    """Serves /<W>x<H>.png on a free local port; returns its base URL."""
+    images = {}
+    for size in sizes:
+        width, height = (int(v) for v in size.split("x"))
+        images[f"/{size}.png"] = png_bytes(width, height)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            data = images.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # No /proc (macOS): high-water mark only, in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PhaseRecorder:
+    """Peak traced memory (relative to the request start) and peak RSS of
+    every phase on the stack while it runs."""
+
+    def __init__(self, rss_interval):
+        self.rss_interval = rss_interval
+        self.stack = []
+        self.traced = {}
+        self.rss = {}
+        self.active = False
+
+    def _note_traced(self):
+        peak = tracemalloc.get_traced_memory()[1] - self.base
+        for name in self.stack:
+            self.traced[name] = max(self.traced.get(name, 0), peak)
+        tracemalloc.reset_peak()
+
+    def enter(self, name):
+        self._note_traced()
+        self.stack = self.stack + [name]
+
+    def exit(self):
+        self._note_traced()
+        self.stack = self.stack[:-1]
+
+    def _sample(self, stop):
+        while not stop.wait(self.rss_interval):
+            rss, stack = current_rss(), self.stack
+            for name in stack:
+                self.rss[name] = max(self.rss.get(name, 0), rss)
+
+    def run(self, call):
+        self.traced, self.rss = {}, {}
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(stop,), daemon=True)
+        tracemalloc.start()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.active = True
+        sampler.start()
+        try:
+            self.enter("handler")
+            try:
+                call()
+            finally:
+                self.exit()
+        finally:
+            self.active = False
+            stop.set()
+            sampler.join()
+            tracemalloc.stop()
+        self.rss["handler"] = max(self.rss.get("handler", 0), current_rss())
+        return self.traced, self.rss
+
+
+def phase_wrapper(recorder, original, label):
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        if not recorder.active:
+            return original(*args, **kwargs)
+        recorder.enter(label)
+        try:
+            return original(*args, **kwargs)
+        finally:
+            recorder.exit()
+    return wrapper
+
+
+def instrument(recorder, function, handler):
+    namespace = inspect.unwrap(handler).__globals__  # the handler module's globals
+    for name in FUNCTION_PHASES[function]:
+        if callable(namespace.get(name)):
+            namespace[name] = phase_wrapper(recorder, namespace[name], name)
+    for module_name, path, label in LIBRARY_PHASES:
+        try:
+            owner = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        *owners, attribute = path.split(".")
+        for part in owners:
+            owner = getattr(owner, part)
+        setattr(owner, attribute, phase_wrapper(recorder, getattr(owner, attribute), label))
+
+
+def profile_function(function, args, image_base, env):
+    """Runs in a fresh process; returns the function's measurements."""
+    os.environ.update(env)
+    rss_before_import = current_rss()
+    started = time.perf_counter()
+    handler = bench_handlers.load_handler(function)
+    import_ms = (time.perf_counter() - started) * 1000
+    rss_after_import = current_rss()
+    recorder = PhaseRecorder(args.rss_interval_ms / 1000)
+    instrument(recorder, function, handler)
+
+    results = []
+    for label, make_event in variants(function, args, image_base):
+        rng = random.Random(args.seed)
+        user_id = f"00000000-0000-0000-0000-{rng.randrange(bench_handlers.USER_COUNT):012d}"
+        # Separate boards for warm-up, timing and the traced request, so
+        # content-hash shortcuts never skip the work
+        events = [make_event(rng, user_id) for _ in range(args.repeat + 2)]
+        status = None
+
+        def call(event):
+            nonlocal status
+            try:
+                with bench_handlers.quiet():
+                    response = handler(event, bench_handlers.FakeContext())
+                status = response.get("statusCode", 200) if isinstance(response, dict) else 200
+            except Exception as e:
+                status = type(e).__name__
+
+        call(events[0])  # warm
+        cpu, wall = [], []
+        for event in events[1:-1]:
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            call(event)
+            cpu.append((time.process_time() - cpu_start) * 1000)
+            wall.append((time.perf_counter() - wall_start) * 1000)
+        traced, rss = recorder.run(lambda: call(events[-1]))
+        results.append({
+            "variant": label, "status": status,
+            "cpu_ms": common.percentile(cpu, 50), "wall_ms": common.percentile(wall, 50),
+            "traced": traced, "rss": rss,
+        })
+    return {
+        "function": function,
+        "import_ms": import_ms,
+        "rss_before_import": rss_before_import,
+        "import_rss": rss_after_import - rss_before_import,
+        "peak_rss": max([current_rss()] + [r["rss"].get("handler", 0) for r in results]),
+        "variants": results,
+    }
+
+
+def modelled_ms(cpu_ms, wall_ms, memory_mb, cpu_factor):
+    """Request duration at a memory size: CPU time stretched by the CPU share,
+    I/O wait unchanged."""
+    cpu = cpu_ms * cpu_factor
+    io = max(0.0, wall_ms - cpu_ms)
+    return io + cpu * FULL_VCPU_MB / min(memory_mb, FULL_VCPU_MB)
+
+
+def cost_per_million(memory_mb, duration_ms, arch):
+    billed_seconds = math.ceil(duration_ms) / 1000
+    return 1_000_000 * (memory_mb / 1024 * billed_seconds * GB_SECOND_PRICE[arch] + REQUEST_PRICE)
+
+
+def recommend(result, args):
+    """(estimated max memory used MB, required MB, [(memory, ms, $/1M)],
+    cheapest, balanced) for a function."""
+    used_mb = args.runtime_mb + (result["peak_rss"] - result["rss_before_import"]) / 2**20
+    required_mb = used_mb * (1 + args.headroom)
+    cpu = sum(v["cpu_ms"] for v in result["variants"]) / len(result["variants"])
+    wall = sum(v["wall_ms"] for v in result["variants"]) / len(result["variants"])
+    options = []
+    for memory in args.memory_sizes:
+        if memory < required_mb:
+            continue
+        duration = modelled_ms(cpu, wall, memory, args.cpu_factor)
+        options.append((memory, duration, cost_per_million(memory, duration, args.arch)))
+    if not options:
+        return used_mb, required_mb, [], None, None
+    cheapest = min(options, key=lambda o: (o[2], o[0]))
+    fastest = modelled_ms(cpu, wall, FULL_VCPU_MB, args.cpu_factor)
+    allowed = fastest + max(fastest * args.latency_slack, args.latency_slack_ms)
+    balanced = next((o for o in options if o[1] <= allowed), options[-1])
+    return used_mb, required_mb, options, cheapest, balanced
+
+
+def phase_rows(result):
+    rows = []
+    for variant in result["variants"]:
+        phases = sorted(variant["traced"], key=lambda p: (p != "handler", -variant["traced"][p]))
+        for i, phase in enumerate(phases):
+            rows.append([
+                variant["variant"] if i == 0 else "",
+                f"{variant['cpu_ms']:.1f}" if i == 0 else "",
+                f"{variant['wall_ms']:.1f}" if i == 0 else "",
+                phase,
+                common.format_bytes(variant["traced"][phase]),
+                common.format_bytes(variant["rss"].get(phase)) if phase in variant["rss"] else "-",
+            ])
+    return rows
+
+
+def size_list(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=size_list, default=list(FUNCTION_PHASES))
+    parser.add_argument("--board-counts", type=int_list, default=[5, 30, 100],
+                        help="boards per request for compression / analysis variants")
+    parser.add_argument("--image-sizes", type=size_list, default=["1024x768", "4000x3000"],
+                        help="WxH of the image variants of embedding-lambda")
+    parser.add_argument("--repeat", type=int, default=5, help="timed requests per variant")
+    parser.add_argument("--rss-interval-ms", type=float, default=2.0)
+    parser.add_argument("--headroom", type=float, default=0.3, help="margin over the estimated max memory used")
+    parser.add_argument("--latency-slack", type=float, default=0.1,
+                        help="balanced: allowed slowdown over a full vCPU")
+    parser.add_argument("--latency-slack-ms", type=float, default=50.0,
+                        help="balanced: allowed slowdown in ms, for requests too short for a relative slack")
+    parser.add_argument("--runtime-mb", type=float, default=40.0,
+                        help="memory used by the Python runtime itself (no-op handler)")
+    parser.add_argument("--cpu-factor", type=float, default=1.0, help="Lambda CPU time per local CPU second")
+    parser.add_argument("--arch", choices=list(GB_SECOND_PRICE), default="x86_64")
+    parser.add_argument("--memory-sizes", type=int_list, default=MEMORY_SIZES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fakes-host", default="http://127.0.0.1")
+    parser.add_argument("--fake-ports", default="8101,8102,8103", help="deepseek,voyage,supabase")
+    parser.add_argument("--no-fakes", action="store_true", help="use the upstream settings already in the environment")
+    args = parser.parse_args()
+
+    unknown = [f for f in args.functions if f not in FUNCTION_PHASES]
+    if unknown:
+        parser.error(f"unknown functions: {', '.join(unknown)}")
+    if not args.no_fakes:
+        bench_handlers.use_fakes(args.fakes_host, *args.fake_ports.split(","))
+    image_base = serve_images(args.image_sizes) if "embedding-lambda" in args.functions else None
+
+    summary = []
+    for function in args.functions:
+        print(f"\n{function}: profiling {args.repeat} requests per variant...", flush=True)
+        # A fresh process per function, so import and request RSS are its own
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(profile_function, function, args, image_base, dict(os.environ)).result()
+        failed = [f"{v['variant']} ({v['status']})" for v in result["variants"]
+                  if not (isinstance(v["status"], int) and v["status"] < 400)]
+        if failed:
+            print(f"  failed requests: {', '.join(failed)}")
+        print(f"  import: {result['import_ms']:.0f} ms, +{common.format_bytes(result['import_rss'])} RSS\n")
+        print(common.format_table(["variant", "cpu ms", "wall ms", "phase", "peak alloc", "peak RSS"],
+                                  phase_rows(result)))
+
+        used_mb, required_mb, options, cheapest, balanced = recommend(result, args)
+        summary.append([
+            function, f"{used_mb:.0f}", f"{required_mb:.0f}",
+            f"{cheapest[0]} MB ({cheapest[1]:.0f} ms, ${cheapest[2]:.2f}/1M)" if cheapest else "-",
+            f"{balanced[0]} MB ({balanced[1]:.0f} ms, ${balanced[2]:.2f}/1M)" if balanced else "-",
+        ])
+        if options:
+            print("\n  memory MB  modelled ms  $/1M requests")
+            for memory, duration, cost in options:
+                print(f"  {memory:9d}  {duration:11.0f}  {cost:13.2f}")
+
+    print(f"\nRecommendations ({args.arch}, {args.headroom:.0%} headroom, CPU factor {args.cpu_factor}):")
+    print(common.format_table(["function", "est. max used MB", "required MB", "cheapest", "balanced"], summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""PostgREST vs the direct pooled Postgres path (archive_common.pg).
+
+Times the hot operations the lambdas run per request -- match_boards, the
+board vector write, increment_board_counter and the user_analysis read and
+write -- four ways: a fresh psycopg connection per call, the pooled
+archive_common.pg path as deployed (PG_PREPARE_THRESHOLD unset, no prepared
+statements, as the transaction-mode pooler requires), the same path with
+PG_PREPARE_THRESHOLD=0 (server-side prepared statements, for session mode or
+Postgres itself), and (with --postgrest-url) HTTP calls to a PostgREST
+serving the scratch schema:
+
+    docker run -d -p 3000:3000 --network host \\
+      -e PGRST_DB_URI=$DATABASE_URL -e PGRST_DB_SCHEMAS=bench_pg_direct \\
+      -e PGRST_DB_ANON_ROLE=postgres postgrest/postgrest
+    python bench/bench_pg_direct.py --postgrest-url http://localhost:3000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+import common
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda" / "shared"))
+
+SCHEMA = "bench_pg_direct"
+
+
+def timed(fn, count):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def setup(conn, args, rng):
+    common.reset_schema(conn, SCHEMA)
+    common.create_board_table(conn)
+    conn.execute("""
+        ALTER TABLE board
+          ADD COLUMN embedding_model text,
+          ADD COLUMN vector_next VECTOR(1024),
+          ADD COLUMN embedding_model_next text
+    """)
+    conn.execute("""
+        CREATE TABLE user_analysis (
+          user_id uuid PRIMARY KEY,
+          compressed_data text,
+          boards_since_last_compression int NOT NULL DEFAULT 0
+        )
+    """)
+    user_id = str(uuid.uuid4())
+    vectors = common.clustered_vectors(rng, args.boards, 12)
+    board_ids = [str(b) for b in common.load_boards(conn, [user_id], {user_id: vectors})[user_id]]
+    conn.execute(
+        "INSERT INTO user_analysis (user_id, compressed_data) VALUES (%s, %s)",
+        (user_id, "요약 " * 2000)
+    )
+    common.apply_sql(conn, "match_boards.sql")
+    common.apply_sql(conn, "match_boards_quantized.sql")
+    common.apply_sql(conn, "increment_board_counter.sql")
+    conn.execute("NOTIFY pgrst, 'reload schema'")
+    return user_id, vectors, board_ids
+
+
+def direct_operations(pg, user_id, queries, board_ids):
+    return {
+        "match_boards": lambda i: pg.match_boards(queries[i % len(queries)], user_id, 0.0, 20),
+        "vector write": lambda i: pg.set_board_vector(
+            board_ids[i % len(board_ids)], user_id, queries[i % len(queries)], "voyage-3"
+        ),
+        "increment_board_counter": lambda i: pg.increment_board_counter(user_id),
+        "user_analysis read": lambda i: pg.get_user_analysis(user_id),
+        "user_analysis write": lambda i: pg.update_user_analysis(user_id, "요약 " * 2000, 15),
+    }
+
+
+def postgrest_operations(url, user_id, queries, board_ids):
+    import requests
+    session = requests.Session()
+    # Select the scratch schema (PostgREST schema profiles)
+    session.headers.update({"Accept-Profile": SCHEMA, "Content-Profile": SCHEMA})
+
+    def call(method, path, **kwargs):
+        response = session.request(method, f"{url}{path}", timeout=10, **kwargs)
+        response.raise_for_status()
+        return response
+
+    return {
+        "match_boards": lambda i: call("POST", "/rpc/match_boards", json={
+            "query_embedding": queries[i % len(queries)], "query_user_id": user_id,
+            "match_threshold": 0.0, "match_count": 20,
+        }),
+        "vector write": lambda i: call(
+            "PATCH", f"/board?board_id=eq.{board_ids[i % len(board_ids)]}&user_id=eq.{user_id}",
+            json={"vector": queries[i % len(queries)], "embedding_model": "voyage-3"},
+            headers={"Prefer": "return=representation"}  # what supabase-py's update() asks for
+        ),
+        "increment_board_counter": lambda i: call(
+            "POST", "/rpc/increment_board_counter", json={"p_user_id": user_id}
+        ),
+        "user_analysis read": lambda i: call(
+            "GET", "/user_analysis", params={"user_id": f"eq.{user_id}", "select": "compressed_data"}
+        ),
+        "user_analysis write": lambda i: call(
+            "PATCH", f"/user_analysis?user_id=eq.{user_id}",
+            json={"compressed_data": "요약 " * 2000, "boards_since_last_compression": 15}
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=common.DEFAULT_DATABASE_URL)
+    parser.add_argument("--postgrest-url")
+    parser.add_argument("--boards", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    conn = common.connect(args.database_url)
+    user_id, vectors, board_ids = setup(conn, args, rng)
+    queries = [v.tolist() for v in vectors[rng.integers(len(vectors), size=50)]]
+
+    # archive_common.pg reads its settings at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA},public"
+    from archive_common import pg
+    import psycopg
+
+    def unpooled(op):
+        def run(i):
+            # Same statement, but a new connection (and no prepared plan) per call
+            with psycopg.connect(args.database_url, autocommit=True) as fresh:
+                pg_pool = pg._pool
+                pg._pool = _SingleConnection(fresh)
+                try:
+                    op(i)
+                finally:
+                    pg._pool = pg_pool
+        return run
+
+    def pooled(prepare_threshold):
+        # A pool of its own per setting; pg reads PREPARE_THRESHOLD when it builds one
+        pg.PREPARE_THRESHOLD, pg._pool = prepare_threshold, None
+        pool = pg.get_pool()
+        pools.append(pool)
+
+        def wrap(op):
+            def run(i):
+                saved, pg._pool = pg._pool, pool
+                try:
+                    op(i)
+                finally:
+                    pg._pool = saved
+            return run
+        return {name: wrap(op) for name, op in direct.items()}
+
+    pools = []
+    direct = direct_operations(pg, user_id, queries, board_ids)
+    paths = [
+        ("new connection", {name: unpooled(op) for name, op in direct.items()}),
+        ("pooled", pooled(None)),
+        ("pooled, prepared", pooled(0)),
+    ]
+    if args.postgrest_url:
+        paths.append(("postgrest", postgrest_operations(args.postgrest_url, user_id, queries, board_ids)))
+
+    rows = []
+    for name in direct:
+        row = [name]
+        for _, operations in paths:
+            timed(operations[name], 10)  # warm up (pool, prepared statements, keep-alive)
+            latencies = timed(operations[name], args.iterations)
+            row.append(f"{common.percentile(latencies, 50):.2f} / {common.percentile(latencies, 95):.2f}")
+        rows.append(row)
+
+    print()
+    print(common.format_table(["operation"] + [f"{path} p50/p95 ms" for path, _ in paths], rows))
+    for pool in pools:
+        pool.close()
+    conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+
+class _SingleConnection:
+    """Stands in for the pool so the unpooled path runs the same pg.* code."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def connection(self):
+        return self
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        return False
+
+
+if __name__ == "__main__":
+    main()
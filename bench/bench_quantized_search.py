@@ -0,0 +1,111 @@
+"""Quantized board search vs the exact match_boards path.
+
+Loads synthetic clustered boards into a scratch schema, applies
+sql/match_boards.sql and sql/match_boards_quantized.sql, and reports per
+search mode: index size, latency (p50/p95) and recall@k against brute-force
+exact cosine.
+
+    python bench/bench_quantized_search.py --users 20 --boards-per-user 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import common
+
+SCHEMA = "bench_quantized"
+
+
+def run_queries(conn, sql, queries, k):
+    latencies, results = [], []
+    for user_id, query in queries:
+        started = time.perf_counter()
+        rows = conn.execute(sql, (common.vector_literal(query), user_id, k)).fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([row[0] for row in rows])
+    return latencies, results
+
+
+def recall_at_k(results, truth):
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=common.DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--boards-per-user", type=int, default=2000)
+    parser.add_argument("--clusters", type=int, default=12, help="topic clusters per user")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    conn = common.connect(args.database_url)
+    common.reset_schema(conn, SCHEMA)
+    common.create_board_table(conn)
+
+    print(f"Loading {args.users} users x {args.boards_per_user} boards...")
+    user_ids = [f"00000000-0000-0000-0000-{i:012d}" for i in range(args.users)]
+    vectors = {u: common.clustered_vectors(rng, args.boards_per_user, args.clusters) for u in user_ids}
+    board_ids = common.load_boards(conn, user_ids, vectors)
+
+    queries, truth = [], []
+    for _ in range(args.queries):
+        user_id = user_ids[rng.integers(len(user_ids))]
+        base = vectors[user_id][rng.integers(args.boards_per_user)]
+        query = base + 0.3 * rng.standard_normal(common.DIM).astype(np.float32) / np.sqrt(common.DIM)
+        queries.append((user_id, query))
+        truth.append([board_ids[user_id][i] for i in common.exact_top_k(vectors[user_id], query, args.k)])
+
+    # Size of a full-precision HNSW index, for reference only: it is dropped
+    # before timing so the exact path stays exact
+    conn.execute("CREATE INDEX board_vector_hnsw_idx ON board USING hnsw (vector vector_cosine_ops)")
+    full_index_size = common.relation_size(conn, "board_vector_hnsw_idx")
+    conn.execute("DROP INDEX board_vector_hnsw_idx")
+
+    common.apply_sql(conn, "match_boards.sql")
+    common.apply_sql(conn, "match_boards_quantized.sql")
+    conn.execute("ANALYZE board")
+
+    column_sizes = conn.execute("""
+        SELECT avg(pg_column_size(vector)), avg(pg_column_size(vector_half)), avg(pg_column_size(vector_bits))
+        FROM board
+    """).fetchone()
+
+    modes = [
+        ("exact", "SELECT board_id FROM match_boards(%s::vector, %s::uuid, 0.0, %s)",
+         None, column_sizes[0]),
+        ("halfvec", f"SELECT board_id FROM match_boards_quantized(%s::vector, %s::uuid, 0.0, %s, 'halfvec', {args.rerank_factor})",
+         common.relation_size(conn, "board_vector_half_hnsw_idx"), column_sizes[1]),
+        ("binary", f"SELECT board_id FROM match_boards_quantized(%s::vector, %s::uuid, 0.0, %s, 'binary', {args.rerank_factor})",
+         common.relation_size(conn, "board_vector_bits_hnsw_idx"), column_sizes[2]),
+    ]
+
+    rows = []
+    for name, sql, index_size, column_size in modes:
+        run_queries(conn, sql, queries[:10], args.k)  # warm up
+        latencies, results = run_queries(conn, sql, queries, args.k)
+        rows.append([
+            name,
+            common.format_bytes(index_size if index_size is not None else full_index_size) +
+            (" (full hnsw)" if index_size is None else ""),
+            f"{column_size:.0f} B",
+            f"{common.percentile(latencies, 50):.2f}",
+            f"{common.percentile(latencies, 95):.2f}",
+            f"{recall_at_k(results, truth):.3f}",
+        ])
+
+    print()
+    print(common.format_table(
+        ["mode", "index size", "vector/row", "p50 ms", "p95 ms", f"recall@{args.k}"], rows
+    ))
+    conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""JSON vs base64 binary vectors on the RPC path.
+
+For each wire format (json, float32, float16) reports the RPC body size,
+client-side encode time, server-side parse/decode time and the full
+match_boards round trip, plus overlap of the float16 results with the
+float32 ones. Pass --postgrest-url/--postgrest-key to also time the HTTP
+RPC against a PostgREST (Supabase) endpoint that has sql/vector_codec.sql.
+
+    python bench/bench_vector_wire.py --boards 5000 --queries 200
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import common
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lambda" / "shared"))
+from archive_common.vector_codec import match_boards_call  # noqa: E402
+
+SCHEMA = "bench_vector_wire"
+FORMATS = ["json", "float32", "float16"]
+
+
+def timed(fn, items):
+    latencies, results = [], []
+    for item in items:
+        started = time.perf_counter()
+        results.append(fn(item))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=common.DEFAULT_DATABASE_URL)
+    parser.add_argument("--boards", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--postgrest-url", help="e.g. https://<project>.supabase.co/rest/v1")
+    parser.add_argument("--postgrest-key")
+    parser.add_argument("--postgrest-user-id", help="user_id with boards in the PostgREST database")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    conn = common.connect(args.database_url)
+    common.reset_schema(conn, SCHEMA)
+    common.create_board_table(conn)
+
+    user_id = "00000000-0000-0000-0000-000000000001"
+    vectors = common.clustered_vectors(rng, args.boards, 12)
+    common.load_boards(conn, [user_id], {user_id: vectors})
+    common.apply_sql(conn, "match_boards.sql")
+    common.apply_sql(conn, "match_boards_quantized.sql")
+    common.apply_sql(conn, "vector_codec.sql")
+    conn.execute("ANALYZE board")
+
+    queries = [(v + 0.3 * rng.standard_normal(common.DIM).astype(np.float32) / np.sqrt(common.DIM)).tolist()
+               for v in vectors[rng.integers(args.boards, size=args.queries)]]
+
+    rows, results_by_format = [], {}
+    for fmt in FORMATS:
+        # What the lambdas send: the JSON body of the RPC call
+        encode_ms, calls = timed(
+            lambda q: match_boards_call(q, user_id, 0.0, args.k, fmt=fmt), queries
+        )
+        body_bytes = np.mean([len(json.dumps(params)) for _, params in calls])
+
+        if fmt == "json":
+            parse_sql = "SELECT %s::vector"
+            parse_args = [(common.vector_literal(np.asarray(q)),) for q in queries]
+            match_sql = "SELECT board_id FROM match_boards(%s::vector, %s::uuid, 0.0, %s)"
+            match_args = [(text, user_id, args.k) for (text,) in parse_args]
+        else:
+            parse_sql = f"SELECT vector_from_b64(%s, '{fmt}')"
+            parse_args = [(params["query_embedding_b64"],) for _, params in calls]
+            match_sql = f"SELECT board_id FROM match_boards_b64(%s, %s::uuid, 0.0, %s, '{fmt}')"
+            match_args = [(b64, user_id, args.k) for (b64,) in parse_args]
+
+        parse_ms, _ = timed(lambda a: conn.execute(parse_sql, a).fetchone(), parse_args)
+        timed(lambda a: conn.execute(match_sql, a).fetchall(), match_args[:10])  # warm up
+        match_ms, results = timed(lambda a: [r[0] for r in conn.execute(match_sql, a).fetchall()], match_args)
+        results_by_format[fmt] = results
+
+        row = [
+            fmt,
+            common.format_bytes(body_bytes),
+            f"{common.percentile(encode_ms, 50) * 1000:.0f}",
+            f"{common.percentile(parse_ms, 50):.3f}",
+            f"{common.percentile(match_ms, 50):.2f}",
+            f"{common.percentile(match_ms, 95):.2f}",
+        ]
+        if args.postgrest_url:
+            row.append(f"{time_postgrest(args, calls):.1f}")
+        rows.append(row)
+
+    headers = ["format", "rpc body", "encode p50 us", "parse p50 ms", "match p50 ms", "match p95 ms"]
+    if args.postgrest_url:
+        headers.append("http p50 ms")
+    print()
+    print(common.format_table(headers, rows))
+
+    overlap = [len(set(a) & set(b)) / max(1, len(a))
+               for a, b in zip(results_by_format["float32"], results_by_format["float16"])]
+    print(f"\nfloat16 top-{args.k} overlap with float32: {np.mean(overlap):.3f}")
+    conn.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+
+
+def time_postgrest(args, calls):
+    import requests
+    session = requests.Session()
+    session.headers.update({
+        "apikey": args.postgrest_key,
+        "Authorization": f"Bearer {args.postgrest_key}",
+        "Content-Type": "application/json",
+    })
+    user_id = args.postgrest_user_id or calls[0][1]["query_user_id"]
+
+    def call(item):
+        name, params = item
+        response = session.post(f"{args.postgrest_url}/rpc/{name}", json={**params, "query_user_id": user_id})
+        response.raise_for_status()
+
+    timed(call, calls[:5])  # warm up
+    latencies, _ = timed(call, calls)
+    return common.percentile(latencies, 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+"""Local stand-ins for DeepSeek, Voyage and Supabase (PostgREST + auth).
+
+Runs three HTTP servers so the lambdas can be exercised and load-tested
+without live services. Each service has a configurable latency distribution,
+5xx error rate and 429 (rate limit) rate. Stdlib only.
+
+    python bench/fake_upstreams.py --latency deepseek=lognormal:900:0.4 \\
+        --latency voyage=normal:120:30 --throttle-rate voyage=0.02
+
+then point the handlers at it (printed on startup):
+
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8101
+    VOYAGE_BASE_URL=http://127.0.0.1:8102/v1
+    SUPABASE_URL=http://127.0.0.1:8103
+
+Latency specs (milliseconds): fixed:MS, uniform:LO:HI, normal:MEAN:SD,
+lognormal:MEDIAN:SIGMA. Any JWT-shaped string works as SUPABASE_KEY.
+
+DeepSeek: POST /chat/completions and /v1/chat/completions, with `usage`,
+and SSE streaming for "stream": true (per-token delay --token-delay-ms;
+a final usage chunk when stream_options.include_usage is set).
+Voyage: POST /v1/embeddings and /v1/multimodalembeddings; vectors are
+deterministic per input text (unit norm, --dim dimensions).
+Supabase: /rest/v1/<table> (GET/POST/PATCH with eq. filters, in memory),
+/rest/v1/rpc/<name> for the RPCs in sql/, /auth/v1/user, /auth/v1/token
+and an empty JWKS.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SERVICES = ("deepseek", "voyage", "supabase")
+WORDS = "오늘 친구 운동 공부 산책 기록 회고 계획 여행 음식 카페 프로젝트 the archive shows steady progress".split()
+
+
+def parse_latency(spec):
+    """Returns a function producing one latency sample in seconds."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1])) / 1000
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class Faults:
+    def __init__(self, latency="fixed:0", error_rate=0.0, throttle_rate=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.counts = {"requests": 0, "errors": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def apply(self):
+        """Sleep for a latency sample; returns 500, 429 or None."""
+        time.sleep(self.latency())
+        roll = random.random()
+        with self.lock:
+            self.counts["requests"] += 1
+            if roll < self.throttle_rate:
+                self.counts["throttled"] += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.counts["errors"] += 1
+                return 500
+        return None
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 3)
+
+
+def deterministic_vector(text, dim):
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults = None
+    config = None
+
+    def log_message(self, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self):
+        fault = self.faults.apply()
+        if fault == 429:
+            self.read_json()
+            self.send_json(429, {"error": {"message": "Rate limit exceeded (fake)"}}, {"Retry-After": "1"})
+            return
+        if fault == 500:
+            self.read_json()
+            self.send_json(500, {"error": {"message": "Injected upstream error (fake)"}})
+            return
+        try:
+            self.route()
+        except Exception as e:
+            self.send_json(500, {"error": {"message": f"Fake server error: {e}"}})
+
+    do_GET = do_POST = do_PATCH = do_DELETE = handle_request
+
+    def route(self):
+        raise NotImplementedError
+
+
+class DeepSeekHandler(FakeHandler):
+    def route(self):
+        path = urlparse(self.path).path
+        if self.command != "POST" or path not in ("/chat/completions", "/v1/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Not found: {path}"}})
+            return
+        request = self.read_json() or {}
+        messages = request.get("messages") or []
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        max_tokens = int(request.get("max_tokens") or 512)
+        words = self.answer_words(messages, min(max_tokens, self.config.completion_tokens))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "deepseek-chat")
+        if request.get("stream"):
+            self.stream(completion_id, model, words, usage, (request.get("stream_options") or {}).get("include_usage"))
+            return
+        self.send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.content(request, words)},
+                "finish_reason": "stop" if len(words) < max_tokens else "length",
+            }],
+            "usage": usage,
+        })
+
+    def answer_words(self, messages, count):
+        seed = hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).digest()
+        rng = random.Random(seed)
+        return [rng.choice(WORDS) for _ in range(count)]
+
+    def content(self, request, words):
+        wants_json = (request.get("response_format") or {}).get("type") == "json_object"
+        if wants_json:
+            return json.dumps({"summary": " ".join(words[:20]), "items": []}, ensure_ascii=False)
+        return " ".join(words)
+
+    def stream(self, completion_id, model, words, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None, usage_payload=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if usage_payload else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage_payload:
+                payload["usage"] = usage_payload
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            time.sleep(self.config.token_delay_ms / 1000)
+            chunk({"content": word if i == 0 else f" {word}"})
+        chunk({}, finish_reason="stop")
+        if include_usage:
+            chunk(None, usage_payload=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class VoyageHandler(FakeHandler):
+    def route(self):
+        path = urlparse(self.path).path
+        request = self.read_json() or {}
+        model = request.get("model", "voyage-3")
+        dim = self.config.dim
+        if path in ("/v1/embeddings", "/embeddings"):
+            texts = request.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            tokens = sum(estimate_tokens(t) for t in texts)
+            self.send_json(200, {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "embedding": deterministic_vector(t, dim), "index": i}
+                    for i, t in enumerate(texts)
+                ],
+                "model": model,
+                "usage": {"total_tokens": tokens},
+            })
+        elif path in ("/v1/multimodalembeddings", "/multimodalembeddings"):
+            inputs = request.get("inputs") or []
+            data, text_tokens, image_pixels = [], 0, 0
+            for i, item in enumerate(inputs):
+                parts = item.get("content", []) if isinstance(item, dict) else []
+                texts = [p.get("text", "") for p in parts if p.get("type") == "text"]
+                images = [p for p in parts if p.get("type", "").startswith("image")]
+                text_tokens += sum(estimate_tokens(t) for t in texts)
+                image_pixels += 512 * 512 * len(images)
+                key = "\n".join(texts) + f"|images:{len(images)}"
+                data.append({"object": "embedding", "embedding": deterministic_vector(key, dim), "index": i})
+            self.send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": model,
+                "usage": {
+                    "text_tokens": text_tokens,
+                    "image_pixels": image_pixels,
+                    "total_tokens": text_tokens + image_pixels // 560,
+                },
+            })
+        else:
+            self.send_json(404, {"detail": f"Not found: {path}"})
+
+
+class SupabaseState:
+    """In-memory tables; boards are generated per user on first access."""
+
+    def __init__(self, boards_per_user):
+        self.boards_per_user = boards_per_user
+        self.tables = {
+            "board": [],
+            "user_analysis": [],
+            "embedding_config": [{"id": 1, "active_model": "voyage-3", "next_model": None}],
+        }
+        self.users = set()
+        self.job_version = 0
+        self.lock = threading.Lock()
+
+    def ensure_user(self, user_id):
+        if not user_id or user_id in self.users:
+            return
+        self.users.add(user_id)
+        rng = random.Random(user_id)
+        for i in range(self.boards_per_user):
+            self.tables["board"].append({
+                "board_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "user_id": user_id,
+                "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))),
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "tags": rng.sample(WORDS[:12], 2),
+                "image": None,
+                "embedding_model": "voyage-3",
+            })
+        self.tables["user_analysis"].append({
+            "user_id": user_id,
+            "compressed_data": "",
+            "boards_since_last_compression": 0,
+        })
+
+    def rows(self, table, filters):
+        with self.lock:
+            if "user_id" in filters:
+                self.ensure_user(filters["user_id"])
+            return [
+                row for row in self.tables.setdefault(table, [])
+                if all(str(row.get(col)) == value for col, value in filters.items())
+            ]
+
+
+class SupabaseHandler(FakeHandler):
+    state = None
+
+    def route(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        if path.startswith("/auth/v1/"):
+            self.auth(path[len("/auth/v1/"):])
+        elif path.startswith("/rest/v1/rpc/"):
+            self.rpc(path[len("/rest/v1/rpc/"):], self.read_json() or {})
+        elif path.startswith("/rest/v1/"):
+            self.table(path[len("/rest/v1/"):], query)
+        else:
+            self.send_json(404, {"message": f"Not found: {path}"})
+
+    def token_sub(self):
+        token = (self.headers.get("Authorization") or "").replace("Bearer ", "")
+        try:
+            import base64
+            payload = token.split(".")[1]
+            return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))).get("sub")
+        except Exception:
+            return None
+
+    def auth(self, endpoint):
+        self.read_json()
+        user = {
+            "id": self.token_sub() or str(uuid.UUID(int=0)),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": "fake@example.com",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2025-01-01T00:00:00Z",
+        }
+        if endpoint == "user":
+            self.send_json(200, user)
+        elif endpoint.startswith("token"):
+            token = (self.headers.get("Authorization") or "").replace("Bearer ", "")
+            self.send_json(200, {
+                "access_token": token, "refresh_token": "fake-refresh", "token_type": "bearer",
+                "expires_in": 3600, "expires_at": int(time.time()) + 3600, "user": user,
+            })
+        elif endpoint == ".well-known/jwks.json":
+            self.send_json(200, {"keys": []})
+        else:
+            self.send_json(404, {"msg": f"Not found: {endpoint}"})
+
+    def table(self, name, query):
+        filters = {
+            col: values[0][3:] for col, values in query.items()
+            if values and values[0].startswith("eq.")
+        }
+        limit = int(query["limit"][0]) if "limit" in query else None
+        state = self.state
+        if self.command == "GET":
+            rows = state.rows(name, filters)
+            select = query.get("select", ["*"])[0]
+            if select != "*":
+                columns = select.split(",")
+                rows = [{c: row.get(c) for c in columns} for row in rows]
+            self.send_json(200, rows[:limit] if limit else rows)
+        elif self.command == "PATCH":
+            payload = self.read_json() or {}
+            rows = state.rows(name, filters)
+            with state.lock:
+                for row in rows:
+                    row.update(payload)
+            prefer = self.headers.get("Prefer") or ""
+            self.send_json(200, rows) if "return=representation" in prefer else self.send_json(204, None)
+        elif self.command == "POST":
+            payload = self.read_json()
+            with state.lock:
+                state.tables.setdefault(name, []).extend(payload if isinstance(payload, list) else [payload])
+            self.send_json(201, None)
+        else:
+            self.send_json(405, {"message": "Method not allowed"})
+
+    def rpc(self, name, params):
+        state = self.state
+        handler = getattr(self, f"rpc_{name}", None)
+        if handler is not None:
+            self.send_json(200, handler(state, params))
+        else:
+            # void RPCs (increment_board_counter, complete_idempotency_key, ...)
+            self.send_json(204, None)
+
+    def matched_boards(self, state, params):
+        boards = state.rows("board", {"user_id": params.get("query_user_id")})
+        count = int(params.get("match_count") or 10)
+        rng = random.Random(json.dumps(params.get("query_embedding") or params.get("query_embedding_b64"))[:64])
+        picked = rng.sample(boards, min(count, len(boards)))
+        similarities = sorted((rng.uniform(0.3, 0.9) for _ in picked), reverse=True)
+        return [
+            {
+                "board_id": b["board_id"], "user_id": b["user_id"], "description": b["description"],
+                "date": b["date"], "tags": b["tags"], "similarity": s,
+            }
+            for b, s in zip(picked, similarities)
+        ]
+
+    rpc_match_boards = rpc_match_boards_quantized = rpc_match_boards_b64 = matched_boards
+
+    def rpc_match_semantic_cache(self, state, params):
+        return [{
+            "cache_id": None, "cached_query": None, "answer": None,
+            "distance": None, "hit": False, "board_set_version": 0,
+        }]
+
+    def rpc_claim_idempotency_key(self, state, params):
+        return [{"outcome": "claimed", "stored_response": None}]
+
+    def rpc_enqueue_embedding_job(self, state, params):
+        with state.lock:
+            state.job_version += 1
+            return state.job_version
+
+    def rpc_set_board_vector_b64(self, state, params):
+        return len(state.rows("board", {"board_id": params.get("p_board_id")}))
+
+    def rpc_claim_embedding_jobs(self, state, params):
+        return []
+
+
+def serve(handler_class, port, name):
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+    thread.start()
+    return server
+
+
+def parse_service_options(values, convert):
+    options = {}
+    for value in values:
+        service, _, setting = value.partition("=")
+        if service not in SERVICES:
+            raise SystemExit(f"Unknown service {service!r} (expected one of {', '.join(SERVICES)})")
+        options[service] = convert(setting)
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deepseek-port", type=int, default=8101)
+    parser.add_argument("--voyage-port", type=int, default=8102)
+    parser.add_argument("--supabase-port", type=int, default=8103)
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SPEC")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="SERVICE=P", help="fraction of 500s")
+    parser.add_argument("--throttle-rate", action="append", default=[], metavar="SERVICE=P", help="fraction of 429s")
+    parser.add_argument("--token-delay-ms", type=float, default=15.0, help="delay between streamed tokens")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="tokens per completion (capped by max_tokens)")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--boards-per-user", type=int, default=200)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    latencies = parse_service_options(args.latency, str)
+    error_rates = parse_service_options(args.error_rate, float)
+    throttle_rates = parse_service_options(args.throttle_rate, float)
+    faults = {
+        service: Faults(latencies.get(service, "fixed:0"), error_rates.get(service, 0.0), throttle_rates.get(service, 0.0))
+        for service in SERVICES
+    }
+
+    handlers = {
+        "deepseek": type("Handler", (DeepSeekHandler,), {"faults": faults["deepseek"], "config": args}),
+        "voyage": type("Handler", (VoyageHandler,), {"faults": faults["voyage"], "config": args}),
+        "supabase": type("Handler", (SupabaseHandler,), {
+            "faults": faults["supabase"], "config": args, "state": SupabaseState(args.boards_per_user),
+        }),
+    }
+    ports = {"deepseek": args.deepseek_port, "voyage": args.voyage_port, "supabase": args.supabase_port}
+    servers = [serve(handlers[s], ports[s], s) for s in SERVICES]
+
+    print("Fake upstreams running; point the lambdas at them with:")
+    print(f"  DEEPSEEK_BASE_URL=http://127.0.0.1:{args.deepseek_port}")
+    print(f"  VOYAGE_BASE_URL=http://127.0.0.1:{args.voyage_port}/v1")
+    print(f"  SUPABASE_URL=http://127.0.0.1:{args.supabase_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+        for service in SERVICES:
+            print(f"{service}: {faults[service].counts}")
+
+
+if __name__ == "__main__":
+    main()
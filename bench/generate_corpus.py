@@ -0,0 +1,242 @@
+"""Synthetic Korean journal corpus for scale testing.
+
+Generates N users x M boards with Korean descriptions, topic-driven tags,
+dates with weekly seasonality, image flags and clustered embeddings (boards
+of the same topic lie near a shared topic center, shifted per user), and
+bulk-loads them into the board table of a scratch schema with binary COPY.
+Everything is derived from --seed, so a corpus can be regenerated exactly.
+
+    python bench/generate_corpus.py --users 1000 --boards-per-user 100
+    python bench/generate_corpus.py --users 100000 --boards-per-user 100 --count-sigma 0.8
+
+The schema is left in place for the other benchmarks (e.g.
+bench_index_sweep.py --schema bench_corpus). --append adds users to an
+existing corpus instead of recreating it.
+"""
+import argparse
+import random
+import struct
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+import common
+
+PG_EPOCH = date(2000, 1, 1)
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+TEXT_OID = 25
+FLUSH_BYTES = 16 << 20
+
+# topic -> (tags, activities, places); descriptions mix the topic's phrases
+# with shared openers and feelings, so tags and text agree with the vector's
+# cluster
+TOPICS = {
+    "운동": (["운동", "헬스", "러닝", "요가", "건강"],
+           ["헬스장에서 하체 운동을 했다", "5킬로미터를 달렸다", "요가 수업을 들었다", "친구와 배드민턴을 쳤다"],
+           ["헬스장", "한강 공원", "동네 체육관", "요가원"]),
+    "공부": (["공부", "자격증", "영어", "코딩", "시험"],
+           ["영어 단어를 외웠다", "알고리즘 문제를 풀었다", "자격증 기출문제를 풀었다", "강의를 두 개 들었다"],
+           ["도서관", "스터디 카페", "집 책상", "학교"]),
+    "맛집": (["맛집", "음식", "카페", "디저트", "외식"],
+           ["새로 생긴 파스타집에 갔다", "국밥 한 그릇을 먹었다", "케이크가 맛있는 카페를 찾았다", "친구와 삼겹살을 먹었다"],
+           ["성수동", "망원동", "회사 근처", "동네 골목"]),
+    "여행": (["여행", "풍경", "바다", "산", "사진"],
+           ["바다를 보며 산책했다", "등산을 하고 정상에서 사진을 찍었다", "기차를 타고 당일치기 여행을 했다", "숙소 근처를 구경했다"],
+           ["부산", "강릉", "제주도", "전주"]),
+    "가족": (["가족", "부모님", "주말", "집밥"],
+           ["부모님과 저녁을 먹었다", "조카와 놀아 주었다", "가족과 영화를 봤다", "할머니 댁에 다녀왔다"],
+           ["본가", "할머니 댁", "거실", "근처 공원"]),
+    "회사": (["회사", "업무", "회의", "프로젝트", "야근"],
+           ["중요한 발표를 마쳤다", "프로젝트 마감을 끝냈다", "회의가 길어져서 지쳤다", "새로운 업무를 배웠다"],
+           ["사무실", "회의실", "재택 근무 중인 집", "출장지"]),
+    "독서": (["독서", "책", "글쓰기", "기록"],
+           ["소설을 한 권 끝까지 읽었다", "에세이에서 좋은 문장을 발견했다", "독서 모임에 참여했다", "짧은 글을 썼다"],
+           ["서점", "도서관", "카페 창가", "침대 위"]),
+    "취미": (["취미", "영화", "음악", "그림", "게임"],
+           ["기타 연습을 했다", "전시회를 보고 왔다", "보고 싶던 영화를 봤다", "수채화를 그렸다"],
+           ["미술관", "공연장", "작업실", "영화관"]),
+}
+TOPIC_NAMES = list(TOPICS)
+OPENERS = ["오늘은", "아침 일찍", "퇴근 후에", "주말을 맞아", "오랜만에", "비가 와서", "날씨가 좋아서"]
+FEELINGS = [
+    "생각보다 즐거운 하루였다.", "조금 피곤했지만 뿌듯했다.", "다음에도 또 하고 싶다.",
+    "꾸준히 기록해야겠다.", "마음이 한결 가벼워졌다.", "작은 성취감을 느꼈다.", "내일은 더 잘할 수 있을 것 같다.",
+]
+EXTRA_TAGS = ["일상", "행복", "친구", "감사", "성장", "휴식", "도전", "목표", "추억", "혼자"]
+
+
+
+
+def description(rnd, topic):
+    _, activities, places = TOPICS[topic]
+    sentences = [f"{rnd.choice(OPENERS)} {rnd.choice(places)}에서 {rnd.choice(activities)}."]
+    # Mostly short entries with a long tail of diary-length ones
+    for _ in range(min(12, int(rnd.lognormvariate(0.4, 0.8)))):
+        sentences.append(f"{rnd.choice(activities)}." if rnd.random() < 0.5 else rnd.choice(FEELINGS))
+    return " ".join(sentences)
+
+
+def tags(rnd, topic):
+    topic_tags = TOPICS[topic][0]
+    chosen = [topic_tags[0]]
+    # Mostly one or two topic tags, occasionally more
+    while rnd.random() < 0.45:
+        chosen.append(rnd.choice(topic_tags))
+    # Zipf-like popularity for the shared tags
+    if rnd.random() < 0.4:
+        chosen.append(EXTRA_TAGS[min(len(EXTRA_TAGS) - 1, int(rnd.paretovariate(1.2)) - 1)])
+    return list(dict.fromkeys(chosen))
+
+
+def date_weights(end, span_days):
+    """Probability of each day offset before end; weekends twice as likely."""
+    weights = np.array([2.0 if (end - timedelta(days=d)).weekday() >= 5 else 1.0 for d in range(span_days)])
+    return weights / weights.sum()
+
+
+def field(data):
+    return struct.pack(">i", len(data)) + data
+
+
+def text_array(values):
+    encoded = [v.encode("utf-8") for v in values]
+    return struct.pack(">iiiii", 1, 0, TEXT_OID, len(encoded), 1) + b"".join(field(v) for v in encoded)
+
+
+def user_rows(args, user_number, topic_centers, weights, end):
+    """Binary COPY tuples (see the PostgreSQL COPY docs) for one user's boards.
+
+    Each user has its own generator seeded with (seed, user number), so a
+    corpus does not depend on --jobs or on how it was split across --append
+    runs.
+    """
+    rng = np.random.default_rng([args.seed, user_number])
+    rnd = random.Random(int(rng.integers(1 << 62)))
+    count = args.boards_per_user
+    if args.count_sigma > 0:
+        count = max(1, round(args.boards_per_user * rng.lognormal(-args.count_sigma ** 2 / 2, args.count_sigma)))
+
+    preference = rng.dirichlet(np.full(len(TOPIC_NAMES), args.topic_concentration))
+    topics = rng.choice(len(TOPIC_NAMES), size=count, p=preference)
+    # Unit vectors around the boards' topic centers plus a per-user shift
+    shift = args.user_shift * rng.standard_normal(common.DIM, dtype=np.float32)
+    vectors = topic_centers[topics] + shift + args.spread * rng.standard_normal((count, common.DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vector_bytes = vectors.astype(">f4").tobytes()
+    # field length, then pgvector's binary header (dim, unused)
+    vector_header = struct.pack(">ihh", 4 + 4 * common.DIM, common.DIM, 0)
+    days = (end - PG_EPOCH).days - rng.choice(len(weights), size=count, p=weights)
+    seconds = rng.integers(6 * 3600, 86400, size=count)
+    board_ids = rng.bytes(16 * count)
+
+    user_field = field(uuid.UUID(f"00000000-0000-0000-0000-{user_number:012d}").bytes)
+    rows = []
+    for i in range(count):
+        topic = TOPIC_NAMES[topics[i]]
+        board_id = board_ids[16 * i:16 * i + 16]
+        day = int(days[i])
+        image = None
+        if rnd.random() < args.image_rate:
+            image = f"https://example.invalid/boards/{uuid.UUID(bytes=board_id)}.jpg".encode()
+        rows.append(b"".join((
+            b"\x00\x08",
+            field(board_id),
+            user_field,
+            field(description(rnd, topic).encode("utf-8")),
+            field(struct.pack(">i", day)),
+            field(text_array(tags(rnd, topic))),
+            field(image) if image else b"\xff\xff\xff\xff",
+            field(struct.pack(">q", (day * 86400 + int(seconds[i])) * 1_000_000)),
+            vector_header,
+            vector_bytes[4 * common.DIM * i:4 * common.DIM * (i + 1)],
+        )))
+    return rows
+
+
+def load_users(args, first_user, user_count, report=False):
+    """COPY users [first_user, first_user + user_count) over one connection;
+    returns the number of boards written."""
+    conn = common.connect(args.database_url)
+    conn.execute(f"SET search_path TO {args.schema}, public")
+    topic_centers = np.random.default_rng(args.seed).standard_normal((len(TOPIC_NAMES), common.DIM)).astype(np.float32)
+    end = date.fromisoformat(args.end_date)
+    weights = date_weights(end, args.span_days)
+    total, started = 0, time.perf_counter()
+    with conn.cursor() as cur:
+        with cur.copy("COPY board (board_id, user_id, description, date, tags, image, created_at, vector) "
+                      "FROM STDIN WITH (FORMAT binary)") as copy:
+            buffer, size = [COPY_SIGNATURE], len(COPY_SIGNATURE)
+            for i in range(user_count):
+                for row in user_rows(args, first_user + i, topic_centers, weights, end):
+                    buffer.append(row)
+                    size += len(row)
+                    total += 1
+                if size >= FLUSH_BYTES:
+                    copy.write(b"".join(buffer))
+                    buffer, size = [], 0
+                if report and (i + 1) % max(1, user_count // 20) == 0:
+                    rate = total / (time.perf_counter() - started)
+                    print(f"  {i + 1}/{user_count} users, {total} boards ({rate:,.0f} boards/s per job)", flush=True)
+            buffer.append(b"\xff\xff")
+            copy.write(b"".join(buffer))
+    conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=common.DEFAULT_DATABASE_URL)
+    parser.add_argument("--schema", default="bench_corpus")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--boards-per-user", type=int, default=100, help="mean boards per user")
+    parser.add_argument("--count-sigma", type=float, default=0.0,
+                        help="lognormal sigma of boards per user (0 = every user gets exactly the mean)")
+    parser.add_argument("--topic-concentration", type=float, default=0.5,
+                        help="Dirichlet concentration of a user's topic mix (lower = fewer topics per user)")
+    parser.add_argument("--spread", type=float, default=0.35, help="noise around a topic center")
+    parser.add_argument("--user-shift", type=float, default=0.3, help="per-user offset of all topic centers")
+    parser.add_argument("--image-rate", type=float, default=0.35, help="fraction of boards with an image")
+    parser.add_argument("--end-date", default="2025-06-30")
+    parser.add_argument("--span-days", type=int, default=730, help="boards are dated within this many days")
+    parser.add_argument("--jobs", type=int, default=1, help="parallel generator processes, one COPY each")
+    parser.add_argument("--append", action="store_true", help="add users to the existing corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    conn = common.connect(args.database_url)
+    if args.append:
+        conn.execute(f"SET search_path TO {args.schema}, public")
+        first_user = conn.execute("SELECT count(DISTINCT user_id) FROM board").fetchone()[0]
+    else:
+        common.reset_schema(conn, args.schema)
+        common.create_board_table(conn)
+        # Built after the load: maintaining it row by row slows COPY down
+        conn.execute("DROP INDEX board_user_id_idx")
+        first_user = 0
+
+    print(f"Generating {args.users} users x ~{args.boards_per_user} boards into {args.schema}.board...")
+    started = time.perf_counter()
+    if args.jobs <= 1:
+        total = load_users(args, first_user, args.users, report=True)
+    else:
+        per_job = -(-args.users // args.jobs)
+        ranges = [(first_user + start, min(per_job, args.users - start)) for start in range(0, args.users, per_job)]
+        with ProcessPoolExecutor(len(ranges)) as pool:
+            futures = [pool.submit(load_users, args, start, count, index == 0)
+                       for index, (start, count) in enumerate(ranges)]
+            total = sum(f.result() for f in futures)
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {total} boards in {elapsed:.1f}s ({total / elapsed:,.0f} boards/s)")
+
+    started = time.perf_counter()
+    conn.execute("CREATE INDEX IF NOT EXISTS board_user_id_idx ON board (user_id)")
+    conn.execute("ANALYZE board")
+    print(f"Indexed and analyzed in {time.perf_counter() - started:.1f}s; "
+          f"table {common.format_bytes(common.relation_size(conn, 'board'))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Minimal local OTLP/HTTP trace collector.
+
+Receives the spans exported by archive_common/tracing.py and jwt-auth
+(OTLP/HTTP with JSON bodies) and, once a trace has been quiet for --settle
+seconds, prints it as a tree with each span's offset and duration, so the
+critical path of a request across the authorizer, the lambdas and their
+upstream calls can be read without running Jaeger. Stdlib only.
+
+    python bench/trace_collector.py --jsonl /tmp/traces.jsonl
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://127.0.0.1:4318 python bench/bench_handlers.py ...
+
+For a UI, Jaeger accepts the same exports on the same port:
+
+    docker run -p 16686:16686 -p 4318:4318 jaegertracing/all-in-one
+
+Output looks like:
+
+    trace 4bf92f3577b34da6a3ce929d0e0e4736  1843.2 ms  6 spans
+         0.0  1843.2  deepseek-analysis [deepseek-analysis] task=analysis
+         2.1    11.4    POST 127.0.0.1 [deepseek-analysis] http.response.status_code=200
+        14.0  1826.9    POST api.deepseek.com [deepseek-analysis] http.response.status_code=200
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Attributes worth showing on a tree line
+SHOWN_ATTRIBUTES = ("task", "http.response.status_code", "faas.coldstart", "authorizer.cache_hit",
+                    "board_id", "batch.size", "error")
+KINDS = {2: "server", 3: "client"}
+
+
+def attribute_value(value):
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def flatten(body):
+    """OTLP/JSON ExportTraceServiceRequest -> list of plain span dicts."""
+    spans = []
+    for resource_spans in body.get("resourceSpans", []):
+        resource = {a["key"]: attribute_value(a["value"])
+                    for a in resource_spans.get("resource", {}).get("attributes", [])}
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                spans.append({
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "service": resource.get("service.name", "?"),
+                    "kind": span.get("kind", 1),
+                    "start_ns": int(span["startTimeUnixNano"]),
+                    "end_ns": int(span["endTimeUnixNano"]),
+                    "attributes": {a["key"]: attribute_value(a["value"]) for a in span.get("attributes", [])},
+                    "error": (span.get("status") or {}).get("code") == 2,
+                })
+    return spans
+
+
+def render(trace_id, spans):
+    """The trace as text lines; spans whose parent never arrived are roots."""
+    by_id = {s["span_id"]: s for s in spans}
+    children = {}
+    for span in spans:
+        parent = span["parent_id"] if span["parent_id"] in by_id else None
+        children.setdefault(parent, []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda s: s["start_ns"])
+    start = min(s["start_ns"] for s in spans)
+    end = max(s["end_ns"] for s in spans)
+    lines = [f"trace {trace_id}  {(end - start) / 1e6:.1f} ms  {len(spans)} spans"]
+
+    def walk(span, depth):
+        shown = " ".join(f"{k}={span['attributes'][k]}" for k in SHOWN_ATTRIBUTES if k in span["attributes"])
+        kind = KINDS.get(span["kind"], "")
+        lines.append(
+            f"  {(span['start_ns'] - start) / 1e6:8.1f} {(span['end_ns'] - span['start_ns']) / 1e6:8.1f}  "
+            f"{'  ' * depth}{span['name']} [{span['service']}{' ' + kind if kind else ''}]"
+            f"{' ERROR' if span['error'] else ''} {shown}".rstrip()
+        )
+        for child in children.get(span["span_id"], []):
+            walk(child, depth + 1)
+
+    for root in children.get(None, []):
+        walk(root, 0)
+    return "\n".join(lines)
+
+
+class Collector:
+    def __init__(self, settle_seconds, jsonl_path):
+        self.settle_seconds = settle_seconds
+        self.jsonl_path = jsonl_path
+        self.traces = {}
+        self.last_seen = {}
+        self.lock = threading.Lock()
+
+    def add(self, spans):
+        with self.lock:
+            for span in spans:
+                self.traces.setdefault(span["trace_id"], []).append(span)
+                self.last_seen[span["trace_id"]] = time.monotonic()
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    for span in spans:
+                        f.write(json.dumps(span) + "\n")
+
+    def print_settled(self):
+        now = time.monotonic()
+        with self.lock:
+            settled = [t for t, seen in self.last_seen.items() if now - seen >= self.settle_seconds]
+            done = [(t, self.traces.pop(t)) for t in settled]
+            for trace_id in settled:
+                del self.last_seen[trace_id]
+        for trace_id, spans in sorted(done, key=lambda item: min(s["start_ns"] for s in item[1])):
+            print(render(trace_id, spans) + "\n", flush=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    collector = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.rstrip("/") != "/v1/traces":
+            self.send_error(404)
+            return
+        if "json" not in (self.headers.get("Content-Type") or ""):
+            # The exporters here send JSON; OTel SDKs default to protobuf
+            self.send_error(415, "Only OTLP/HTTP JSON is supported (OTEL_EXPORTER_OTLP_PROTOCOL=http/json)")
+            return
+        try:
+            self.collector.add(flatten(json.loads(body)))
+        except (ValueError, KeyError) as e:
+            self.send_error(400, str(e))
+            return
+        response = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds without new spans before a trace is printed")
+    parser.add_argument("--jsonl", help="also append every span to this file")
+    args = parser.parse_args()
+
+    collector = Collector(args.settle, args.jsonl)
+    server = ThreadingHTTPServer((args.host, args.port), type("Handler", (Handler,), {"collector": collector}))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Collecting traces on http://{args.host}:{args.port}/v1/traces; point the lambdas at it with:")
+    print(f"  OTEL_EXPORTER_OTLP_ENDPOINT=http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(0.5)
+            collector.print_settled()
+    except KeyboardInterrupt:
+        collector.print_settled()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,113 @@
 import json
 import os
+import time
+import contextvars
 import requests
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from archive_common import cassette, deepseek, jsoncodec, pg, token_budget
+from archive_common.log import log_event, redact
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+from archive_common.idempotency import idempotent
+
+cassette.install()
 
 # Configure logging for CloudWatch
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Batches whose boards exceed one chunk are compressed map-reduce: chunks of
+# this many (estimated) tokens are summarized concurrently, then merged with
+# the previous history by the usual compression call
+COMPRESSION_CHUNK_TOKENS = int(os.environ.get("COMPRESSION_CHUNK_TOKENS", "6000"))
+# Concurrent DeepSeek calls in the map step
+COMPRESSION_MAX_WORKERS = int(os.environ.get("COMPRESSION_MAX_WORKERS", "4"))
+# Completion limit of each partial summary
+COMPRESSION_PARTIAL_MAX_TOKENS = int(os.environ.get("COMPRESSION_PARTIAL_MAX_TOKENS", "1500"))
+COMPRESSION_MAX_TOKENS = 4000
+
+CHUNK_SYSTEM_PROMPT = """당신은 꼼꼼한 데이터 기록관입니다.
+사용자의 활동 보드 중 일부(시간순)를 받아 부분 요약을 작성합니다. 이 요약은 나중에 다른 부분 요약들과 함께 사용자의 압축된 인생 기록에 통합됩니다.
+
+규칙:
+- **반드시 한국어로 작성하세요.**
+- 시간 순서를 유지하고 날짜를 함께 적으세요.
+- 주요 사건, 이정표, 성과, 반복되는 활동을 빠짐없이 남기세요.
+- 오직 요약 텍스트만 반환하세요.
+"""
+
+MERGE_SYSTEM_PROMPT = """당신은 꼼꼼한 데이터 기록관입니다.
+사용자의 활동 보드를 시간순으로 나누어 만든 부분 요약 여러 개를 받아, 하나의 부분 요약으로 합칩니다.
+
+규칙:
+- **반드시 한국어로 작성하세요.**
+- 시간 순서와 날짜를 유지하세요.
+- 주요 사건, 이정표, 성과를 누락하지 마세요.
+- 오직 요약 텍스트만 반환하세요.
+"""
+
+
+def deepseek_chat(api_key, system_prompt, user_content, max_tokens, timeout=60):
+    """One DeepSeek completion, retried on 429 / 5xx by archive_common.deepseek."""
+    return deepseek.chat(api_key, [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ], max_tokens, timeout=timeout)
+
+
+def summarize_parts(api_key, system_prompt, parts):
+    """Run one completion per part on a bounded thread pool; results keep
+    the parts' order."""
+    workers = max(1, min(COMPRESSION_MAX_WORKERS, len(parts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # copy_context so the calls stay in the request's trace
+        futures = [
+            pool.submit(contextvars.copy_context().run, deepseek_chat, api_key, system_prompt, part,
+                        COMPRESSION_PARTIAL_MAX_TOKENS)
+            for part in parts
+        ]
+        return [f.result() for f in futures]
+
+
+def map_reduce_boards(api_key, boards, reduce_budget):
+    """Partial summaries of a large batch, in chronological order, merged
+    further until together they fit reduce_budget tokens. Returns
+    (summaries, number of board chunks)."""
+    boards = sorted(boards, key=lambda b: str(b.get('date') or ''))
+    chunks = token_budget.chunk_items(
+        boards, COMPRESSION_CHUNK_TOKENS,
+        lambda b: token_budget.estimate_tokens(json.dumps(b, ensure_ascii=False, indent=2))
+    )
+    logger.info(f"Map-reduce compression: {len(boards)} boards in {len(chunks)} chunks, "
+                f"{COMPRESSION_MAX_WORKERS} concurrent calls")
+    started = time.time()
+    partials = summarize_parts(api_key, CHUNK_SYSTEM_PROMPT, [
+        f"=== BOARDS (PART {i + 1}/{len(chunks)}) ===\n{json.dumps(chunk, ensure_ascii=False, indent=2)}"
+        for i, chunk in enumerate(chunks)
+    ])
+    while len(partials) > 1 and token_budget.estimate_tokens("\n\n".join(partials)) > reduce_budget:
+        groups = token_budget.chunk_items(partials, COMPRESSION_CHUNK_TOKENS)
+        if len(groups) == len(partials):
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        logger.info(f"Merging {len(partials)} partial summaries into {len(groups)}")
+        partials = summarize_parts(api_key, MERGE_SYSTEM_PROMPT, [
+            "\n\n".join(f"--- PART {i + 1} ---\n{p}" for i, p in enumerate(group)) for group in groups
+        ])
+    logger.info(f"Map step done in {time.time() - started:.1f}s: {len(partials)} partial summaries")
+    return partials, len(chunks)
+
+
+@profiled('data-compression')
+@traced('data-compression')
+@idempotent('data-compression')
 def lambda_handler(event, context):
     # CORS headers
     cors_headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key',
         'Access-Control-Allow-Methods': 'POST,OPTIONS'
     }
 
@@ -27,7 +121,7 @@ def lambda_handler(event, context):
 
     try:
         logger.info("=== Data Compression Lambda Started ===")
-        logger.info(f"Event: {json.dumps(event)}")
+        log_event(event)
         
         # 1. Environment Variables
         SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -49,12 +143,12 @@ def lambda_handler(event, context):
         # 2. Parse Input - API Gateway sends body as JSON string
         body_data = {}
         if "body" in event and isinstance(event["body"], str):
-            body_data = json.loads(event["body"])
+            body_data = jsoncodec.loads(event["body"])
         elif isinstance(event, dict) and "body" not in event:
             # Direct invocation or Function URL (body is the event itself)
             body_data = event
         
-        logger.info(f"Parsed body: {json.dumps(body_data, default=str)}")
+        logger.info(f"Parsed body: {jsoncodec.dumps(redact(body_data), default=str)}")
         
         new_boards = body_data.get("boards")
 
@@ -139,20 +233,29 @@ def lambda_handler(event, context):
             "select": "compressed_data"
         }
         
-        db_res = requests.get(db_url, headers=db_headers, params=params, timeout=10)
-        
         prev_summary = ""
         
-        if db_res.ok:
-            rows = db_res.json()
-            if rows and len(rows) > 0:
-                prev_summary = rows[0].get("compressed_data", "")
+        if pg.enabled():
+            # Direct pooled connection (DATABASE_URL) instead of PostgREST
+            row = pg.get_user_analysis(user_id)
+            if row:
+                prev_summary = row.get("compressed_data") or ""
                 logger.info(f"Found previous summary (length: {len(prev_summary)})")
             else:
                 logger.info("No previous summary found.")
         else:
-            logger.warning(f"DB Fetch Error: {db_res.status_code} {db_res.text}")
-            # Continue with empty summary
+            db_res = requests.get(db_url, headers=db_headers, params=params, timeout=10)
+
+            if db_res.ok:
+                rows = db_res.json()
+                if rows and len(rows) > 0:
+                    prev_summary = rows[0].get("compressed_data", "")
+                    logger.info(f"Found previous summary (length: {len(prev_summary)})")
+                else:
+                    logger.info("No previous summary found.")
+            else:
+                logger.warning(f"DB Fetch Error: {db_res.status_code} {db_res.text}")
+                # Continue with empty summary
 
         # 5. Call DeepSeek
         logger.info("Calling DeepSeek LLM...")
@@ -174,39 +277,28 @@ def lambda_handler(event, context):
 - 전문적이지만 개인적인 어조를 유지하세요.
 - 주요 이정표나 성과를 누락하지 마세요.
 """
+        boards_json = json.dumps(new_boards, ensure_ascii=False, indent=2)
+        chunk_count = 1
+        if len(new_boards) > 1 and token_budget.estimate_tokens(boards_json) > COMPRESSION_CHUNK_TOKENS:
+            # Large import: summarize chunks concurrently, this call merges them
+            reduce_budget = token_budget.input_budget(COMPRESSION_MAX_TOKENS, system_prompt, prev_summary)
+            partials, chunk_count = map_reduce_boards(DEEPSEEK_API_KEY, new_boards, reduce_budget)
+            new_batch = "=== NEW BATCH OF BOARDS (SUMMARIZED IN CHRONOLOGICAL PARTS) ===\n" + "\n\n".join(
+                f"--- PART {i + 1}/{len(partials)} ---\n{p}" for i, p in enumerate(partials)
+            )
+        else:
+            new_batch = f"=== NEW BATCH OF BOARDS ===\n{boards_json}"
+
         user_content = f"""
 === CURRENT COMPRESSED HISTORY ===
 {prev_summary if prev_summary else "(Empty - This is the start of the archive)"}
 
-=== NEW BATCH OF BOARDS ===
-{json.dumps(new_boards, indent=2)}
+{new_batch}
 
 === INSTRUCTION ===
 업데이트된 압축 기록을 지금 생성하세요. 오직 기록의 텍스트만 반환하세요.
 """
-        llm_payload = {
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            "model": "deepseek-chat",
-            "max_tokens": 4000,
-            "temperature": 0.5
-        }
-        
-        llm_headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {DEEPSEEK_API_KEY}'
-        }
-
-        llm_res = requests.post("https://api.deepseek.com/chat/completions", headers=llm_headers, json=llm_payload, timeout=60)
-        
-        if not llm_res.ok:
-            logger.error(f"DeepSeek API Error: {llm_res.status_code} {llm_res.text}")
-            raise Exception(f"DeepSeek API Error: {llm_res.status_code} - {llm_res.text}")
-
-        llm_data = llm_res.json()
-        new_summary = llm_data['choices'][0]['message']['content']
+        new_summary = deepseek_chat(DEEPSEEK_API_KEY, system_prompt, user_content, COMPRESSION_MAX_TOKENS)
         logger.info(f"Compression successful. New summary length: {len(new_summary)}")
 
 
@@ -221,13 +313,18 @@ def lambda_handler(event, context):
         update_headers = db_headers.copy()
         update_headers["Content-Type"] = "application/json"
         
-        # Use PATCH to update existing row
-        update_url = f"{db_url}?user_id=eq.{user_id}"
-        update_res = requests.patch(update_url, headers=update_headers, json=update_payload, timeout=10)
-        
-        if not update_res.ok:
-             logger.error(f"Update failed: {update_res.status_code} {update_res.text}")
-             raise Exception(f"Database update failed: {update_res.status_code} - {update_res.text}")
+        if pg.enabled():
+            pg.update_user_analysis(
+                user_id, update_payload["compressed_data"], update_payload["boards_since_last_compression"]
+            )
+        else:
+            # Use PATCH to update existing row
+            update_url = f"{db_url}?user_id=eq.{user_id}"
+            update_res = requests.patch(update_url, headers=update_headers, json=update_payload, timeout=10)
+            
+            if not update_res.ok:
+                 logger.error(f"Update failed: {update_res.status_code} {update_res.text}")
+                 raise Exception(f"Database update failed: {update_res.status_code} - {update_res.text}")
 
         logger.info("Database updated successfully.")
 
@@ -237,6 +334,7 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'message': 'Compression successful',
                 'new_summary_length': len(new_summary),
+                'chunks': chunk_count,
                 'preview': new_summary[:100] + "..."
             })
         }
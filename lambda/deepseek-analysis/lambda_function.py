@@ -1,7 +1,247 @@
 import json
 import os
+import time
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import requests
+from archive_common import cassette, deepseek, jsoncodec, token_budget
+from archive_common.auth import valid_internal_signature
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+
+cassette.install()
+
+# Bump a task's version whenever its prompt or parameters change so cached
+# results generated by the old prompt are no longer served.
+PROMPT_VERSIONS = {
+    "quick_insight": "1",
+    "analysis": "1"
+}
+
+# Result cache TTL (0 disables the cache)
+CACHE_TTL_SECONDS = int(os.environ.get("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+
+# Overridable so load tests can point at bench/fake_upstreams.py
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+# Analysis requests whose boards exceed this many (estimated) tokens are
+# analyzed per time window concurrently, then combined in one final call
+ANALYSIS_SINGLE_CALL_TOKENS = int(os.environ.get("ANALYSIS_SINGLE_CALL_TOKENS", "12000"))
+# Preferred size of a time window's boards; grown when there would be too
+# many partial analyses for the final call
+ANALYSIS_PARTITION_TOKENS = int(os.environ.get("ANALYSIS_PARTITION_TOKENS", "8000"))
+# Concurrent DeepSeek calls for the partial analyses
+ANALYSIS_MAX_WORKERS = int(os.environ.get("ANALYSIS_MAX_WORKERS", "4"))
+PARTIAL_ANALYSIS_MAX_TOKENS = 700
+ANALYSIS_MAX_TOKENS = 1024
+
+PARTIAL_ANALYSIS_PROMPT = """당신은 꼼꼼한 데이터 분석가입니다.
+사용자의 활동 보드 중 한 기간의 데이터를 받습니다. 이 분석은 다른 기간의 분석과 합쳐져 전체 격려 메시지를 만드는 데 쓰입니다.
+
+- **반드시 한국어로 작성하세요.**
+- 이 기간의 주요 활동, 반복되는 패턴, 성과와 변화, 눈에 띄는 날짜를 5-8개의 짧은 항목으로 정리하세요.
+- 보드에 없는 내용은 만들지 마세요.
+- 오직 항목 목록만 반환하세요."""
+
+
+def hash_json(value):
+    """sha256 hex of a canonical JSON encoding of value."""
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def result_cache_key(task, inputs):
+    """Cache key for a task result: task + prompt version + normalized inputs."""
+    return hash_json({"task": task, "prompt_version": PROMPT_VERSIONS[task], "inputs": inputs})
+
+
+def _cache_rest_config():
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY")
+    if CACHE_TTL_SECONDS <= 0 or not supabase_url or not supabase_key:
+        return None
+    return f"{supabase_url}/rest/v1/analysis_cache", {
+        'apikey': supabase_key,
+        'Authorization': f'Bearer {supabase_key}',
+        'Content-Type': 'application/json'
+    }
+
 
+def cache_get(cache_key):
+    """Return the cached result dict for cache_key, or None on miss/error."""
+    config = _cache_rest_config()
+    if not config:
+        return None
+    url, headers = config
+    try:
+        response = requests.get(url, headers=headers, params={
+            "cache_key": f"eq.{cache_key}",
+            "expires_at": f"gt.{datetime.now(timezone.utc).isoformat()}",
+            "select": "result"
+        }, timeout=5)
+        if not response.ok:
+            print(f"WARNING: Cache lookup failed {response.status_code}: {response.text}")
+            return None
+        rows = response.json()
+        return rows[0]["result"] if rows else None
+    except Exception as e:
+        print(f"WARNING: Cache lookup failed: {str(e)}")
+        return None
+
+
+def cache_put(cache_key, task, result, user_id=None, board_ids=None):
+    """Store a task result; board_ids drive invalidation when boards change."""
+    config = _cache_rest_config()
+    if not config:
+        return
+    url, headers = config
+    now = datetime.now(timezone.utc)
+    try:
+        response = requests.post(url, params={"on_conflict": "cache_key"}, headers={
+            **headers,
+            'Prefer': 'resolution=merge-duplicates,return=minimal'
+        }, json={
+            "cache_key": cache_key,
+            "task": task,
+            "user_id": user_id,
+            "board_ids": [str(b) for b in (board_ids or []) if b],
+            "result": result,
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=CACHE_TTL_SECONDS)).isoformat()
+        }, timeout=5)
+        if not response.ok:
+            print(f"WARNING: Cache store failed {response.status_code}: {response.text}")
+    except Exception as e:
+        print(f"WARNING: Cache store failed: {str(e)}")
+
+
+def store_requested(event, body_data):
+    """Whether to honour store=true: only on direct invokes from
+    archive_common.insight.pregenerate_insight (embedding-lambda and the
+    embedding-jobs queue worker), whose payload is signed with the
+    service key. HTTP callers could otherwise overwrite any user's
+    board_insight row."""
+    if not body_data.get("store"):
+        return False
+    if any(key in event for key in ("body", "requestContext", "headers", "httpMethod")):
+        print("WARNING: Ignoring store=true on an HTTP request")
+        return False
+    if not valid_internal_signature(
+        body_data.get("store_signature"), "board_insight", body_data.get("board_id"),
+        body_data.get("user_id"), body_data.get("content_hash"), body_data.get("action", "create")
+    ):
+        print("WARNING: Ignoring store=true without a valid store_signature")
+        return False
+    return True
+
+
+def store_board_insight(body_data, insight):
+    """Upsert a pre-generated quick insight into board_insight via PostgREST.
+
+    Used when embedding-lambda invokes this function asynchronously with
+    store=true (see store_requested); rows are keyed by (board_id,
+    content_hash, action).
+    """
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY")
+    if not supabase_url or not supabase_key:
+        raise Exception("SUPABASE_URL/SUPABASE_KEY required to store insights")
+
+    for field in ("board_id", "user_id", "content_hash"):
+        if not body_data.get(field):
+            raise Exception(f"Missing required field for insight storage: {field}")
+
+    response = requests.post(
+        f"{supabase_url}/rest/v1/board_insight",
+        params={"on_conflict": "board_id,content_hash,action"},
+        headers={
+            'apikey': supabase_key,
+            'Authorization': f'Bearer {supabase_key}',
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates,return=minimal'
+        },
+        json={
+            "board_id": body_data["board_id"],
+            "user_id": body_data["user_id"],
+            "content_hash": body_data["content_hash"],
+            "action": body_data.get("action", "create"),
+            "insight": insight
+        },
+        timeout=10
+    )
+
+    if not response.ok:
+        raise Exception(f"Insight storage failed {response.status_code}: {response.text}")
+
+    print(f"Stored insight for board {body_data['board_id']} ({body_data['content_hash'][:12]}...)")
+
+
+def board_tokens(board):
+    return token_budget.estimate_tokens(json.dumps(board, ensure_ascii=False, indent=2))
+
+
+def partition_boards(boards, budget):
+    """Consecutive time windows of boards, each at most budget tokens: whole
+    months packed together where they fit, a larger month split in order."""
+    months = {}
+    for board in sorted(boards, key=lambda b: str(b.get('date') or '')):
+        months.setdefault(str(board.get('date') or '')[:7], []).append(board)
+    partitions, current, used = [], [], 0
+    for month_boards in months.values():
+        cost = sum(board_tokens(b) for b in month_boards)
+        if current and used + cost > budget:
+            partitions.append(current)
+            current, used = [], 0
+        if cost > budget:
+            partitions.extend(token_budget.chunk_items(month_boards, budget, board_tokens))
+            continue
+        current += month_boards
+        used += cost
+    if current:
+        partitions.append(current)
+    return partitions
+
+
+def partial_analysis(api_key, boards):
+    """Notes on one time window, headed by its date range."""
+    period = f"{boards[0].get('date') or '?'} ~ {boards[-1].get('date') or '?'}"
+    notes = deepseek.chat(api_key, [
+        {"role": "system", "content": PARTIAL_ANALYSIS_PROMPT},
+        {"role": "user", "content": f"기간: {period}\n\n{json.dumps(boards, ensure_ascii=False, indent=2)}"}
+    ], PARTIAL_ANALYSIS_MAX_TOKENS, temperature=0.3, timeout=30)
+    return f"--- {period} (보드 {len(boards)}개) ---\n{notes.strip()}"
+
+
+def analysis_partitions(boards, final_prompt):
+    """Time windows for a large board set, in date order. Window size comes
+    from the token budget: ANALYSIS_PARTITION_TOKENS, or larger when the
+    partial results would not fit the final call."""
+    total = sum(board_tokens(b) for b in boards)
+    max_partitions = max(1, token_budget.input_budget(ANALYSIS_MAX_TOKENS, final_prompt) // PARTIAL_ANALYSIS_MAX_TOKENS)
+    budget = min(
+        token_budget.input_budget(PARTIAL_ANALYSIS_MAX_TOKENS, PARTIAL_ANALYSIS_PROMPT),
+        max(ANALYSIS_PARTITION_TOKENS, -(-total // max_partitions))
+    )
+    partitions = partition_boards(boards, budget)
+    print(f"Large analysis input: {len(boards)} boards (~{total} tokens) in {len(partitions)} time windows")
+    return partitions
+
+
+def analyze_partitions(api_key, partitions):
+    """Partial analyses of the time windows, run concurrently, in order."""
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(ANALYSIS_MAX_WORKERS, len(partitions)))) as pool:
+        # copy_context so the calls stay in the request's trace
+        futures = [pool.submit(contextvars.copy_context().run, partial_analysis, api_key, p) for p in partitions]
+        partials = [f.result() for f in futures]
+    print(f"Partial analyses done in {time.time() - started:.1f}s")
+    return partials
+
+
+@profiled('deepseek-analysis')
+@traced('deepseek-analysis')
 def lambda_handler(event, context):
     # CORS headers for all responses
     cors_headers = {
@@ -25,7 +265,7 @@ def lambda_handler(event, context):
         if 'body' in event:
             # Lambda Function URL format: data is in 'body'
             if isinstance(event.get('body'), str):
-                body_data = json.loads(event.get('body', '{}'))
+                body_data = jsoncodec.loads(event.get('body', '{}'))
             else:
                 body_data = event.get('body', {})
         else:
@@ -109,6 +349,26 @@ Rules:
             tags = target_board.get('tags', [])
             tag_names = [t.get('tag_name', t.get('name', '')) for t in tags if isinstance(t, dict)]
 
+            store = store_requested(event, body_data)
+
+            # Result cache: same content + same related boards -> same insight
+            use_cache = body_data.get("cache", True) is not False
+            cache_key = result_cache_key(task, {
+                "description": description.strip(),
+                "tags": sorted(tag_names),
+                "related": [rb.get('board_id') or hash_json(rb) for rb in related_boards[:5]]
+            })
+            cached = cache_get(cache_key) if use_cache else None
+            if cached is not None:
+                print(f"Cache hit for {task} ({cache_key[:12]}...)")
+                if store:
+                    store_board_insight(body_data, cached['insight'])
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'body': jsoncodec.dumps({**cached, 'cached': True})
+                }
+
             # Build RAG context
             rag_context = ""
             if related_boards:
@@ -166,7 +426,7 @@ Reply in Korean (해요체), max 60 chars:"""
             }
 
             response = requests.post(
-                "https://api.deepseek.com/chat/completions",
+                f"{DEEPSEEK_BASE_URL}/chat/completions",
                 headers=headers,
                 json=payload,
                 timeout=10
@@ -178,10 +438,21 @@ Reply in Korean (해요체), max 60 chars:"""
             result = response.json()
             insight = result['choices'][0]['message']['content'].strip().replace('"', '').rstrip('.')
 
+            # Pre-generation path (async invoke from embedding-lambda)
+            if store:
+                store_board_insight(body_data, insight)
+
+            if use_cache:
+                cache_put(
+                    cache_key, task, {'insight': insight},
+                    user_id=body_data.get("user_id"),
+                    board_ids=[target_board.get('board_id')] + [rb.get('board_id') for rb in related_boards[:5]]
+                )
+
             return {
                 'statusCode': 200,
                 'headers': cors_headers,
-                'body': json.dumps({'insight': insight})
+                'body': jsoncodec.dumps({'insight': insight})
             }
         
         else:
@@ -209,11 +480,24 @@ Reply in Korean (해요체), max 60 chars:"""
                 metrics_list = "\n".join([f"- {m.get('label', 'Metric')}: {m.get('value', 'N/A')}" for m in metrics])
                 metrics_context = f"\n\n=== 주요 하이라이트 (랜덤 선택됨) ===\n{metrics_list}\n\n(이 수치들을 자연스럽게 이야기에 녹여내어 데이터에 기반한 칭찬을 해주세요.)"
 
+            # Result cache: history is keyed by its version (or content hash)
+            use_cache = body_data.get("cache", True) is not False
+            cache_key = result_cache_key(task, {
+                "boards": boards,
+                "metrics": metrics,
+                "history_version": body_data.get("history_version") or hash_json(history)
+            })
+            cached = cache_get(cache_key) if use_cache else None
+            if cached is not None:
+                print(f"Cache hit for {task} ({cache_key[:12]}...)")
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'body': jsoncodec.dumps({**cached, 'cached': True})
+                }
+
             # Prepare Deepseek API request for Analysis
-            payload = {
-                "messages": [
-                    {
-                        "content": f"""당신은 열정적인 퍼스널 라이프 코치이자 데이터 스토리텔러입니다.
+            system_content = f"""당신은 열정적인 퍼스널 라이프 코치이자 데이터 스토리텔러입니다.
     {history_context}
     {metrics_context}
     
@@ -233,13 +517,32 @@ Reply in Korean (해요체), max 60 chars:"""
     CRITICAL:
     - Return ONLY valid JSON.
     - The "analysis" field must contain the ENTIRE message string in Korean.
-    - Do not hallucinate data not present in Boards or Highlights.""",
+    - Do not hallucinate data not present in Boards or Highlights."""
+
+            boards_intro = "최근 활동 보드 데이터입니다"
+            boards_text = json.dumps(boards, indent=2)
+            # Measured unescaped: Korean text costs its characters, not \uXXXX.
+            # Partitioning reads each board's date, so malformed (non-dict)
+            # boards keep the single-call path
+            if (len(boards) > 1 and all(isinstance(b, dict) for b in boards)
+                    and sum(board_tokens(b) for b in boards) > ANALYSIS_SINGLE_CALL_TOKENS):
+                partitions = analysis_partitions(boards, system_content)
+                if len(partitions) > 1:
+                    # Months of boards: analyze time windows concurrently and
+                    # let this call combine them
+                    boards_intro = "활동 보드가 많아 기간별로 먼저 정리한 분석입니다 (시간순)"
+                    boards_text = "\n\n".join(analyze_partitions(DEEPSEEK_API_KEY, partitions))
+
+            payload = {
+                "messages": [
+                    {
+                        "content": system_content,
                         "role": "system"
                     },
                     {
-                        "content": f"""최근 활동 보드 데이터입니다:
+                        "content": f"""{boards_intro}:
     
-    {json.dumps(boards, indent=2)}
+    {boards_text}
     
     데이터를 분석하고 격려의 메시지를 한국어로 작성해주세요.""",
                         "role": "user"
@@ -252,13 +555,13 @@ Reply in Korean (해요체), max 60 chars:"""
                 "thinking": {
                     "type": "disabled"
                 },
-                "max_tokens": 1024,
+                "max_tokens": ANALYSIS_MAX_TOKENS,
                 "temperature": 1,
                 "top_p": 1
             }
 
         response = requests.post(
-            "https://api.deepseek.com/chat/completions",
+            f"{DEEPSEEK_BASE_URL}/chat/completions",
             headers=headers,
             json=payload,
             timeout=30
@@ -300,20 +603,23 @@ Reply in Korean (해요체), max 60 chars:"""
                     # The prompt asks for { analysis: ... }
                     pass
                 
-                # Check guidelines again, previously it returned object { analysis: ... }
-                return {
-                    'statusCode': 200,
-                    'headers': cors_headers,
-                    'body': json.dumps({'analysis': parsed_content})
-                }
-
             except json.JSONDecodeError:
                  # If LLM returned plain text despite instructions
-                 return {
-                    'statusCode': 200,
-                    'headers': cors_headers,
-                    'body': json.dumps({'analysis': content})
-                }
+                 parsed_content = content
+
+            if use_cache:
+                cache_put(
+                    cache_key, task, {'analysis': parsed_content},
+                    user_id=body_data.get("user_id"),
+                    board_ids=[b.get('board_id') for b in boards if isinstance(b, dict)]
+                )
+
+            # Check guidelines again, previously it returned object { analysis: ... }
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': jsoncodec.dumps({'analysis': parsed_content})
+            }
 
     except Exception as error:
         print(f"Analysis error: {str(error)}")
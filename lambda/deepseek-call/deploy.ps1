@@ -49,7 +49,8 @@ if ($LASTEXITCODE -eq 0) {
 
 # Step 3: Build Docker image
 Write-Host "`n[3/7] Building Docker image..." -ForegroundColor Yellow
-docker build --platform linux/amd64 -t $ECR_REPO_NAME .
+# Build context is lambda/ so the image can include shared/archive_common
+docker build --platform linux/amd64 -t $ECR_REPO_NAME -f Dockerfile ..
 if ($LASTEXITCODE -eq 0) {
     Write-Host "✓ Docker image built successfully" -ForegroundColor Green
 } else {
@@ -1,9 +1,100 @@
 import json
 import os
 import requests
-import voyageai
 from supabase import create_client, Client
+from archive_common.embedding import get_embedding_models, get_voyage_client
+from archive_common import cassette, jsoncodec, pg
+from archive_common.auth import AuthError, authorizer_user_id, verify_token
+from archive_common.log import log_event, log_fields
+from archive_common.metrics import emit_metrics
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+from archive_common.vector_codec import match_boards_call
 
+cassette.install()
+
+# Max cosine distance between a new query and a cached one for the cached
+# answer to be reused (0 disables the semantic cache)
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.environ.get("SEMANTIC_CACHE_MAX_DISTANCE", "0.08"))
+
+# Board search path: "exact" (match_boards) or a compact representation
+# re-ranked with exact cosine ("halfvec" / "binary", match_boards_quantized)
+MATCH_BOARDS_MODE = os.environ.get("MATCH_BOARDS_MODE", "exact")
+
+# How the caller is authenticated before Supabase is queried as the user:
+#   session     supabase.auth.set_session (may call GoTrue on every request)
+#   authorizer  trust the user id verified by the API Gateway authorizer
+#   local       verify the access token locally against the project's JWKS
+# In the last two modes the token is handed straight to PostgREST.
+AUTH_MODE = os.environ.get("AUTH_MODE", "session")
+
+# Overridable so load tests can point at bench/fake_upstreams.py
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+
+def semantic_cache_lookup(supabase, user_id, model, embedding):
+    """Find a cached answer for a near-identical query on the same board set.
+
+    Returns (completion or None, board_set_version). Emits hit and nearest
+    similarity metrics so the threshold can be tuned from CloudWatch.
+    """
+    try:
+        rows = supabase.rpc("match_semantic_cache", {
+            "query_embedding": embedding,
+            "query_user_id": user_id,
+            "p_model": model,
+            "max_distance": SEMANTIC_CACHE_MAX_DISTANCE
+        }).execute().data
+    except Exception as e:
+        print(f"WARNING: Semantic cache lookup failed: {str(e)}")
+        return None, None
+
+    row = rows[0] if rows else {}
+    hit = bool(row.get('hit'))
+    metrics = {
+        "SemanticCacheLookup": (1, "Count"),
+        "SemanticCacheHit": (1 if hit else 0, "Count"),
+        "SemanticCacheSimilarityThreshold": (1 - SEMANTIC_CACHE_MAX_DISTANCE, "None")
+    }
+    if row.get('distance') is not None:
+        metrics["SemanticCacheNearestSimilarity"] = (1 - row['distance'], "None")
+    emit_metrics(metrics, dimensions={"Function": "deepseek-call"})
+
+    if hit:
+        print(f"Semantic cache hit (distance {row['distance']:.4f}): '{row.get('cached_query')}'")
+        return row['answer'], row.get('board_set_version')
+    return None, row.get('board_set_version')
+
+
+def semantic_cache_store(supabase, user_id, model, query, embedding, board_set_version, completion):
+    try:
+        supabase.rpc("store_semantic_cache", {
+            "query_user_id": user_id,
+            "p_model": model,
+            "p_query": query,
+            "query_embedding": embedding,
+            "p_board_set_version": board_set_version,
+            "p_answer": completion
+        }).execute()
+    except Exception as e:
+        print(f"WARNING: Semantic cache store failed: {str(e)}")
+
+
+def authenticated_user_id(event, access_token):
+    """Verified user id for AUTH_MODE authorizer/local; raises AuthError."""
+    if AUTH_MODE == "authorizer":
+        user_id = authorizer_user_id(event)
+        if not user_id:
+            raise AuthError("No authorizer context on the request")
+    else:
+        user_id = verify_token(access_token)["sub"]
+    if event.get("user_id") and event["user_id"] != user_id:
+        raise AuthError("user_id does not match the authenticated user")
+    return user_id
+
+
+@profiled('deepseek-call')
+@traced('deepseek-call')
 def lambda_handler(event, context):
     # CORS headers for all responses
     cors_headers = {
@@ -24,7 +115,7 @@ def lambda_handler(event, context):
 
     try:
         print("===Calling Deepseek API start===")
-        print(f"Received event: {json.dumps(event)}")
+        log_event(event)
 
         # env
         supabase_url = os.environ.get("SUPABASE_URL")
@@ -45,18 +136,39 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing environment variables'})
             }
 
+        access_token = event.get('access_token')
+        refresh_token = event.get('refresh_token')
+        # Set once the caller's identity is established; the direct Postgres
+        # search bypasses RLS, so it only runs for this user id
+        verified_user_id = None
+        if AUTH_MODE != "session":
+            try:
+                # Searches below are scoped by user_id, so it must be the caller's
+                event["user_id"] = verified_user_id = authenticated_user_id(event, access_token)
+            except AuthError as e:
+                print(f"ERROR: Authentication failed: {str(e)}")
+                return {
+                    'statusCode': 401,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': 'Unauthorized'})
+                }
+
         # Initialize clients after parsing data
         try:
             print("Initializing VoyageAI client...")
-            vo = voyageai.Client(api_key=voyage_key, timeout=30)
+            vo = get_voyage_client(voyage_key)
             print("VoyageAI client initialized successfully")
 
             print("Initializing Supabase client...")
             # Use the user's token for authentication to respect RLS policies
-            access_token = event.get('access_token')
-            refresh_token = event.get('refresh_token')
             supabase: Client = create_client(supabase_url, supabase_key)
-            supabase.auth.set_session(access_token, refresh_token)
+            if AUTH_MODE == "session":
+                session = supabase.auth.set_session(access_token, refresh_token)
+                if session and session.user:
+                    verified_user_id = session.user.id
+            else:
+                # PostgREST checks the token's signature itself for RLS
+                supabase.postgrest.auth(access_token)
             print("Supabase client initialized successfully")
 
         except Exception as e:
@@ -73,7 +185,9 @@ def lambda_handler(event, context):
         print(f"User query received: '{user_query}'")
 
         try:
-            result = vo.embed(texts=[user_query], input_type="query", model="voyage-3")
+            # Queries must use the model that produced the stored board vectors
+            embedding_model, _ = get_embedding_models(supabase)
+            result = vo.embed(texts=[user_query], input_type="query", model=embedding_model)
             combined_embedding = result.embeddings[0]
 
             print(f"Embedding generated successfully, dimension: {len(combined_embedding)}")
@@ -85,17 +199,51 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': f'Embedding failed: {str(e)}'})
             }
         
+        # Reuse the answer to a near-identical question on the same board set
+        model = event.get("model", "deepseek-chat")
+        use_semantic_cache = (
+            SEMANTIC_CACHE_MAX_DISTANCE > 0
+            and event.get("task") != "search_only"
+            and isinstance(user_query, str) and user_query.strip() != ""
+            and event.get("cache", True) is not False
+        )
+        board_set_version = None
+        if use_semantic_cache:
+            cached_completion, board_set_version = semantic_cache_lookup(
+                supabase, event.get("user_id"), model, combined_embedding
+            )
+            if cached_completion is not None:
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'body': jsoncodec.dumps({**cached_completion, 'cached': True})
+                }
+
         # do a similarity search in supabase
         try:
             print("Performing similarity search in Supabase...")
-            similarity_response = supabase.rpc("match_boards", {
-                "query_embedding": combined_embedding,
-                "query_user_id": event.get("user_id"),
-                "match_threshold": 0.0,  # No threshold for debugging
-                "match_count": 20
-            }).execute()
-
-            relevant_boards = similarity_response.data
+            relevant_boards = None
+            if pg.enabled() and verified_user_id and verified_user_id == event.get("user_id"):
+                # Direct pooled connection (DATABASE_URL); PostgREST, scoped by
+                # RLS, is the fallback and the path for unverified user ids
+                try:
+                    relevant_boards = pg.match_boards(
+                        combined_embedding, event.get("user_id"),
+                        match_threshold=0.0, match_count=20, search_mode=MATCH_BOARDS_MODE
+                    )
+                except Exception as e:
+                    print(f"WARNING: Direct Postgres search failed, using PostgREST: {str(e)}")
+            if relevant_boards is None:
+                # VECTOR_WIRE_FORMAT=float32/float16 sends the embedding as base64 bytes
+                rpc_name, match_params = match_boards_call(
+                    combined_embedding,
+                    event.get("user_id"),
+                    match_threshold=0.0,  # No threshold for debugging
+                    match_count=20,
+                    search_mode=MATCH_BOARDS_MODE
+                )
+                similarity_response = supabase.rpc(rpc_name, match_params).execute()
+                relevant_boards = similarity_response.data
             print(f"Found {len(relevant_boards)} relevant boards")
 
             # Format boards as JSON object
@@ -107,7 +255,8 @@ def lambda_handler(event, context):
                 }
                 for i, board in enumerate(relevant_boards)
             }
-            print(f"Boards JSON: {json.dumps(boards_dict)}")
+            log_fields("boards", count=len(boards_dict), dates=[b["date"] for b in boards_dict.values()])
+            log_fields("boards_sample", sampled_only=True, boards=boards_dict)
 
             # Format board context for LLM
             board_context = "\n".join([
@@ -122,7 +271,7 @@ def lambda_handler(event, context):
                 return {
                     'statusCode': 200,
                     'headers': cors_headers,
-                    'body': json.dumps({
+                    'body': jsoncodec.dumps({
                         'boards': relevant_boards,
                         'count': len(relevant_boards)
                     })
@@ -151,7 +300,7 @@ def lambda_handler(event, context):
                  deepseek_messages.insert(0, context_message)
 
         deepseek_request = {
-            "model": event.get("model", "deepseek-chat"),
+            "model": model,
             "messages": deepseek_messages,
             "temperature": event.get("temperature", 0.7),
             "max_tokens": event.get("max_tokens", 1000)
@@ -160,7 +309,7 @@ def lambda_handler(event, context):
         # Call Deepseek API
         print("Calling Deepseek API with board context...")
         deepseek_response = requests.post(
-            'https://api.deepseek.com/v1/chat/completions',
+            f'{DEEPSEEK_BASE_URL}/v1/chat/completions',
             headers={
                 'Authorization': f'Bearer {deepseek_key}',
                 'Content-Type': 'application/json'
@@ -175,13 +324,19 @@ def lambda_handler(event, context):
             error_text = deepseek_response.text
             raise Exception(f"Deepseek API error {deepseek_response.status_code}: {error_text}")
 
-        completion = deepseek_response.json()
-        print(f"Response: {completion['choices'][0]['message']['content']}")
+        completion = jsoncodec.loads(deepseek_response.content)
+        log_fields("completion", content=completion['choices'][0]['message']['content'], usage=completion.get('usage'))
+
+        if use_semantic_cache and board_set_version is not None:
+            semantic_cache_store(
+                supabase, event.get("user_id"), model, user_query,
+                combined_embedding, board_set_version, completion
+            )
 
         return {
             'statusCode': 200,
             'headers': cors_headers,
-            'body': json.dumps(completion)
+            'body': jsoncodec.dumps(completion)
         }
 
     except json.JSONDecodeError as e:
@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+from supabase import create_client, Client
+from archive_common import cassette, tracing
+from archive_common.embedding import board_text, embed_boards, get_embedding_models, get_voyage_client, load_image
+from archive_common.insight import board_content_hash, pregenerate_insight
+from archive_common.log import log_fields
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+
+cassette.install()
+
+# Batch jobs over the board table, invoked on a schedule (EventBridge) or
+# locally: python lambda_function.py '{"task": "backfill"}'
+#
+#   backfill     re-embed every board with embedding_config.next_model
+#   repair       re-embed boards whose vector is missing
+#   drain_queue  embed boards queued by embedding-lambda in write-behind mode,
+#                then pre-generate their quick insights (INSIGHT_FUNCTION_NAME)
+#
+# Each invocation works until its time budget runs low and records progress,
+# so the next invocation resumes where this one stopped.
+
+BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+REQUESTS_PER_MINUTE = float(os.environ.get("VOYAGE_REQUESTS_PER_MINUTE", "60"))
+MAX_PASSES = int(os.environ.get("BACKFILL_MAX_PASSES", "5"))
+REPAIR_MAX_ATTEMPTS = int(os.environ.get("REPAIR_MAX_ATTEMPTS", "5"))
+
+# Write-behind queue: collect up to QUEUE_BATCH_SIZE jobs, waiting at most
+# QUEUE_WINDOW_SECONDS after the first one, per Voyage request
+QUEUE_BATCH_SIZE = int(os.environ.get("QUEUE_BATCH_SIZE", "32"))
+QUEUE_WINDOW_SECONDS = float(os.environ.get("QUEUE_WINDOW_SECONDS", "2"))
+QUEUE_LEASE_SECONDS = int(os.environ.get("QUEUE_LEASE_SECONDS", "120"))
+QUEUE_MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", "5"))
+
+# Stop starting new batches when less than this is left of the invocation
+TIME_MARGIN_MS = 30000
+
+
+class RateLimiter:
+    """Spaces upstream requests to at most `per_minute` per minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def has_time(context):
+    return context is None or context.get_remaining_time_in_millis() > TIME_MARGIN_MS
+
+
+def embed_with_retry(vo, limiter, items, model, attempts=3):
+    """Embed one batch, backing off on transient (e.g. 429) failures."""
+    for attempt in range(attempts):
+        limiter.wait()
+        try:
+            return embed_boards(vo, items, model)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = 2 ** attempt * 5
+            print(f"WARNING: Embedding batch failed ({str(e)}), retrying in {delay}s")
+            time.sleep(delay)
+
+
+def embed_isolating_failures(vo, limiter, items, model):
+    """Embed a batch; if the batch request fails, retry item by item.
+
+    Returns a list with a vector or an Exception per item, so one bad board
+    doesn't fail the others.
+    """
+    try:
+        return list(embed_with_retry(vo, limiter, items, model))
+    except Exception as e:
+        print(f"WARNING: Batch of {len(items)} failed ({str(e)}), retrying boards one by one")
+    results = []
+    for item in items:
+        try:
+            results.append(embed_with_retry(vo, limiter, [item], model, attempts=1)[0])
+        except Exception as item_error:
+            results.append(item_error)
+    return results
+
+
+def run_backfill(supabase, vo, event, context):
+    """Fill board.vector_next with the target model, then promote it.
+
+    Boards are scanned in board_id order (keyset pagination) from the
+    checkpoint. A pass that reaches the end starts over for boards that were
+    skipped or edited meanwhile, until none remain or MAX_PASSES is hit.
+    """
+    _, next_model = get_embedding_models(supabase)
+    target_model = event.get("target_model") or next_model
+    if not target_model:
+        return {'status': 'idle', 'message': 'No embedding_config.next_model configured'}
+
+    batch_size = int(event.get("batch_size", BATCH_SIZE))
+    limiter = RateLimiter(float(event.get("requests_per_minute", REQUESTS_PER_MINUTE)))
+
+    rows = supabase.table("embedding_backfill_checkpoint").select("*").eq("target_model", target_model).execute().data
+    checkpoint = rows[0] if rows else {
+        "target_model": target_model,
+        "last_board_id": None,
+        "processed": 0,
+        "failed": 0,
+        "passes": 0
+    }
+    print(f"Backfill to {target_model} resuming after {checkpoint['last_board_id']} "
+          f"(processed: {checkpoint['processed']}, failed: {checkpoint['failed']}, pass: {checkpoint['passes'] + 1})")
+
+    def save_checkpoint():
+        checkpoint["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        supabase.table("embedding_backfill_checkpoint").upsert(checkpoint).execute()
+
+    while has_time(context):
+        batch = supabase.rpc("embedding_backfill_batch", {
+            "p_model": target_model,
+            "p_after": checkpoint["last_board_id"],
+            "p_limit": batch_size
+        }).execute().data
+
+        if not batch:
+            remaining = supabase.rpc("embedding_backfill_remaining", {"p_model": target_model}).execute().data
+            if remaining:
+                if checkpoint["passes"] + 1 >= MAX_PASSES:
+                    save_checkpoint()
+                    return {'status': 'stalled', 'target_model': target_model, 'remaining': remaining, **checkpoint}
+                print(f"Pass complete, {remaining} boards still missing; starting another pass")
+                checkpoint["last_board_id"] = None
+                checkpoint["passes"] += 1
+                save_checkpoint()
+                continue
+
+            save_checkpoint()
+            if event.get("promote", True) is False:
+                return {'status': 'covered', 'target_model': target_model, **checkpoint}
+            promoted = supabase.rpc("promote_embedding_model", {"p_model": target_model}).execute().data
+            print(f"Promoted {target_model}: {promoted} boards switched")
+            return {'status': 'promoted', 'target_model': target_model, 'promoted': promoted, **checkpoint}
+
+        items = [(board_text(b['description'], b['tags'], b['date']), load_image(b.get('image'))) for b in batch]
+        try:
+            vectors = embed_with_retry(vo, limiter, items, target_model)
+            applied = supabase.rpc("apply_shadow_vectors", {
+                "p_model": target_model,
+                "p_rows": [
+                    {"board_id": b['board_id'], "content_hash": b['content_hash'], "vector": v}
+                    for b, v in zip(batch, vectors)
+                ]
+            }).execute().data or 0
+            checkpoint["processed"] += applied
+            if applied < len(batch):
+                # Edited while being embedded; the next pass re-reads them
+                print(f"{len(batch) - applied} boards changed during embedding, left for the next pass")
+        except Exception as e:
+            # Skip the page; the next pass picks these boards up again
+            print(f"ERROR: Batch after {checkpoint['last_board_id']} failed: {str(e)}")
+            checkpoint["failed"] += len(batch)
+
+        checkpoint["last_board_id"] = batch[-1]['board_id']
+        save_checkpoint()
+        print(f"Backfill progress: processed {checkpoint['processed']}, failed {checkpoint['failed']}")
+
+    return {'status': 'in_progress', 'target_model': target_model, **checkpoint}
+
+
+def run_repair(supabase, vo, event, context):
+    """Re-embed boards left without a vector by failed embeddings, or by
+    writes made with a model that is no longer active (see
+    reject_stale_model_vector in sql/embedding_backfill.sql).
+
+    Per-board failures go to embedding_repair with backoff until
+    REPAIR_MAX_ATTEMPTS is reached; so does a vector the database did not
+    take (content edited meanwhile, or a promotion since the model was read).
+    """
+    batch_size = int(event.get("batch_size", BATCH_SIZE))
+    max_attempts = int(event.get("max_attempts", REPAIR_MAX_ATTEMPTS))
+    limiter = RateLimiter(float(event.get("requests_per_minute", REQUESTS_PER_MINUTE)))
+    repaired, failed = 0, 0
+    active_model = None
+
+    def record_failure(board_id, error):
+        supabase.rpc("record_embedding_repair_failure", {
+            "p_board_id": board_id,
+            "p_error": str(error)[:1000]
+        }).execute()
+
+    while has_time(context):
+        # Per batch: a promotion mid-run must not be repaired with the old model
+        active_model, _ = get_embedding_models(supabase, max_age=0)
+        batch = supabase.rpc("embedding_repair_batch", {
+            "p_limit": batch_size,
+            "p_max_attempts": max_attempts
+        }).execute().data
+        if not batch:
+            return {'status': 'done', 'model': active_model, 'repaired': repaired, 'failed': failed}
+
+        items = [(board_text(b['description'], b['tags'], b['date']), load_image(b.get('image'))) for b in batch]
+        embedded = []
+        for board, result in zip(batch, embed_isolating_failures(vo, limiter, items, active_model)):
+            if isinstance(result, Exception):
+                record_failure(board['board_id'], result)
+                failed += 1
+            else:
+                embedded.append((board, result))
+
+        if embedded:
+            outcomes = supabase.rpc("apply_board_vectors", {
+                "p_model": active_model,
+                "p_rows": [
+                    {"board_id": b['board_id'], "content_hash": b['content_hash'], "vector": v}
+                    for b, v in embedded
+                ]
+            }).execute().data or []
+            for row in outcomes:
+                if row['outcome'] == 'applied':
+                    repaired += 1
+                elif row['outcome'] == 'rejected':
+                    record_failure(row['board_id'], f"Vector not applied ({active_model}): "
+                                                    "board edited or model no longer active")
+                    failed += 1
+        print(f"Repair progress: repaired {repaired}, failed {failed}")
+
+    return {'status': 'in_progress', 'model': active_model, 'repaired': repaired, 'failed': failed}
+
+
+def claim_jobs(supabase, limit):
+    return supabase.rpc("claim_embedding_jobs", {
+        "p_limit": limit,
+        "p_lease_seconds": QUEUE_LEASE_SECONDS,
+        "p_max_attempts": QUEUE_MAX_ATTEMPTS
+    }).execute().data or []
+
+
+def queue_insights(supabase, jobs, completed, applied):
+    """Same quick_insight pre-generation embedding-lambda does after a
+    synchronous embedding, for the queued boards whose vector landed."""
+    vectors = {row['board_id']: row['vector'] for row in completed}
+    for job in jobs:
+        payload = job['payload']
+        if job['board_id'] not in applied or payload.get('pregenerate_insight') is False:
+            continue
+        tags = payload.get('tags') or []
+        data = {
+            'board_id': job['board_id'],
+            'user_id': job['user_id'],
+            'description': payload.get('description'),
+            'tags': tags,
+            'date': payload.get('date'),
+            'action': payload.get('action', 'create')
+        }
+        content_hash = board_content_hash(data['description'], tags, data['date'])
+        with tracing.span("pregenerate insight", parent=payload.get('traceparent'), board_id=job['board_id']):
+            pregenerate_insight(supabase, data, vectors[job['board_id']], content_hash)
+
+
+def run_drain_queue(supabase, vo, event, context):
+    """Embed queued boards (write-behind mode) in micro-batches.
+
+    After the first job is claimed, keeps collecting for up to window_seconds
+    or until batch_size jobs are in hand, then embeds the whole batch with one
+    Voyage request. Runs until the queue is empty or time runs low.
+    """
+    active_model, next_model = get_embedding_models(supabase)
+    batch_size = int(event.get("batch_size", QUEUE_BATCH_SIZE))
+    window_seconds = float(event.get("window_seconds", QUEUE_WINDOW_SECONDS))
+    limiter = RateLimiter(float(event.get("requests_per_minute", REQUESTS_PER_MINUTE)))
+    embedded_count, failed, batches = 0, 0, 0
+
+    while has_time(context):
+        jobs = claim_jobs(supabase, batch_size)
+        if not jobs:
+            return {'status': 'empty', 'model': active_model, 'embedded': embedded_count,
+                    'failed': failed, 'batches': batches}
+
+        deadline = time.monotonic() + window_seconds
+        while len(jobs) < batch_size and time.monotonic() < deadline:
+            time.sleep(min(0.25, max(0.0, deadline - time.monotonic())))
+            jobs += claim_jobs(supabase, batch_size - len(jobs))
+
+        items = [
+            (board_text(j['payload'].get('description'), j['payload'].get('tags'), j['payload'].get('date')),
+             load_image(j['payload'].get('image')))
+            for j in jobs
+        ]
+        print(f"Embedding batch of {len(jobs)} queued boards")
+        batch_start_ns = time.time_ns()
+        results = embed_isolating_failures(vo, limiter, items, active_model)
+
+        shadow = [None] * len(jobs)
+        if next_model and next_model != active_model:
+            # Same dual-write as embedding-lambda while a backfill is running
+            shadow = embed_isolating_failures(vo, limiter, items, next_model)
+
+        completed, errors = [], []
+        for job, result, shadow_result in zip(jobs, results, shadow):
+            if isinstance(result, Exception):
+                errors.append({"board_id": job['board_id'], "error": str(result)[:1000]})
+                continue
+            row = {"board_id": job['board_id'], "job_version": job['job_version'], "vector": result}
+            if shadow_result is not None and not isinstance(shadow_result, Exception):
+                row["vector_next"] = shadow_result
+            completed.append(row)
+
+        if completed:
+            applied = {row['board_id'] for row in supabase.rpc("complete_embedding_jobs", {
+                "p_model": active_model,
+                "p_next_model": next_model,
+                "p_rows": completed
+            }).execute().data or []}
+            queue_insights(supabase, jobs, completed, applied)
+        if errors:
+            supabase.rpc("fail_embedding_jobs", {"p_rows": errors}).execute()
+        failed_ids = {e['board_id'] for e in errors}
+        for job in jobs:
+            tracing.record("embed queued board", job['payload'].get('traceparent'), batch_start_ns,
+                           **{"board_id": job['board_id'], "batch.size": len(jobs),
+                              "error": job['board_id'] in failed_ids})
+
+        embedded_count += len(completed)
+        failed += len(errors)
+        batches += 1
+        print(f"Queue progress: embedded {embedded_count}, failed {failed}, batches {batches}")
+
+    return {'status': 'in_progress', 'model': active_model, 'embedded': embedded_count,
+            'failed': failed, 'batches': batches}
+
+
+TASKS = {
+    "backfill": run_backfill,
+    "repair": run_repair,
+    "drain_queue": run_drain_queue
+}
+
+
+@profiled('embedding-jobs')
+@traced('embedding-jobs')
+def lambda_handler(event, context):
+    print("=== Embedding jobs started ===")
+    log_fields("event", event=event)
+
+    task = event.get("task", "backfill")
+    if task not in TASKS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'Unknown task: {task}'})
+        }
+
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY")
+    voyage_key = os.environ.get("VOYAGE_KEY")
+
+    if not all([supabase_url, supabase_key, voyage_key]):
+        print("ERROR: Missing environment variables")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Missing environment variables'})
+        }
+
+    try:
+        vo = get_voyage_client(voyage_key)
+        supabase: Client = create_client(supabase_url, supabase_key)
+
+        result = TASKS[task](supabase, vo, event, context)
+        print(f"=== Embedding jobs finished: {result.get('status')} ===")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result, default=str)
+        }
+
+    except Exception as e:
+        print(f"ERROR: Task {task} failed: {str(e)}")
+        import traceback
+        print(f"Traceback: {traceback.format_exc()}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': f'{task} failed: {str(e)}'})
+        }
+
+
+if __name__ == "__main__":
+    print(lambda_handler(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}, None))
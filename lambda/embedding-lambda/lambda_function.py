@@ -1,20 +1,69 @@
 import os
 import json
 import base64
-import requests
-from io import BytesIO
-from PIL import Image
-import voyageai
-from supabase import create_client, Client
+from archive_common.embedding import board_text, embed_boards, get_embedding_models, get_voyage_client, load_image
+from archive_common import cassette, jsoncodec, pg, tracing
+from archive_common.auth import authorizer_user_id
+from archive_common.insight import board_content_hash, pregenerate_insight
+from archive_common.log import log_event
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+from archive_common.idempotency import idempotent
+from archive_common.rest import create_client
+from archive_common.vector_codec import STORED_FORMAT, WIRE_FORMAT, encode_vector
 
+cassette.install()
+
+
+def enqueue_embedding(supabase, data):
+    """Write-behind mode: queue the board for the embedding-jobs drain_queue
+    task instead of calling Voyage inline, and nudge the worker.
+
+    Returns the job version (re-saving a queued board replaces its payload).
+    """
+    job_version = supabase.rpc("enqueue_embedding_job", {
+        "p_board_id": data['board_id'],
+        "p_user_id": data['user_id'],
+        "p_payload": {
+            'description': data['description'],
+            'tags': data['tags'],
+            'date': data['date'],
+            'image': data.get('image'),
+            # The worker pre-generates the quick insight once the vector lands
+            'action': data.get('action', 'create'),
+            'pregenerate_insight': data.get('pregenerate_insight') is not False,
+            # Lets the worker's batch show up in this request's trace
+            'traceparent': tracing.current_traceparent()
+        }
+    }).execute().data
+
+    worker = os.environ.get("EMBEDDING_WORKER_FUNCTION")
+    if worker:
+        try:
+            import boto3
+            with tracing.span(f"invoke {worker}", kind=tracing.CLIENT, **{"faas.invoked_name": worker}):
+                boto3.client('lambda').invoke(
+                    FunctionName=worker,
+                    InvocationType='Event',
+                    Payload=json.dumps(tracing.inject({'task': 'drain_queue'})).encode('utf-8')
+                )
+        except Exception as e:
+            # The scheduled drain picks the job up instead
+            print(f"WARNING: Failed to nudge embedding worker {worker}: {str(e)}")
+    return job_version
+
+
+@profiled('embedding-lambda')
+@traced('embedding-lambda')
+@idempotent('embedding-lambda')
 def lambda_handler(event, context):
     print("=== Lambda function started ===")
-    print(f"Event: {json.dumps(event)}")
+    log_event(event)
 
     # CORS headers for all responses
     cors_headers = {
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key',
         'Access-Control-Allow-Methods': 'POST,OPTIONS'
     }
 
@@ -82,11 +131,11 @@ def lambda_handler(event, context):
                         'body': json.dumps({'error': 'Invalid base64 body'})
                     }
             try:
-                data = json.loads(body_raw)
+                data = jsoncodec.loads(body_raw)
                 print(f"Parsed data from JSON string")
-            except json.JSONDecodeError as e:
+            except jsoncodec.JSONDecodeError as e:
                 print(f"ERROR: JSON parse failed: {str(e)}")
-                print(f"Failed to parse: {repr(body_raw)}")
+                print(f"Failed to parse: {repr(body_raw)[:200]}")
                 return {
                     'statusCode': 400,
                     'headers': cors_headers,
@@ -95,14 +144,11 @@ def lambda_handler(event, context):
 
     print(f"Parsed data keys: {list(data.keys())}")
 
-    # Initialize clients after parsing data
+    # Initialize clients after parsing data. The VoyageAI client is created
+    # lazily below: write-behind requests never embed.
     try:
-        print("Initializing VoyageAI client...")
-        vo = voyageai.Client(api_key=voyage_key, timeout=30)
-        print("VoyageAI client initialized successfully")
-
         print("Initializing Supabase client with service key...")
-        supabase: Client = create_client(
+        supabase = create_client(
             supabase_url, 
             supabase_key
         )
@@ -136,41 +182,59 @@ def lambda_handler(event, context):
     print(f"Tags: {data['tags']}")
     print(f"Date: {data['date']}")
 
+    # Write-behind mode: enqueue and return; the worker embeds in micro-batches
+    write_behind = data.get("write_behind", os.environ.get("EMBEDDING_WRITE_BEHIND", "false").lower() == "true")
+    if write_behind:
+        try:
+            job_version = enqueue_embedding(supabase, data)
+            print(f"Queued board {data['board_id']} for embedding (job version {job_version})")
+        except Exception as e:
+            print(f"ERROR: Enqueue failed: {str(e)}")
+            return {
+                'statusCode': 500,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f'Enqueue failed: {str(e)}'})
+            }
+        return {
+            'statusCode': 202,
+            'headers': cors_headers,
+            'body': json.dumps({
+                'message': 'Queued for embedding',
+                'board_id': data['board_id'],
+                'job_version': job_version
+            })
+        }
+
+    try:
+        print("Initializing VoyageAI client...")
+        vo = get_voyage_client(voyage_key)
+        print("VoyageAI client initialized successfully")
+    except Exception as e:
+        print(f"ERROR: Client initialization failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': cors_headers,
+            'body': json.dumps({'error': f'Client initialization failed: {str(e)}'})
+        }
+
     # Download and open image (optional) 
-    image_obj = None
     image_url = data.get("image")
     if image_url:
         print(f"Downloading image from: {image_url}")
-        try:
-            img_response = requests.get(image_url, timeout=10)
-            img_response.raise_for_status()
-            image_obj = Image.open(BytesIO(img_response.content))
-            print(f"Image downloaded successfully, size: {image_obj.size}")
-        except Exception as e:
-            # Log — continue with text-only
-            print(f"WARNING: Image load failed (proceeding with text-only): {str(e)}")
     else:
         print("No image URL provided, using text-only embedding")
+    image_obj = load_image(image_url)
 
     # Prepare text content
-    text_content = f"Description: {data['description']}, Tags: {', '.join(data['tags'])}, Date: {data['date']}"
+    text_content = board_text(data['description'], data['tags'], data['date'])
     print(f"Text content prepared: {text_content[:100]}...")
 
     # Generate embedding 
-    print("Generating embedding with VoyageAI...")
+    active_model, next_model = get_embedding_models(supabase)
+    print(f"Generating embedding with VoyageAI ({active_model})...")
     try:
-        inputs = [[text_content, image_obj]] if image_obj is not None else [[text_content]]
         print(f"Input type: {'multimodal (text + image)' if image_obj else 'text-only'}")
-
-        # Try multimodal first, fallback to text-only if it fails
-        try:
-            result = vo.multimodal_embed(inputs=inputs, model="voyage-3")
-        except Exception as multimodal_error:
-            print(f"Multimodal embedding failed, trying text-only: {str(multimodal_error)}")
-            if image_obj is not None:
-                print("Falling back to text-only embedding (ignoring image)")
-            result = vo.embed(texts=[text_content], model="voyage-3")
-        combined_embedding = result.embeddings[0]
+        combined_embedding = embed_boards(vo, [(text_content, image_obj)], active_model)[0]
 
         print(f"Embedding generated successfully, dimension: {len(combined_embedding)}")
     except Exception as e:
@@ -181,19 +245,58 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': f'Embedding failed: {str(e)}'})
         }
 
+    board_update = {
+        "vector": combined_embedding,
+        "embedding_model": active_model
+    }
+
+    # Dual-write the shadow column while a backfill to a new model is running
+    if next_model and next_model != active_model:
+        try:
+            board_update["vector_next"] = embed_boards(vo, [(text_content, image_obj)], next_model)[0]
+            board_update["embedding_model_next"] = next_model
+            print(f"Shadow embedding generated with {next_model}")
+        except Exception as e:
+            # The backfill job re-embeds boards missing a shadow vector
+            print(f"WARNING: Shadow embedding with {next_model} failed: {str(e)}")
+
     # Update Supabase using Supabase client
     print(f"Updating Supabase board table for board_id: {data['board_id']}...")
     try:
         # Update the board with the embedding vector
         # Filter by both board_id AND user_id for security
-        result = supabase.table("board").update({
-            "vector": combined_embedding
-        }).eq("board_id", data['board_id']).eq("user_id", data['user_id']).execute()
+        if pg.enabled():
+            # Direct pooled connection (DATABASE_URL), bypassing PostgREST
+            result = updated_rows = pg.set_board_vector(
+                data['board_id'], data['user_id'],
+                board_update["vector"], board_update["embedding_model"],
+                board_update.get("vector_next"), board_update.get("embedding_model_next")
+            )
+        elif WIRE_FORMAT != "json":
+            # Compact write: base64 vector bytes decoded by set_board_vector_b64
+            result = supabase.rpc("set_board_vector_b64", {
+                "p_board_id": data['board_id'],
+                "p_user_id": data['user_id'],
+                "p_vector": encode_vector(board_update["vector"], STORED_FORMAT),
+                "p_model": board_update["embedding_model"],
+                "p_format": STORED_FORMAT,
+                "p_vector_next": (
+                    encode_vector(board_update["vector_next"], STORED_FORMAT)
+                    if "vector_next" in board_update else None
+                ),
+                "p_next_model": board_update.get("embedding_model_next")
+            }).execute()
+            updated_rows = result.data or 0
+        else:
+            result = supabase.table("board").update(board_update).eq(
+                "board_id", data['board_id']
+            ).eq("user_id", data['user_id']).execute()
+            updated_rows = len(result.data) if result.data else 0
 
         print(f"Supabase update result: {result}")
         
-        if result.data and len(result.data) > 0:
-            print(f"Successfully updated {len(result.data)} row(s)")
+        if updated_rows > 0:
+            print(f"Successfully updated {updated_rows} row(s)")
         else:
             print(f"WARNING: No rows were updated. Board ID {data['board_id']} may not exist in database")
 
@@ -208,6 +311,12 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': f'Supabase update failed: {str(e)}'})
         }
 
+    # Pre-generate the quick insight in the background (optional)
+    content_hash = board_content_hash(data['description'], data['tags'], data['date'])
+    insight_pending = pregenerate_insight(
+        supabase, data, combined_embedding, content_hash, verified_user_id=authorizer_user_id(event)
+    )
+
     # Success
     print("=== Lambda function completed successfully ===")
     return {
@@ -216,6 +325,9 @@ def lambda_handler(event, context):
         'body': json.dumps({
             'message': 'Vectorized successfully',
             'embedding_dim': len(combined_embedding),
-            'board_id': data['board_id']
+            'embedding_model': active_model,
+            'board_id': data['board_id'],
+            'content_hash': content_hash,
+            'insight_pending': insight_pending
         })
     }
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Prune embedding-lambda's installed dependencies (by default the vendored
+layer, python/lib/python3.12/site-packages) down to the packages it imports.
+
+The import set is traced in a fresh interpreter: lambda_function plus the
+modules the handler imports lazily on the embedding path (LAZY_IMPORTS).
+A distribution is kept whole (its dist-info and every top-level entry in
+its RECORD, e.g. the pillow.libs shared libraries PIL loads with dlopen) when
+any of its entries is imported; everything else in site-packages is listed,
+and deleted with --apply. After pruning the trace runs again and fails if
+an import that worked before no longer does.
+
+The Dockerfile runs it on the installed requirements as a build step. Run
+it with the Lambda runtime's Python so compiled wheels load, e.g. for the
+checked-in layer:
+
+    docker run --rm -v "$PWD/lambda:/lambda" -w /lambda/embedding-lambda \\
+      --entrypoint python public.ecr.aws/lambda/python:3.12 prune_layer.py --apply
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_SITE_PACKAGES = HERE / "python" / "lib" / "python3.12" / "site-packages"
+SHARED_DIR = HERE.parent / "shared"
+
+# Imported inside functions, so a plain `import lambda_function` misses them
+LAZY_IMPORTS = [
+    "voyageai",
+    "PIL.Image",
+    "PIL.JpegImagePlugin",
+    "PIL.PngImagePlugin",
+    "PIL.WebPImagePlugin",
+    "psycopg",
+    "psycopg_pool",
+    "psycopg.rows",
+]
+
+# Packages imported only while a request is in flight (encodings, DNS, TLS)
+ALWAYS_KEEP = {"certifi", "charset_normalizer", "idna", "urllib3"}
+
+TRACE_SCRIPT = """
+import importlib, json, sys
+sys.path[:0] = {paths!r}
+import lambda_function
+skipped = []
+for name in {lazy!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError as e:
+        skipped.append(name)
+        print(f"skipped lazy import {{name}}: {{e}}", file=sys.stderr)
+files = sorted({{getattr(m, "__file__", None) or "" for m in list(sys.modules.values())}})
+print(json.dumps({{"files": files, "skipped": skipped}}))
+"""
+
+
+def trace_imports(site_packages):
+    """(files of every loaded module, lazy imports that failed)."""
+    script = TRACE_SCRIPT.format(paths=[str(HERE), str(SHARED_DIR), str(site_packages)], lazy=LAZY_IMPORTS)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Import trace failed:\n{result.stderr}")
+    if result.stderr:
+        print(result.stderr, end="")
+    traced = json.loads(result.stdout.strip().splitlines()[-1])
+    return traced["files"], set(traced["skipped"])
+
+
+def used_top_level(site_packages, files):
+    used = set()
+    for file in files:
+        try:
+            relative = Path(file).resolve().relative_to(site_packages.resolve())
+        except ValueError:
+            continue
+        used.add(relative.parts[0])
+    return used
+
+
+def dist_info_owners(site_packages):
+    """{dist-info dir name: top-level entries listed in its RECORD}."""
+    owners = {}
+    for dist_info in site_packages.glob("*.dist-info"):
+        record = dist_info / "RECORD"
+        entries = set()
+        if record.exists():
+            for line in record.read_text(encoding="utf-8").splitlines():
+                top = line.split(",", 1)[0].split("/", 1)[0]
+                if top and not top.endswith(".dist-info") and top not in ("..", "__pycache__"):
+                    entries.add(top)
+        owners[dist_info.name] = entries
+    return owners
+
+
+def entry_size(path):
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--site-packages", type=Path, default=DEFAULT_SITE_PACKAGES)
+    parser.add_argument("--keep", action="append", default=[], help="extra top-level entry to keep")
+    parser.add_argument("--apply", action="store_true", help="delete (default is a dry run)")
+    args = parser.parse_args()
+
+    site_packages = args.site_packages
+    files, skipped_before = trace_imports(site_packages)
+    keep = used_top_level(site_packages, files) | ALWAYS_KEEP | set(args.keep)
+
+    owners = dist_info_owners(site_packages)
+    # Whole distributions: native libraries and data files are never modules
+    for entries in owners.values():
+        if entries & keep:
+            keep |= entries
+    remove = []
+    for entry in sorted(site_packages.iterdir()):
+        name = entry.name
+        if name.endswith(".dist-info"):
+            # Kept while any package it installed is kept (or it has no RECORD)
+            entries = owners.get(name)
+            if entries and not entries & keep:
+                remove.append(entry)
+        elif name in ("__pycache__", "bin"):
+            remove.append(entry)
+        elif name not in keep and name.split(".")[0] not in keep:
+            remove.append(entry)
+
+    total = sum(entry_size(e) for e in site_packages.iterdir())
+    freed = 0
+    for entry in remove:
+        size = entry_size(entry)
+        freed += size
+        print(f"{'removing' if args.apply else 'would remove'} {entry.name} ({size / 1024 / 1024:.1f} MB)")
+        if args.apply:
+            shutil.rmtree(entry) if entry.is_dir() else entry.unlink()
+
+    print(f"\nkept {len(keep)} top-level entries; {freed / 1024 / 1024:.1f} of {total / 1024 / 1024:.1f} MB "
+          f"{'removed' if args.apply else 'removable'}")
+    if args.apply:
+        _, skipped_after = trace_imports(site_packages)
+        broken = skipped_after - skipped_before
+        if broken:
+            raise SystemExit(f"Pruning broke lazy imports: {', '.join(sorted(broken))}")
+        print("Import check after pruning passed")
+
+
+if __name__ == "__main__":
+    main()
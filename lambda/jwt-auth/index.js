@@ -1,34 +1,137 @@
+import crypto from "crypto";
 import jwt from "jsonwebtoken";
 import jwksClient from "jwks-rsa";
 
 // JWKS endpoint for your Supabase project
-const SUPABASE_URL = "https://xzhnbiqcobpzuggsomdi.supabase.co";
+const SUPABASE_URL =
+  process.env.SUPABASE_URL || "https://xzhnbiqcobpzuggsomdi.supabase.co";
 
-// Create JWKS client
+// Keep in sync with the authorizer's "Authorization Caching" TTL in API
+// Gateway: a cached decision never outlives what API Gateway would cache
+const AUTHORIZER_TTL_SECONDS = Number(process.env.AUTHORIZER_TTL_SECONDS || 300);
+const DECISION_CACHE_MAX_ENTRIES = Number(process.env.DECISION_CACHE_MAX_ENTRIES || 1000);
+// Minimum gap between JWKS refetches triggered by an unknown key ID
+const KEY_REFRESH_INTERVAL_MS = Number(process.env.KEY_REFRESH_INTERVAL_MS || 30000);
+// OTLP/HTTP collector for the authorizer's span, same settings as
+// archive_common/tracing.py; unset = no tracing
+const OTLP_BASE_ENDPOINT = (process.env.OTEL_EXPORTER_OTLP_ENDPOINT || "").replace(/\/$/, "");
+const OTLP_TRACES_ENDPOINT =
+  process.env.OTEL_EXPORTER_OTLP_TRACES_ENDPOINT ||
+  (OTLP_BASE_ENDPOINT ? `${OTLP_BASE_ENDPOINT}/v1/traces` : "");
+const SERVICE_NAME =
+  process.env.OTEL_SERVICE_NAME || process.env.AWS_LAMBDA_FUNCTION_NAME || "jwt-auth";
+const TRACEPARENT = /^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$/;
+
+// Create JWKS client (used for fetching only; keys are held in signingKeys)
 const client = jwksClient({
   jwksUri: `${SUPABASE_URL}/auth/v1/.well-known/jwks.json`,
-  cache: true,
-  cacheMaxAge: 600000, // Cache keys for 10 minutes
+  cache: false,
+  timeout: 5000,
 });
 
+// kid -> public key, filled at init and on rate-limited refreshes
+const signingKeys = new Map();
+let lastKeyRefresh = 0;
+
+// sha256(token) -> { claims, expiresAt }, oldest first (Map keeps insertion order)
+const decisionCache = new Map();
+
+// Only a successful fetch starts the refresh interval, so a failed prefetch
+// or refresh is retried by the next request instead of locking out every kid
+async function refreshSigningKeys() {
+  const keys = await client.getSigningKeys();
+  lastKeyRefresh = Date.now();
+  signingKeys.clear();
+  for (const key of keys) {
+    signingKeys.set(key.kid, key.getPublicKey());
+  }
+  console.log(`Loaded ${signingKeys.size} signing key(s) from JWKS`);
+}
+
+// Prefetch during init so the first request does not pay for the JWKS fetch.
+// A failure here is not fatal: getKey() retries on demand.
+try {
+  await refreshSigningKeys();
+} catch (err) {
+  console.error("JWKS prefetch failed:", err.message || err);
+}
+
 // Function to get signing key
 function getKey(header, callback) {
-  client.getSigningKey(header.kid, (err, key) => {
-    if (err) {
-      callback(err);
-      return;
-    }
-    const signingKey = key.publicKey || key.rsaPublicKey;
-    callback(null, signingKey);
+  if (signingKeys.has(header.kid)) {
+    callback(null, signingKeys.get(header.kid));
+    return;
+  }
+  // Unknown kid: keys may have rotated, but never refetch more than once per
+  // interval (tokens with made-up kids must not turn into JWKS traffic)
+  if (Date.now() - lastKeyRefresh < KEY_REFRESH_INTERVAL_MS) {
+    callback(new Error(`Unknown signing key: ${header.kid}`));
+    return;
+  }
+  refreshSigningKeys()
+    .then(() => {
+      if (signingKeys.has(header.kid)) {
+        callback(null, signingKeys.get(header.kid));
+      } else {
+        callback(new Error(`Unknown signing key: ${header.kid}`));
+      }
+    })
+    .catch(callback);
+}
+
+function tokenHash(token) {
+  return crypto.createHash("sha256").update(token).digest("hex");
+}
+
+function getCachedClaims(hash) {
+  const entry = decisionCache.get(hash);
+  if (!entry) return null;
+  if (entry.expiresAt <= Date.now()) {
+    decisionCache.delete(hash);
+    return null;
+  }
+  return entry.claims;
+}
+
+function cacheClaims(hash, claims) {
+  const expiresAt = Math.min(
+    claims.exp ? claims.exp * 1000 : 0,
+    Date.now() + AUTHORIZER_TTL_SECONDS * 1000
+  );
+  if (expiresAt <= Date.now()) return;
+  decisionCache.delete(hash);
+  decisionCache.set(hash, { claims, expiresAt });
+  while (decisionCache.size > DECISION_CACHE_MAX_ENTRIES) {
+    decisionCache.delete(decisionCache.keys().next().value);
+  }
+}
+
+function verifyToken(token) {
+  return new Promise((resolve, reject) => {
+    jwt.verify(
+      token,
+      getKey,
+      {
+        algorithms: ["ES256", "HS256"], // Support both new and legacy keys
+      },
+      (err, decoded) => (err ? reject(err) : resolve(decoded))
+    );
   });
 }
 
-export const handler = async (event, context) => {
-  try {
-    console.log("Authorizer invoked with event:", JSON.stringify(event));
+// API Gateway caches the returned policy per token and reuses it for every
+// route, so allow the whole stage rather than only the first method called:
+// arn:aws:execute-api:region:account:apiId/stage/METHOD/path -> .../stage/*
+function stageResource(methodArn) {
+  const [apiArn, stage] = methodArn.split("/");
+  return stage ? `${apiArn}/${stage}/*` : methodArn;
+}
 
-    // For TOKEN type authorizer, token is in event.authorizationToken
-    const token = event.authorizationToken;
+async function authorize(event, span) {
+  try {
+    // TOKEN type authorizers get event.authorizationToken; REQUEST type
+    // ones get the headers (and with them the client's traceparent)
+    const token = event.authorizationToken || headerValue(event, "authorization");
 
     if (!token) {
       console.error("Authorization failed: No token provided");
@@ -37,47 +140,122 @@ export const handler = async (event, context) => {
 
     // Remove 'Bearer ' prefix if present
     const cleanToken = token.replace(/^Bearer\s+/i, "");
+    const hash = tokenHash(cleanToken);
 
-    // Verify token with JWKS (using callback-based verify)
-    return new Promise((resolve, reject) => {
-      jwt.verify(
-        cleanToken,
-        getKey,
-        {
-          algorithms: ["ES256", "HS256"], // Support both new and legacy keys
-        },
-        (err, decoded) => {
-          if (err) {
-            console.error("Token verification failed:", err.message);
-            reject(new Error("Unauthorized"));
-            return;
-          }
-
-          console.log(
-            "Token verified successfully for user:",
-            decoded.sub || decoded.email
-          );
-
-          // Supabase uses 'sub' field for user ID
-          const policy = generatePolicy(
-            String(decoded.sub || decoded.email || "user"),
-            "Allow",
-            event.methodArn,
-            {
-              userId: String(decoded.sub || ""),
-              email: String(decoded.email || ""),
-              role: String(decoded.role || ""),
-            }
-          );
-
-          resolve(policy);
-        }
+    let decoded = getCachedClaims(hash);
+    if (span) span.attributes["authorizer.cache_hit"] = Boolean(decoded);
+    if (decoded) {
+      console.log("Authorizer cache hit for user:", decoded.sub || decoded.email);
+    } else {
+      try {
+        decoded = await verifyToken(cleanToken);
+      } catch (err) {
+        console.error("Token verification failed:", err.message);
+        throw new Error("Unauthorized");
+      }
+      cacheClaims(hash, decoded);
+      console.log(
+        "Token verified successfully for user:",
+        decoded.sub || decoded.email
       );
-    });
+    }
+
+    // Supabase uses 'sub' field for user ID
+    return generatePolicy(
+      String(decoded.sub || decoded.email || "user"),
+      "Allow",
+      event.methodArn ? stageResource(event.methodArn) : event.methodArn,
+      {
+        userId: String(decoded.sub || ""),
+        email: String(decoded.email || ""),
+        role: String(decoded.role || ""),
+      }
+    );
   } catch (error) {
     console.error("Authorizer error:", error.message || error);
     throw new Error("Unauthorized"); // Client will see generic 401/403
   }
+}
+
+function headerValue(event, name) {
+  for (const [key, value] of Object.entries(event.headers || {})) {
+    if (key.toLowerCase() === name) return value;
+  }
+  return undefined;
+}
+
+function randomHex(bytes) {
+  return crypto.randomBytes(bytes).toString("hex");
+}
+
+function startSpan(event) {
+  const parent = TRACEPARENT.exec((headerValue(event, "traceparent") || "").trim().toLowerCase());
+  return {
+    traceId: parent ? parent[1] : randomHex(16),
+    spanId: randomHex(8),
+    parentSpanId: parent ? parent[2] : "",
+    name: "jwt-auth",
+    kind: 2, // SERVER
+    startTimeUnixNano: (BigInt(Date.now()) * 1000000n).toString(),
+    attributes: { "authorizer.type": event.type || "TOKEN" },
+    error: null,
+  };
+}
+
+// Awaited before returning: the runtime freezes as soon as the handler's
+// promise settles. Export failures are logged, never fatal.
+async function exportSpan(span) {
+  const { error, attributes, ...fields } = span;
+  const encodeValue = (value) =>
+    typeof value === "boolean" ? { boolValue: value } : { stringValue: String(value) };
+  const body = {
+    resourceSpans: [
+      {
+        resource: {
+          attributes: [{ key: "service.name", value: { stringValue: SERVICE_NAME } }],
+        },
+        scopeSpans: [
+          {
+            scope: { name: "jwt-auth" },
+            spans: [
+              {
+                ...fields,
+                endTimeUnixNano: (BigInt(Date.now()) * 1000000n).toString(),
+                attributes: Object.entries(attributes).map(([key, value]) => ({
+                  key,
+                  value: encodeValue(value),
+                })),
+                status: error ? { code: 2, message: error } : { code: 0 },
+              },
+            ],
+          },
+        ],
+      },
+    ],
+  };
+  try {
+    await fetch(OTLP_TRACES_ENDPOINT, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+      signal: AbortSignal.timeout(2000),
+    });
+  } catch (err) {
+    console.error("Trace export failed:", err.message || err);
+  }
+}
+
+export const handler = async (event, context) => {
+  if (!OTLP_TRACES_ENDPOINT) return authorize(event, null);
+  const span = startSpan(event);
+  try {
+    return await authorize(event, span);
+  } catch (error) {
+    span.error = error.message || String(error);
+    throw error;
+  } finally {
+    await exportSpan(span);
+  }
 };
 
 function generatePolicy(principalId, effect, resource, context = {}) {
@@ -0,0 +1,120 @@
+import os
+import json
+import importlib
+
+from archive_common.profiling import profiled
+from archive_common.tracing import traced
+
+# One function serving every Python route, so low-traffic routes run in
+# containers kept warm by busy ones. Each existing handler is copied into the
+# image under its own module name (see Dockerfile), imported on first use and
+# kept loaded; clients cached in archive_common (VoyageAI, PostgREST sessions,
+# the Postgres pool, embedding_config) are shared between routes. The
+# per-function deployments are unchanged and keep working. embedding-jobs is
+# not a route: its batch tasks run for minutes with service-key writes and
+# stay in their own function, away from the request path.
+#
+# Routing, first match wins:
+#   1. event["route"] (direct invokes), e.g. {"route": "compression", ...}
+#   2. the request path: its last segment, or a key of ROUTER_PATHS, e.g.
+#      ROUTER_PATHS='{"/boards/vectorize": "embedding"}'
+#   3. the task (event or JSON body), e.g. quick_insight -> analysis
+#   4. ROUTER_DEFAULT_ROUTE
+
+ROUTE_MODULES = {
+    "embedding": "embedding_handler",            # embedding-lambda
+    "search": "deepseek_call_handler",           # deepseek-call
+    "analysis": "deepseek_analysis_handler",     # deepseek-analysis
+    "compression": "data_compression_handler",   # data-compression
+}
+
+# Path segments that name a route (function names included so existing
+# resource paths can point at the router unchanged)
+PATH_ROUTES = {
+    "embedding": "embedding", "embedding-lambda": "embedding", "vectorize": "embedding",
+    "search": "search", "deepseek-call": "search",
+    "analysis": "analysis", "deepseek-analysis": "analysis",
+    "compression": "compression", "data-compression": "compression",
+}
+
+TASK_ROUTES = {
+    "search_only": "search",
+    "query_parser": "analysis",
+    "quick_insight": "analysis",
+    "analysis": "analysis",
+}
+
+CUSTOM_PATHS = json.loads(os.environ.get("ROUTER_PATHS", "{}"))
+DEFAULT_ROUTE = os.environ.get("ROUTER_DEFAULT_ROUTE")
+
+_handlers = {}
+
+
+def get_handler(route):
+    if route not in _handlers:
+        module = importlib.import_module(ROUTE_MODULES[route])
+        _handlers[route] = module.lambda_handler
+        print(f"Loaded route {route} ({ROUTE_MODULES[route]})")
+    return _handlers[route]
+
+
+def request_path(event):
+    # REST API proxy: path; HTTP API / Function URL: rawPath
+    return event.get('rawPath') or event.get('path') or ''
+
+
+def resolve_route(event):
+    if event.get('route') in ROUTE_MODULES:
+        return event['route']
+
+    path = request_path(event).rstrip('/')
+    if path:
+        if path in CUSTOM_PATHS:
+            return CUSTOM_PATHS[path]
+        segment = path.rsplit('/', 1)[-1]
+        if segment in PATH_ROUTES:
+            return PATH_ROUTES[segment]
+
+    task = event.get('task')
+    if task is None and isinstance(event.get('body'), str):
+        try:
+            body = json.loads(event['body'])
+            task = body.get('task') if isinstance(body, dict) else None
+        except json.JSONDecodeError:
+            pass
+    if task in TASK_ROUTES:
+        return TASK_ROUTES[task]
+
+    return DEFAULT_ROUTE
+
+
+@profiled('router')
+@traced('router')
+def lambda_handler(event, context):
+    cors_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key',
+        'Access-Control-Allow-Methods': 'POST,OPTIONS'
+    }
+
+    # Answer preflight here so it never loads a route's handler
+    method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': cors_headers,
+            'body': ''
+        }
+
+    route = resolve_route(event)
+    if route not in ROUTE_MODULES:
+        print(f"ERROR: No route for path '{request_path(event)}' / task '{event.get('task')}'")
+        return {
+            'statusCode': 404,
+            'headers': cors_headers,
+            'body': json.dumps({'error': 'Unknown route'})
+        }
+
+    print(f"Routing to {route}")
+    return get_handler(route)(event, context)
@@ -0,0 +1,5 @@
+"""Modules shared by the archive lambdas.
+
+Each function package ships a copy of this directory next to its
+lambda_function.py (see lambda/shared/README.md).
+"""
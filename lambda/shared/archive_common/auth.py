@@ -0,0 +1,114 @@
+"""Caller identity without a Supabase auth round trip.
+
+Two ways to establish the user for a request:
+  - authorizer_user_id(): the identity the API Gateway authorizer
+    (lambda/jwt-auth) already verified, from requestContext.authorizer. Only
+    trustworthy when API Gateway builds requestContext (proxy integration or
+    a mapping template that does not pass client JSON through there).
+  - verify_token(): verify the Supabase access token locally with PyJWT,
+    against the project's JWKS (ES256/RS256, cached) or SUPABASE_JWT_SECRET
+    for legacy HS256 tokens.
+
+Payloads one function sends another by direct invoke, which ask for writes
+with the service key, are signed with internal_signature() (HMAC keyed by
+SUPABASE_KEY, which HTTP callers never have) and checked with
+valid_internal_signature().
+
+Env:
+  SUPABASE_URL          JWKS is read from {SUPABASE_URL}/auth/v1/.well-known/jwks.json
+  SUPABASE_JWT_SECRET   HS256 secret (legacy projects only)
+  JWT_AUDIENCE          expected aud claim (default "authenticated")
+  JWKS_TTL_SECONDS      how long fetched keys are reused (default 600)
+"""
+import hashlib
+import hmac
+import os
+import time
+
+import requests
+
+JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+JWT_AUDIENCE = os.environ.get("JWT_AUDIENCE", "authenticated")
+JWKS_TTL_SECONDS = float(os.environ.get("JWKS_TTL_SECONDS", "600"))
+# Minimum gap between refetches triggered by an unknown kid
+JWKS_REFRESH_INTERVAL_SECONDS = 30
+
+_jwks = {"fetched_at": 0.0, "keys": {}}
+
+
+class AuthError(Exception):
+    pass
+
+
+def authorizer_user_id(event):
+    """User id set by the API Gateway authorizer, or None."""
+    authorizer = (event.get('requestContext') or {}).get('authorizer') or {}
+    return (
+        authorizer.get('userId') or
+        (authorizer.get('claims') or {}).get('sub') or
+        (authorizer.get('lambda') or {}).get('userId') or
+        None
+    )
+
+
+def internal_signature(*fields):
+    """HMAC-SHA256 hex of fields under SUPABASE_KEY."""
+    key = os.environ.get("SUPABASE_KEY", "").strip()
+    if not key:
+        raise AuthError("SUPABASE_KEY required to sign internal payloads")
+    message = "\n".join("" if f is None else str(f) for f in fields)
+    return hmac.new(key.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def valid_internal_signature(signature, *fields):
+    if not signature or not os.environ.get("SUPABASE_KEY", "").strip():
+        return False
+    return hmac.compare_digest(str(signature), internal_signature(*fields))
+
+
+def _jwks_url():
+    return f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json"
+
+
+def _refresh_jwks():
+    import jwt
+    response = requests.get(_jwks_url(), timeout=5)
+    response.raise_for_status()
+    _jwks["keys"] = {
+        jwk.get("kid"): jwt.PyJWK(jwk).key
+        for jwk in response.json().get("keys", [])
+    }
+    _jwks["fetched_at"] = time.monotonic()
+
+
+def _signing_key(kid):
+    age = time.monotonic() - _jwks["fetched_at"]
+    if age > JWKS_TTL_SECONDS or (kid not in _jwks["keys"] and age > JWKS_REFRESH_INTERVAL_SECONDS):
+        _refresh_jwks()
+    if kid not in _jwks["keys"]:
+        raise AuthError(f"Unknown signing key: {kid}")
+    return _jwks["keys"][kid]
+
+
+def verify_token(token):
+    """Verified claims of a Supabase access token; raises AuthError."""
+    if not token:
+        raise AuthError("Missing access token")
+    import jwt
+    try:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not JWT_SECRET:
+                raise AuthError("HS256 token but SUPABASE_JWT_SECRET is not set")
+            key = JWT_SECRET
+        elif algorithm in ("ES256", "RS256"):
+            key = _signing_key(header.get("kid"))
+        else:
+            raise AuthError(f"Unsupported token algorithm: {algorithm}")
+        return jwt.decode(
+            token, key, algorithms=[algorithm], audience=JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]}
+        )
+    except jwt.PyJWTError as e:
+        raise AuthError(f"Invalid token: {str(e)}")
@@ -0,0 +1,239 @@
+"""Opt-in record/replay of upstream HTTP calls (DeepSeek, Voyage, Supabase).
+
+With HTTP_CASSETTE_MODE=record every response received through requests
+(DeepSeek calls, the voyageai SDK, rest.py) or httpx (supabase-py) is
+written out with its timing. With HTTP_CASSETTE_MODE=replay those responses
+are served back instead of calling the network, after sleeping for the
+recorded duration, so handler overhead can be benchmarked offline on real
+traffic shapes (bench/bench_handlers.py --replay DIR).
+
+What is stored is sanitized: request headers and bodies are dropped (only
+the body's size and sha256 are kept, for matching); credential fields in
+responses are masked and, unless HTTP_CASSETTE_KEEP_TEXT=1, long strings
+(board descriptions, completions) are replaced by same-length filler.
+Embeddings and numbers are kept as they are.
+
+Replay prefers a recording of the same method, path, query and body; when
+the request differs (e.g. a changed prompt) it cycles through the
+recordings of the same method and path.
+
+Env:
+  HTTP_CASSETTE_MODE   off | record | replay (off)
+  HTTP_CASSETTE_DIR    where <service>.jsonl files are written and read
+                       (/tmp/cassettes); "stdout" records to the log as
+                       "CASSETTE {...}" lines, which replay also accepts
+  HTTP_CASSETTE_SPEED  multiplier for replayed durations, 0 = no delay (1.0)
+  HTTP_CASSETTE_KEEP_TEXT  keep response strings verbatim (0)
+
+Direct Postgres calls (pg.py) are not HTTP and are not covered.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from archive_common import jsoncodec
+from archive_common.log import REDACTED_KEYS
+
+MODE = os.environ.get("HTTP_CASSETTE_MODE", "off")
+CASSETTE_DIR = os.environ.get("HTTP_CASSETTE_DIR", "/tmp/cassettes")
+SPEED = float(os.environ.get("HTTP_CASSETTE_SPEED", "1.0"))
+KEEP_TEXT = os.environ.get("HTTP_CASSETTE_KEEP_TEXT", "0") == "1"
+
+# Strings at most this long (ids, dates, tags, model names) are kept
+SCRUB_MIN_CHARS = 40
+KEPT_HEADERS = {"content-type", "retry-after"}
+DROPPED_QUERY_KEYS = {"apikey", "key", "token", "access_token"}
+
+_lock = threading.Lock()
+_installed = {"done": False}
+_recordings = {"exact": {}, "path": {}}
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+SERVICE_URL_ENV = {"deepseek": "DEEPSEEK_BASE_URL", "voyage": "VOYAGE_BASE_URL", "supabase": "SUPABASE_URL"}
+
+
+def service_name(host):
+    for name, env in SERVICE_URL_ENV.items():
+        if name in host or host == urlsplit(os.environ.get(env, "")).netloc:
+            return name
+    return host.replace(":", "_")
+
+
+def request_key(method, url, body):
+    """(exact key, path key) used to match a request to a recording."""
+    parts = urlsplit(url)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k.lower() not in DROPPED_QUERY_KEYS))
+    digest = hashlib.sha256(body or b"").hexdigest()
+    return f"{method} {parts.path}?{query} {digest}", f"{method} {parts.path}"
+
+
+def sanitize(value):
+    if isinstance(value, dict):
+        return {
+            k: "[redacted]" if str(k).lower() in REDACTED_KEYS else sanitize(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    if isinstance(value, str) and not KEEP_TEXT and len(value) > SCRUB_MIN_CHARS:
+        if value.lstrip()[:1] in ("{", "["):
+            # JSON-mode completions (query_parser) must still parse
+            try:
+                return jsoncodec.dumps(sanitize(jsoncodec.loads(value)))
+            except jsoncodec.JSONDecodeError:
+                pass
+        return "x" * len(value)
+    return value
+
+
+def sanitize_body(content):
+    """Response body to store: sanitized JSON when it parses, else its size."""
+    try:
+        return {"json": sanitize(jsoncodec.loads(content))} if content else {"text": ""}
+    except (jsoncodec.JSONDecodeError, UnicodeDecodeError):
+        return {"text": "x" * len(content)}
+
+
+def body_bytes(stored):
+    if "json" in stored:
+        return jsoncodec.dumps(stored["json"]).encode("utf-8")
+    return stored["text"].encode("utf-8")
+
+
+def record(method, url, body, status, headers, content, elapsed):
+    exact_key, _ = request_key(method, url, body)
+    service = service_name(urlsplit(url).netloc)
+    entry = {
+        "service": service,
+        "key": exact_key,
+        "request_bytes": len(body or b""),
+        "status": status,
+        "headers": {k.lower(): v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+        "body": sanitize_body(content),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "recorded_at": int(time.time()),
+    }
+    line = jsoncodec.dumps(entry)
+    with _lock:
+        if CASSETTE_DIR == "stdout":
+            print(f"CASSETTE {line}")
+        else:
+            Path(CASSETTE_DIR).mkdir(parents=True, exist_ok=True)
+            with open(Path(CASSETTE_DIR) / f"{service}.jsonl", "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def load(directory):
+    """Index every recording found in directory (*.jsonl, *.log)."""
+    entries = []
+    for path in sorted(Path(directory).glob("*")):
+        if path.suffix not in (".jsonl", ".log", ".txt"):
+            continue
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if "CASSETTE {" in line:
+                line = line[line.index("CASSETTE {") + len("CASSETTE "):]
+            if line.startswith("{"):
+                entries.append(jsoncodec.loads(line))
+    exact, by_path = {}, {}
+    for entry in entries:
+        exact.setdefault(entry["key"], []).append(entry)
+        method_path = entry["key"].split("?", 1)[0]
+        by_path.setdefault(method_path, []).append(entry)
+    _recordings["exact"] = {k: itertools.cycle(v) for k, v in exact.items()}
+    _recordings["path"] = {k: itertools.cycle(v) for k, v in by_path.items()}
+    print(f"Loaded {len(entries)} cassette recordings from {directory}")
+
+
+def playback(method, url, body):
+    """Recorded (status, headers, content) for a request, after its delay."""
+    exact_key, path_key = request_key(method, url, body)
+    with _lock:
+        recordings = _recordings["exact"].get(exact_key) or _recordings["path"].get(path_key)
+        if recordings is None:
+            raise CassetteMiss(f"No cassette recording for {path_key}")
+        entry = next(recordings)
+    if SPEED > 0:
+        time.sleep(entry["elapsed_ms"] / 1000 * SPEED)
+    return entry["status"], entry["headers"], body_bytes(entry["body"])
+
+
+def _patch_requests():
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from requests.structures import CaseInsensitiveDict
+    except ImportError:
+        return
+    original_send = HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        if MODE == "replay":
+            status, headers, content = playback(request.method, request.url, body)
+            response = requests.Response()
+            response.status_code = status
+            response.headers = CaseInsensitiveDict(headers)
+            response._content = content
+            response.url = request.url
+            response.request = request
+            response.encoding = "utf-8"
+            response.connection = self
+            return response
+        start = time.perf_counter()
+        response = original_send(self, request, **kwargs)
+        content = response.content  # read now so the timing covers the body
+        record(request.method, request.url, body, response.status_code, response.headers,
+               content, time.perf_counter() - start)
+        return response
+
+    HTTPAdapter.send = send
+
+
+def _patch_httpx():
+    try:
+        import httpx
+    except ImportError:
+        return
+    original_handle = httpx.HTTPTransport.handle_request
+
+    def handle_request(self, request):
+        body = request.read()
+        if MODE == "replay":
+            status, headers, content = playback(request.method, str(request.url), body)
+            return httpx.Response(status, headers=headers, content=content, request=request)
+        start = time.perf_counter()
+        response = original_handle(self, request)
+        content = response.read()
+        record(request.method, str(request.url), body, response.status_code, response.headers,
+               content, time.perf_counter() - start)
+        return httpx.Response(
+            response.status_code,
+            headers=[(k, v) for k, v in response.headers.items()
+                     if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")],
+            content=content,
+            request=request,
+        )
+
+    httpx.HTTPTransport.handle_request = handle_request
+
+
+def install():
+    """Hook requests and httpx according to HTTP_CASSETTE_MODE. Call once at
+    module load; a no-op unless the mode is record or replay."""
+    if MODE not in ("record", "replay") or _installed["done"]:
+        return
+    _installed["done"] = True
+    if MODE == "replay":
+        load(CASSETTE_DIR)
+    _patch_requests()
+    _patch_httpx()
+    print(f"HTTP cassette mode: {MODE} ({CASSETTE_DIR})")
@@ -0,0 +1,66 @@
+"""DeepSeek chat completions with retries, for the calls that fan out
+concurrently (map-reduce compression, per-window analysis) and so run into
+DeepSeek's rate limit.
+
+429 and 5xx responses are retried up to MAX_ATTEMPTS times, waiting the
+Retry-After header when DeepSeek sends one and 2, 4, ... seconds otherwise,
+never more than MAX_RETRY_DELAY_SECONDS. Other errors raise DeepSeekError
+at once. Calls share one keep-alive session, thread pools included.
+
+Env:
+  DEEPSEEK_BASE_URL  API base URL (https://api.deepseek.com), e.g.
+                     bench/fake_upstreams.py for load tests
+"""
+import os
+import time
+
+import requests
+
+BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+MAX_ATTEMPTS = 3
+MAX_RETRY_DELAY_SECONDS = 10
+
+_session = requests.Session()
+
+
+class DeepSeekError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"DeepSeek API Error: {status_code} - {text}")
+        self.status_code = status_code
+
+
+def retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before the next attempt."""
+    try:
+        delay = float(response.headers.get("Retry-After", 2 ** attempt))
+    except ValueError:
+        delay = 2 ** attempt
+    return min(max(delay, 0.0), MAX_RETRY_DELAY_SECONDS)
+
+
+def chat(api_key, messages, max_tokens, temperature=0.5, model="deepseek-chat", timeout=60):
+    """Content of one completion; raises DeepSeekError when DeepSeek keeps
+    failing."""
+    payload = {
+        "messages": messages,
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        response = _session.post(f"{BASE_URL}/chat/completions", headers=headers, json=payload, timeout=timeout)
+        if response.ok:
+            return response.json()["choices"][0]["message"]["content"]
+        if not retryable(response.status_code) or attempt == MAX_ATTEMPTS:
+            raise DeepSeekError(response.status_code, response.text)
+        delay = retry_delay(response, attempt)
+        print(f"WARNING: DeepSeek returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt})")
+        time.sleep(delay)
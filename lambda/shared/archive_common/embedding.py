@@ -0,0 +1,89 @@
+"""Board embedding path shared by embedding-lambda, deepseek-call and the
+batch jobs in embedding-jobs.
+
+The model that produced board.vector is recorded in board.embedding_model;
+the active model (and the next one while a backfill is running) come from
+the embedding_config table, cached per warm container. A vector written
+with a model cached from before a promotion is turned away by the
+board_reject_stale_model_vector trigger and re-embedded by the repair task.
+"""
+import os
+import time
+from io import BytesIO
+
+import requests
+
+DEFAULT_MODEL = os.environ.get("EMBEDDING_MODEL", "voyage-3")
+CONFIG_TTL_SECONDS = float(os.environ.get("EMBEDDING_CONFIG_TTL_SECONDS", "60"))
+# e.g. http://127.0.0.1:8102/v1 for bench/fake_upstreams.py; unset = Voyage API
+VOYAGE_BASE_URL = os.environ.get("VOYAGE_BASE_URL")
+
+_config_cache = {"loaded_at": 0.0, "models": (DEFAULT_MODEL, None)}
+_voyage_clients = {}
+
+
+def get_voyage_client(api_key, timeout=30):
+    """voyageai.Client for the key, created on first use and reused by warm
+    invocations (and by every route of the router function)."""
+    if api_key not in _voyage_clients:
+        import voyageai
+        options = {"base_url": VOYAGE_BASE_URL} if VOYAGE_BASE_URL else {}
+        _voyage_clients[api_key] = voyageai.Client(api_key=api_key, timeout=timeout, **options)
+    return _voyage_clients[api_key]
+
+
+def get_embedding_models(supabase, max_age=None):
+    """Return (active_model, next_model); next_model is None unless a
+    backfill to a new model is in progress. max_age (seconds) overrides
+    CONFIG_TTL_SECONDS, e.g. 0 for long-running jobs that must notice a
+    promotion."""
+    now = time.monotonic()
+    if now - _config_cache["loaded_at"] < (CONFIG_TTL_SECONDS if max_age is None else max_age):
+        return _config_cache["models"]
+    try:
+        rows = supabase.table("embedding_config").select("active_model,next_model").limit(1).execute().data
+        if rows:
+            _config_cache["models"] = (rows[0]["active_model"] or DEFAULT_MODEL, rows[0].get("next_model"))
+    except Exception as e:
+        print(f"WARNING: embedding_config lookup failed, using {_config_cache['models'][0]}: {str(e)}")
+    _config_cache["loaded_at"] = now
+    return _config_cache["models"]
+
+
+def board_text(description, tags, date):
+    """Text embedded for a board (tags may be a list or comma-separated string)."""
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    return f"Description: {description or ''}, Tags: {', '.join(tags or [])}, Date: {date}"
+
+
+def load_image(image_url):
+    """Download a board image; returns a PIL image or None (text-only fallback)."""
+    if not image_url:
+        return None
+    try:
+        from PIL import Image
+        response = requests.get(image_url, timeout=10)
+        response.raise_for_status()
+        image = Image.open(BytesIO(response.content))
+        print(f"Image downloaded successfully, size: {image.size}")
+        return image
+    except Exception as e:
+        print(f"WARNING: Image load failed (proceeding with text-only): {str(e)}")
+        return None
+
+
+def embed_boards(vo, items, model):
+    """Embed boards in one request.
+
+    items: list of (text, image or None). Tries multimodal first and falls
+    back to text-only for the whole batch, like embedding-lambda always has.
+    Returns one vector per item.
+    """
+    inputs = [[text, image] if image is not None else [text] for text, image in items]
+    try:
+        result = vo.multimodal_embed(inputs=inputs, model=model)
+    except Exception as multimodal_error:
+        print(f"Multimodal embedding failed, trying text-only: {str(multimodal_error)}")
+        result = vo.embed(texts=[text for text, _ in items], model=model)
+    return result.embeddings
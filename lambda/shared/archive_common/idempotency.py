@@ -0,0 +1,170 @@
+"""Idempotency-Key support for mutating lambdas.
+
+Keys are stored in the idempotency_key table (sql/idempotency.sql) and
+claimed through PostgREST RPCs with the service key:
+
+- first request with a key claims it, runs the handler and stores the response
+- replays of a completed key get the stored response without running anything
+- concurrent duplicates poll until the in-flight request finishes
+- a key reused with a different request body is rejected with 422
+
+5xx responses and exceptions release the key so the client can retry.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+HEADER_NAME = 'idempotency-key'
+
+# How long a claim is held before another request may take it over
+LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "120"))
+# How long a duplicate waits for the in-flight request
+WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "30"))
+
+RESPONSE_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+def get_idempotency_key(event):
+    """Return the Idempotency-Key header value (case-insensitive) or None."""
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == HEADER_NAME and value:
+            return value.strip()
+    return None
+
+
+def get_principal(event):
+    """Caller identity from the API Gateway authorizer, used to namespace keys."""
+    authorizer = (event.get('requestContext') or {}).get('authorizer') or {}
+    return (
+        authorizer.get('principalId') or
+        authorizer.get('userId') or
+        (authorizer.get('claims') or {}).get('sub') or
+        'anonymous'
+    )
+
+
+def request_hash(event):
+    """Hash of the request payload; a reused key must carry the same payload."""
+    body = event.get('body')
+    if body is None:
+        body = {k: v for k, v in event.items() if k not in ('headers', 'requestContext')}
+    if not isinstance(body, str):
+        body = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """PostgREST client for the idempotency_key RPCs."""
+
+    def __init__(self, supabase_url, service_key, scope):
+        self.rpc_url = f"{supabase_url}/rest/v1/rpc"
+        self.scope = scope
+        self.headers = {
+            'apikey': service_key,
+            'Authorization': f'Bearer {service_key}',
+            'Content-Type': 'application/json'
+        }
+
+    def _rpc(self, name, params):
+        response = requests.post(f"{self.rpc_url}/{name}", headers=self.headers, json=params, timeout=10)
+        if not response.ok:
+            raise Exception(f"{name} failed {response.status_code}: {response.text}")
+        return response.json() if response.text else None
+
+    def claim(self, key, req_hash):
+        """Returns (outcome, stored_response); outcome is one of
+        claimed, completed, in_progress or mismatch."""
+        rows = self._rpc("claim_idempotency_key", {
+            "p_scope": self.scope,
+            "p_key": key,
+            "p_request_hash": req_hash,
+            "p_lock_seconds": LOCK_SECONDS
+        })
+        row = rows[0] if rows else {"outcome": "in_progress", "stored_response": None}
+        return row["outcome"], row.get("stored_response")
+
+    def wait(self, key, req_hash, deadline):
+        """Claim the key, polling while another request holds it."""
+        delay = 0.2
+        while True:
+            outcome, stored = self.claim(key, req_hash)
+            if outcome != "in_progress" or time.monotonic() + delay > deadline:
+                return outcome, stored
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+    def complete(self, key, response):
+        self._rpc("complete_idempotency_key", {"p_scope": self.scope, "p_key": key, "p_response": response})
+
+    def release(self, key):
+        self._rpc("release_idempotency_key", {"p_scope": self.scope, "p_key": key})
+
+
+def _error(status_code, message):
+    return {'statusCode': status_code, 'headers': RESPONSE_HEADERS, 'body': json.dumps({'error': message})}
+
+
+def idempotent(scope):
+    """Decorator for lambda_handler functions honoring the Idempotency-Key header.
+
+    Requests without the header (and OPTIONS preflights) run unchanged. If the
+    key store is unavailable the handler runs without idempotency rather than
+    failing the request.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            key = get_idempotency_key(event) if isinstance(event, dict) else None
+            supabase_url = os.environ.get("SUPABASE_URL")
+            service_key = (os.environ.get("SUPABASE_KEY") or "").strip()
+            if not key or not supabase_url or not service_key:
+                return handler(event, context)
+
+            store = IdempotencyStore(supabase_url, service_key, scope)
+            key = f"{get_principal(event)}:{key}"
+            req_hash = request_hash(event)
+
+            wait_seconds = WAIT_SECONDS
+            if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+                # Leave time to answer before the function itself times out
+                wait_seconds = min(wait_seconds, context.get_remaining_time_in_millis() / 1000 - 2)
+
+            try:
+                outcome, stored = store.wait(key, req_hash, time.monotonic() + max(wait_seconds, 0))
+            except Exception as e:
+                print(f"WARNING: Idempotency store unavailable, running without it: {str(e)}")
+                return handler(event, context)
+
+            print(f"Idempotency key outcome: {outcome}")
+            if outcome == "completed":
+                replay = dict(stored)
+                replay['headers'] = {**(stored.get('headers') or {}), 'Idempotent-Replayed': 'true'}
+                return replay
+            if outcome == "mismatch":
+                return _error(422, 'Idempotency-Key was already used with a different request')
+            if outcome == "in_progress":
+                return _error(409, 'A request with this Idempotency-Key is still in progress')
+
+            try:
+                response = handler(event, context)
+            except Exception:
+                store.release(key)
+                raise
+
+            try:
+                if isinstance(response, dict) and response.get('statusCode', 500) < 500:
+                    store.complete(key, response)
+                else:
+                    store.release(key)
+            except Exception as e:
+                print(f"WARNING: Failed to record idempotent response: {str(e)}")
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,94 @@
+"""Quick insight pre-generation after a board's embedding lands.
+
+Used by embedding-lambda (synchronous embedding) and by the embedding-jobs
+drain_queue task (write-behind mode), so both paths fill board_insight. The
+quick_insight request goes to INSIGHT_FUNCTION_NAME (deepseek-analysis) as
+an async invoke signed with internal_signature(); unset = off.
+
+Env:
+  INSIGHT_FUNCTION_NAME  function that generates and stores the insight
+"""
+import hashlib
+import json
+import os
+
+from archive_common import pg, tracing
+from archive_common.auth import internal_signature
+from archive_common.vector_codec import match_boards_call
+
+
+def board_content_hash(description, tags, date):
+    """Stable hash of the board fields the quick insight is generated from.
+
+    Canonical form: sha256 hex of the compact JSON object
+    {"date", "description", "tags" (sorted)} with sorted keys, so the UI can
+    compute the same key when looking up board_insight.
+    """
+    canonical = json.dumps(
+        {'date': str(date or ''), 'description': description or '', 'tags': sorted(tags or [])},
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def pregenerate_insight(supabase, data, embedding, content_hash, verified_user_id=None):
+    """Kick off quick_insight generation for a freshly embedded board.
+
+    Fetches similar boards with the new vector and invokes the analysis lambda
+    asynchronously (InvocationType=Event), which stores the result in
+    board_insight. Errors are logged only; they never fail the embedding.
+    The direct Postgres search (no RLS) is only used when data's user_id is
+    verified_user_id, the identity from the API Gateway authorizer.
+    """
+    function_name = os.environ.get("INSIGHT_FUNCTION_NAME")
+    if not function_name or data.get("pregenerate_insight") is False:
+        return False
+
+    try:
+        related_boards = []
+        try:
+            if pg.enabled() and verified_user_id and verified_user_id == data.get('user_id'):
+                similar = pg.match_boards(embedding, data.get('user_id'), match_threshold=0.0, match_count=6)
+            else:
+                rpc_name, match_params = match_boards_call(
+                    embedding, data.get('user_id'), match_threshold=0.0, match_count=6
+                )
+                similar = supabase.rpc(rpc_name, match_params).execute().data
+            related_boards = [
+                {'board_id': b['board_id'], 'description': b['description'], 'date': b['date']}
+                for b in (similar or []) if b['board_id'] != data['board_id']
+            ][:5]
+        except Exception as e:
+            print(f"WARNING: Related board lookup failed (continuing without RAG context): {str(e)}")
+
+        import boto3
+        payload = {
+            'task': 'quick_insight',
+            'store': True,
+            'board_id': data['board_id'],
+            'user_id': data.get('user_id'),
+            'action': data.get('action', 'create'),
+            'content_hash': content_hash,
+            'target_board': {
+                'board_id': data['board_id'],
+                'description': data['description'],
+                'date': data['date'],
+                'tags': [{'tag_name': t} for t in data['tags']]
+            },
+            'related_boards': related_boards
+        }
+        # deepseek-analysis only stores insights from signed direct invokes
+        payload['store_signature'] = internal_signature(
+            'board_insight', payload['board_id'], payload['user_id'], payload['content_hash'], payload['action']
+        )
+        with tracing.span(f"invoke {function_name}", kind=tracing.CLIENT, **{"faas.invoked_name": function_name}):
+            boto3.client('lambda').invoke(
+                FunctionName=function_name,
+                InvocationType='Event',
+                Payload=json.dumps(tracing.inject(payload), default=str).encode('utf-8')
+            )
+        print(f"Insight pre-generation queued on {function_name} (hash: {content_hash[:12]}...)")
+        return True
+    except Exception as e:
+        print(f"WARNING: Insight pre-generation failed to start: {str(e)}")
+        return False
@@ -0,0 +1,30 @@
+"""JSON for request bodies and responses: orjson when it is installed,
+the stdlib otherwise. Both return/accept str so callers can swap
+json.loads/json.dumps for these without other changes.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, default=None):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. ints beyond 64 bits, which the stdlib still handles
+            pass
+    return json.dumps(obj, default=default)
+
+
+# Both raise this (orjson.JSONDecodeError subclasses it)
+JSONDecodeError = json.JSONDecodeError
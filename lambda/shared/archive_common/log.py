@@ -0,0 +1,87 @@
+"""Bounded request logging.
+
+Logging the whole event on every call serializes embeddings, board lists and
+tokens into CloudWatch. log_event() always prints a one-line summary and
+decides whether the request is sampled; the full event, and any
+log_fields(..., sampled_only=True) payloads, are printed only for sampled
+requests. Every logged value goes through redact(), which masks credentials,
+collapses long numeric lists (embeddings) and caps string and list sizes.
+
+Env:
+  LOG_EVENT_SAMPLE_RATE  fraction of requests whose full event is logged (0.01)
+  LOG_FIELD_MAX_CHARS    longest string kept in a logged field (500)
+  LOG_LIST_MAX_ITEMS     longest list kept in a logged field (20)
+"""
+import os
+import random
+
+from archive_common import jsoncodec
+
+SAMPLE_RATE = float(os.environ.get("LOG_EVENT_SAMPLE_RATE", "0.01"))
+FIELD_MAX_CHARS = int(os.environ.get("LOG_FIELD_MAX_CHARS", "500"))
+LIST_MAX_ITEMS = int(os.environ.get("LOG_LIST_MAX_ITEMS", "20"))
+
+REDACTED_KEYS = {
+    "authorization", "access_token", "refresh_token", "apikey", "x-api-key",
+    "cookie", "set-cookie", "password", "token", "idempotency-key",
+}
+
+
+_request = {"sampled": False}
+
+
+def redact(value, depth=0):
+    """Copy of value that is safe and small enough to log."""
+    if isinstance(value, str):
+        if len(value) > FIELD_MAX_CHARS:
+            return f"{value[:FIELD_MAX_CHARS]}... +{len(value) - FIELD_MAX_CHARS} chars"
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        items = {
+            k: "[redacted]" if str(k).lower() in REDACTED_KEYS else redact(v, depth + 1)
+            for k, v in list(value.items())[:LIST_MAX_ITEMS]
+        }
+        if len(value) > LIST_MAX_ITEMS:
+            items["..."] = f"+{len(value) - LIST_MAX_ITEMS} keys"
+        return items
+    if isinstance(value, (list, tuple)):
+        if len(value) > 8 and all(isinstance(v, float) for v in value[:8]):
+            return f"[{len(value)} floats]"
+        items = [redact(v, depth + 1) for v in value[:LIST_MAX_ITEMS]]
+        if len(value) > LIST_MAX_ITEMS:
+            items.append(f"... +{len(value) - LIST_MAX_ITEMS} items")
+        return items
+    return value
+
+
+def log_fields(message, sampled_only=False, **fields):
+    """One structured log line: {"msg": message, **redacted fields}.
+
+    sampled_only: print only when log_event() sampled the current request.
+    """
+    if sampled_only and not _request["sampled"]:
+        return
+    print(jsoncodec.dumps({"msg": message, **redact(fields)}, default=str))
+
+
+def log_event(event, sample_rate=None):
+    """Summary of an incoming event, plus the full (redacted) event when the
+    request is sampled. Call once at the start of each request."""
+    sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+    _request["sampled"] = sample_rate > 0 and random.random() < sample_rate
+    body = event.get("body")
+    request_context = event.get("requestContext") or {}
+    log_fields(
+        "event",
+        keys=sorted(event.keys()),
+        method=event.get("httpMethod") or (request_context.get("http") or {}).get("method"),
+        path=event.get("rawPath") or event.get("path"),
+        task=event.get("task"),
+        body_chars=len(body) if isinstance(body, str) else None,
+        request_id=request_context.get("requestId")
+    )
+    log_fields("event_sample", sampled_only=True, event=event)
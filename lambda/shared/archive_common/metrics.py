@@ -0,0 +1,34 @@
+"""CloudWatch Embedded Metric Format (EMF) helpers.
+
+Log lines in EMF are turned into CloudWatch metrics by the Lambda log
+pipeline, so publishing a metric needs no API call or extra dependency.
+"""
+import json
+import os
+import time
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "LinearArchive")
+
+
+def emit_metrics(metrics, dimensions=None, properties=None):
+    """Print one EMF record.
+
+    metrics: {name: (value, unit)}, e.g. {"CacheHit": (1, "Count")}
+    dimensions: {name: value} shared by every metric in the record
+    properties: extra searchable fields that are not metrics
+    """
+    dimensions = dimensions or {}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [list(dimensions.keys())],
+                "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()]
+            }]
+        },
+        **dimensions,
+        **(properties or {}),
+        **{name: value for name, (value, _) in metrics.items()}
+    }
+    print(json.dumps(record, default=str))
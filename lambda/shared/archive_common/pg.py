@@ -0,0 +1,115 @@
+"""Direct Postgres access for the hot RPCs, bypassing PostgREST.
+
+Enabled by setting DATABASE_URL, normally the Supabase pooler connection
+string. The pool is created on first use and kept at module level, so warm
+invocations reuse open connections. Server-side prepared statements are off
+by default, since the Supabase pooler in transaction mode does not support
+them; set PG_PREPARE_THRESHOLD (psycopg executions before a statement is
+prepared, e.g. 0) when connecting to a session-mode pooler or Postgres itself.
+
+The connection role bypasses RLS like the service key does, so every query
+here filters by user_id explicitly, and callers only pass user ids they
+have verified.
+"""
+import os
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+POOL_MIN_SIZE = int(os.environ.get("PG_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("PG_POOL_MAX_SIZE", "2"))
+CONNECT_TIMEOUT_SECONDS = int(os.environ.get("PG_CONNECT_TIMEOUT_SECONDS", "5"))
+_prepare_threshold = os.environ.get("PG_PREPARE_THRESHOLD", "none")
+PREPARE_THRESHOLD = None if _prepare_threshold.lower() in ("", "none") else int(_prepare_threshold)
+
+_pool = None
+
+
+def enabled():
+    return bool(DATABASE_URL)
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        from psycopg_pool import ConnectionPool
+        _pool = ConnectionPool(
+            DATABASE_URL,
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            kwargs={
+                "autocommit": True,
+                "prepare_threshold": PREPARE_THRESHOLD,
+                "connect_timeout": CONNECT_TIMEOUT_SECONDS,
+            },
+            # Connections can die while the execution environment is frozen
+            check=ConnectionPool.check_connection,
+            open=True,
+        )
+    return _pool
+
+
+def vector_literal(vector):
+    return "[" + ",".join(map(repr, vector)) + "]"
+
+
+def _fetch_dicts(sql, params):
+    from psycopg.rows import dict_row
+    with get_pool().connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+
+def _execute(sql, params):
+    with get_pool().connection() as conn:
+        return conn.execute(sql, params).rowcount
+
+
+def match_boards(embedding, user_id, match_threshold, match_count, search_mode="exact"):
+    """Same rows as the match_boards / match_boards_quantized RPCs, JSON-ready."""
+    columns = "board_id::text, user_id::text, description, date::text AS date, similarity"
+    if search_mode == "exact":
+        return _fetch_dicts(
+            f"SELECT {columns} FROM match_boards(%s::vector, %s::uuid, %s, %s)",
+            (vector_literal(embedding), user_id, match_threshold, match_count)
+        )
+    return _fetch_dicts(
+        f"SELECT {columns} FROM match_boards_quantized(%s::vector, %s::uuid, %s, %s, %s)",
+        (vector_literal(embedding), user_id, match_threshold, match_count, search_mode)
+    )
+
+
+def set_board_vector(board_id, user_id, vector, model, vector_next=None, next_model=None):
+    """Write a board's embedding (and shadow embedding); returns rows updated."""
+    if vector_next is None:
+        return _execute(
+            "UPDATE board SET vector = %s::vector, embedding_model = %s "
+            "WHERE board_id = %s::uuid AND user_id = %s::uuid",
+            (vector_literal(vector), model, board_id, user_id)
+        )
+    return _execute(
+        "UPDATE board SET vector = %s::vector, embedding_model = %s, "
+        "vector_next = %s::vector, embedding_model_next = %s "
+        "WHERE board_id = %s::uuid AND user_id = %s::uuid",
+        (vector_literal(vector), model, vector_literal(vector_next), next_model, board_id, user_id)
+    )
+
+
+def increment_board_counter(user_id):
+    _execute("SELECT increment_board_counter(%s::uuid)", (user_id,))
+
+
+def get_user_analysis(user_id):
+    rows = _fetch_dicts(
+        "SELECT compressed_data, boards_since_last_compression FROM user_analysis WHERE user_id = %s::uuid",
+        (user_id,)
+    )
+    return rows[0] if rows else None
+
+
+def update_user_analysis(user_id, compressed_data, boards_since_last_compression):
+    """Returns rows updated (0 when the user has no user_analysis row)."""
+    return _execute(
+        "UPDATE user_analysis SET compressed_data = %s, boards_since_last_compression = %s "
+        "WHERE user_id = %s::uuid",
+        (compressed_data, boards_since_last_compression, user_id)
+    )
@@ -0,0 +1,153 @@
+"""Opt-in profiling of handler invocations.
+
+@profiled(name) wraps a lambda_handler. When PROFILE_MODE is set, selected
+invocations run under a profiler and the result is kept when the invocation
+took at least PROFILE_SLOW_MS:
+
+  sample    a background thread samples every thread's stack each
+            PROFILE_INTERVAL_MS and writes collapsed stacks
+            ("thread;outer;inner count" lines, the input of flamegraph.pl
+            and speedscope); low overhead, so it can run on every request
+  cprofile  deterministic cProfile of the handler thread, written as a
+            .pstats file (python -m pstats, snakeviz); much slower
+
+An invocation is selected by PROFILE_RATE (fraction of requests), or per
+request with an X-Profile header or "profile": true in a direct invoke.
+
+Env:
+  PROFILE_MODE         off | sample | cprofile (off)
+  PROFILE_RATE         fraction of invocations profiled (1.0)
+  PROFILE_SLOW_MS      keep only profiles of invocations at least this slow (0)
+  PROFILE_INTERVAL_MS  sampling interval (5)
+  PROFILE_OUTPUT       directory, or s3://bucket/prefix (/tmp/profiles)
+"""
+import collections
+import cProfile
+import functools
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+
+MODE = os.environ.get("PROFILE_MODE", "off")
+RATE = float(os.environ.get("PROFILE_RATE", "1.0"))
+SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", "0"))
+INTERVAL_SECONDS = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+OUTPUT = os.environ.get("PROFILE_OUTPUT", "/tmp/profiles")
+
+_active = threading.local()
+
+
+class StackSampler:
+    """Counts collapsed stacks of all other threads, sampled on a timer.
+    Frames above root_code (the runtime's and the caller's) are left out."""
+
+    def __init__(self, interval, root_code=None):
+        self.interval = interval
+        self.root_code = root_code
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and frame.f_code is not self.root_code:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def frame_label(frame):
+    path = frame.f_code.co_filename
+    # site-packages/requests/sessions.py -> requests/sessions.py
+    path = path.rsplit("site-packages/", 1)[-1] if "site-packages/" in path else os.path.basename(path)
+    return f"{frame.f_code.co_name} ({path})"
+
+
+def requested(event):
+    if not isinstance(event, dict):
+        return False
+    if event.get("profile") is True:
+        return True
+    return any(name.lower() == "x-profile" and value not in ("", "0", "false")
+               for name, value in (event.get("headers") or {}).items())
+
+
+def write_profile(filename, data):
+    """Store a profile under PROFILE_OUTPUT; returns where it went."""
+    if OUTPUT.startswith("s3://"):
+        import boto3  # in the Lambda runtime
+        bucket, _, prefix = OUTPUT[len("s3://"):].partition("/")
+        key = f"{prefix.rstrip('/')}/{filename}".lstrip("/")
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=data)
+        return f"s3://{bucket}/{key}"
+    path = os.path.join(OUTPUT, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _profile_filename(name, context, elapsed_ms, extension):
+    request_id = getattr(context, "aws_request_id", None) or f"{os.getpid()}-{int(time.time() * 1000)}"
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    return f"{name}/{stamp}-{elapsed_ms:.0f}ms-{request_id}.{extension}"
+
+
+def profiled(name):
+    """Decorator for lambda_handler functions; returns the handler unchanged
+    unless PROFILE_MODE is sample or cprofile. Nested profiled handlers (the
+    router calling a route) are profiled once, by the outermost one."""
+    def decorator(handler):
+        if MODE not in ("sample", "cprofile"):
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            if getattr(_active, "on", False) or not (requested(event) or random.random() < RATE):
+                return handler(event, context)
+            _active.on = True
+            started = time.perf_counter()
+            try:
+                if MODE == "sample":
+                    with StackSampler(INTERVAL_SECONDS, wrapper.__code__) as profiler:
+                        return handler(event, context)
+                profiler = cProfile.Profile()
+                return profiler.runcall(handler, event, context)
+            finally:
+                _active.on = False
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if elapsed_ms >= SLOW_MS:
+                    try:
+                        if MODE == "sample":
+                            data = profiler.collapsed().encode("utf-8")
+                            filename = _profile_filename(name, context, elapsed_ms, "collapsed")
+                        else:
+                            profiler.create_stats()
+                            data = marshal.dumps(profiler.stats)
+                            filename = _profile_filename(name, context, elapsed_ms, "pstats")
+                        print(f"Profile of {elapsed_ms:.0f} ms invocation written to {write_profile(filename, data)}")
+                    except Exception as e:
+                        print(f"WARNING: Writing profile failed: {str(e)}")
+        return wrapper
+    return decorator
@@ -0,0 +1,87 @@
+"""Minimal PostgREST client covering the part of the supabase-py API the
+lambdas use: table(...).select/update/eq/limit and rpc(...), each ending in
+.execute().data.
+
+supabase-py imports httpx, pydantic and the auth, realtime and storage
+clients at load time; this only needs requests. Clients are cached per
+(url, key) so warm invocations reuse the keep-alive session.
+"""
+import requests
+
+TIMEOUT_SECONDS = 10
+
+_clients = {}
+
+
+class APIResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def __repr__(self):
+        return f"APIResponse(data={self.data!r})"
+
+
+class _Request:
+    def __init__(self, client, method, path, payload=None, headers=None):
+        self.client = client
+        self.method = method
+        self.path = path
+        self.payload = payload
+        self.headers = headers or {}
+        self.params = {}
+
+    def select(self, columns="*"):
+        self.params["select"] = columns
+        return self
+
+    def update(self, payload):
+        # supabase-py returns the updated rows
+        self.method = "PATCH"
+        self.payload = payload
+        self.headers["Prefer"] = "return=representation"
+        return self
+
+    def eq(self, column, value):
+        self.params[column] = f"eq.{value}"
+        return self
+
+    def limit(self, count):
+        self.params["limit"] = count
+        return self
+
+    def execute(self):
+        response = self.client.session.request(
+            self.method,
+            f"{self.client.rest_url}/{self.path}",
+            params=self.params,
+            json=self.payload,
+            headers=self.headers,
+            timeout=TIMEOUT_SECONDS
+        )
+        if not response.ok:
+            raise Exception(f"PostgREST error {response.status_code} on {self.path}: {response.text}")
+        return APIResponse(response.json() if response.content else None)
+
+
+class RestClient:
+    def __init__(self, supabase_url, supabase_key):
+        self.rest_url = f"{supabase_url.rstrip('/')}/rest/v1"
+        self.session = requests.Session()
+        self.session.headers.update({
+            "apikey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+            "Content-Type": "application/json"
+        })
+
+    def table(self, name):
+        return _Request(self, "GET", name)
+
+    def rpc(self, name, params=None):
+        return _Request(self, "POST", f"rpc/{name}", payload=params or {})
+
+
+def create_client(supabase_url, supabase_key):
+    key = (supabase_url, supabase_key)
+    if key not in _clients:
+        _clients[key] = RestClient(supabase_url, supabase_key)
+    return _clients[key]
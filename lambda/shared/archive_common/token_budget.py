@@ -0,0 +1,62 @@
+"""Token estimates and prompt budgets for DeepSeek calls.
+
+No tokenizer ships with the lambdas, so counts are estimated per character
+class from DeepSeek's published ratios (about 0.3 tokens per English
+character and 0.6 per CJK character), rounded up for Hangul, and biased high
+so a prompt that fits the estimate fits the model.
+
+Env:
+  DEEPSEEK_CONTEXT_TOKENS  context window of the model (64000)
+"""
+import os
+
+CONTEXT_TOKENS = int(os.environ.get("DEEPSEEK_CONTEXT_TOKENS", "64000"))
+# Chat template, role markers and estimation error
+SAFETY_MARGIN = 0.1
+
+ASCII_TOKENS_PER_CHAR = 0.3
+HANGUL_TOKENS_PER_CHAR = 0.8
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.5
+
+
+def estimate_tokens(text):
+    """Estimated token count of a string (or the str() of anything else)."""
+    if not isinstance(text, str):
+        text = str(text)
+    ascii_chars = hangul = cjk = 0
+    for ch in text:
+        code = ord(ch)
+        if code < 128:
+            ascii_chars += 1
+        elif 0xAC00 <= code <= 0xD7A3 or 0x1100 <= code <= 0x11FF or 0x3130 <= code <= 0x318F:
+            hangul += 1
+        elif 0x4E00 <= code <= 0x9FFF or 0x3040 <= code <= 0x30FF:
+            cjk += 1
+    other = len(text) - ascii_chars - hangul - cjk
+    return int(ascii_chars * ASCII_TOKENS_PER_CHAR + hangul * HANGUL_TOKENS_PER_CHAR
+               + cjk * CJK_TOKENS_PER_CHAR + other * OTHER_TOKENS_PER_CHAR) + 1
+
+
+def input_budget(max_output_tokens, *fixed_parts, context_tokens=None):
+    """Tokens left for variable prompt content once the fixed parts (system
+    prompt, instructions, history) and the completion are reserved."""
+    context_tokens = context_tokens or CONTEXT_TOKENS
+    usable = int(context_tokens * (1 - SAFETY_MARGIN))
+    return max(0, usable - max_output_tokens - sum(estimate_tokens(p) for p in fixed_parts))
+
+
+def chunk_items(items, budget, measure=estimate_tokens):
+    """Split items, in order, into lists whose measured tokens sum to at most
+    budget. An item larger than the budget gets a chunk of its own."""
+    chunks, current, used = [], [], 0
+    for item in items:
+        cost = measure(item)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,300 @@
+"""W3C trace context propagation and OTLP span export.
+
+@traced(name) wraps a lambda_handler in a SERVER span that continues the
+caller's trace (a traceparent header, or a "traceparent" key in a direct /
+async invoke payload) or starts a new one. While it runs, every call made
+through requests (DeepSeek, the voyageai SDK, rest.py) or httpx
+(supabase-py) gets a CLIENT span and a traceparent header, span() adds
+spans of its own, and inject() puts the current context into payloads for
+other functions. Spans are sent to an OTLP/HTTP (JSON) collector before the
+handler returns, e.g. a local Jaeger:
+
+    docker run -p 16686:16686 -p 4318:4318 jaegertracing/all-in-one
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318
+
+or bench/trace_collector.py. Without an endpoint nothing is patched or
+recorded.
+
+Spans follow contextvars: work handed to a thread pool joins the trace only
+when submitted with contextvars.copy_context().run.
+
+Env:
+  OTEL_EXPORTER_OTLP_ENDPOINT         collector base URL (unset = off)
+  OTEL_EXPORTER_OTLP_TRACES_ENDPOINT  full traces URL, overrides the above
+  OTEL_EXPORTER_OTLP_HEADERS          extra headers, "key=value,key2=value2"
+  OTEL_SERVICE_NAME                   defaults to AWS_LAMBDA_FUNCTION_NAME, then
+                                      the name given to @traced
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+_base_endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "").rstrip("/")
+ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or (
+    f"{_base_endpoint}/v1/traces" if _base_endpoint else ""
+)
+ENABLED = bool(ENDPOINT)
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+EXPORT_HEADERS = dict(
+    item.split("=", 1) for item in os.environ.get("OTEL_EXPORTER_OTLP_HEADERS", "").split(",") if "=" in item
+)
+EXPORT_TIMEOUT_SECONDS = 2
+
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_finished = []
+_lock = threading.Lock()
+_patched = {"done": False}
+_cold_start = {"value": True}
+
+
+class Span:
+    def __init__(self, name, kind, trace_id, parent_id, attributes):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+
+
+def otlp_attributes(attributes):
+    encoded = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            encoded.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span_id) from a traceparent value, or None."""
+    match = TRACEPARENT.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+def event_traceparent(event):
+    """traceparent of an incoming API Gateway / Function URL event or invoke payload."""
+    if not isinstance(event, dict):
+        return None
+    for name, value in (event.get("headers") or {}).items():
+        if name.lower() == "traceparent":
+            return value
+    return event.get("traceparent")
+
+
+@contextlib.contextmanager
+def span(name, kind=INTERNAL, parent=None, **attributes):
+    """Child span of the current one (or of the `parent` traceparent).
+    Yields None when tracing is off."""
+    if not ENABLED:
+        yield None
+        return
+    current = _current.get()
+    remote = parse_traceparent(parent) if parent else None
+    if remote:
+        trace_id, parent_id = remote
+    elif current is not None:
+        trace_id, parent_id = current.trace_id, current.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+    new_span = Span(name, kind, trace_id, parent_id, attributes)
+    token = _current.set(new_span)
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        new_span.end_ns = time.time_ns()
+        _current.reset(token)
+        with _lock:
+            _finished.append(new_span)
+
+
+def record(name, parent, start_ns, kind=INTERNAL, **attributes):
+    """Finished span, from start_ns to now, under a traceparent carried by
+    queued work. Lets one batch show up in the trace of each request it
+    served."""
+    remote = parse_traceparent(parent)
+    if not ENABLED or not remote:
+        return
+    finished = Span(name, kind, remote[0], remote[1], attributes)
+    finished.start_ns = start_ns
+    finished.end_ns = time.time_ns()
+    with _lock:
+        _finished.append(finished)
+
+
+def current_traceparent():
+    current = _current.get()
+    return current.traceparent() if current is not None else None
+
+
+def inject(payload):
+    """Add the current traceparent to an invoke payload (dict), in place."""
+    traceparent = current_traceparent()
+    if traceparent:
+        payload["traceparent"] = traceparent
+    return payload
+
+
+def flush(service_name):
+    """Send finished spans to the collector; never raises."""
+    with _lock:
+        spans = _finished[:]
+        _finished.clear()
+    if not spans:
+        return
+    body = json.dumps({"resourceSpans": [{
+        "resource": {"attributes": otlp_attributes({
+            "service.name": SERVICE_NAME or service_name,
+            "cloud.provider": "aws",
+            "faas.name": os.environ.get("AWS_LAMBDA_FUNCTION_NAME"),
+        })},
+        "scopeSpans": [{"scope": {"name": "archive_common.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+    }]}).encode("utf-8")
+    # urllib rather than requests so the export itself is not traced
+    request = urllib.request.Request(ENDPOINT, data=body, method="POST",
+                                     headers={"Content-Type": "application/json", **EXPORT_HEADERS})
+    try:
+        urllib.request.urlopen(request, timeout=EXPORT_TIMEOUT_SECONDS).close()
+    except Exception as e:
+        print(f"WARNING: Trace export failed ({len(spans)} spans dropped): {str(e)}")
+
+
+@contextlib.contextmanager
+def client_span(method, url):
+    parts = urlsplit(url)
+    with span(f"{method} {parts.hostname}", kind=CLIENT, **{
+        "http.request.method": method,
+        "server.address": parts.hostname,
+        "url.path": parts.path,
+    }) as new_span:
+        yield new_span
+
+
+def _patch_requests():
+    try:
+        from requests.adapters import HTTPAdapter
+    except ImportError:
+        return
+    original_send = HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        if _current.get() is None:
+            return original_send(self, request, **kwargs)
+        with client_span(request.method, request.url) as new_span:
+            request.headers["traceparent"] = new_span.traceparent()
+            response = original_send(self, request, **kwargs)
+            new_span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                new_span.error = f"HTTP {response.status_code}"
+            return response
+
+    HTTPAdapter.send = send
+
+
+def _patch_httpx():
+    try:
+        import httpx
+    except ImportError:
+        return
+    original_handle = httpx.HTTPTransport.handle_request
+
+    def handle_request(self, request):
+        if _current.get() is None:
+            return original_handle(self, request)
+        with client_span(request.method, str(request.url)) as new_span:
+            request.headers["traceparent"] = new_span.traceparent()
+            response = original_handle(self, request)
+            new_span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                new_span.error = f"HTTP {response.status_code}"
+            return response
+
+    httpx.HTTPTransport.handle_request = handle_request
+
+
+def traced(name):
+    """Decorator for lambda_handler functions; returns the handler unchanged
+    when no OTLP endpoint is configured. A traced handler called from
+    another one (the router) records a child span and leaves the export to
+    the outer one."""
+    def decorator(handler):
+        if not ENABLED:
+            return handler
+        if not _patched["done"]:
+            _patched["done"] = True
+            _patch_requests()
+            _patch_httpx()
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            outer = _current.get() is None
+            request_context = (event.get("requestContext") or {}) if isinstance(event, dict) else {}
+            attributes = {
+                "faas.trigger": "http" if request_context else "other",
+                "faas.invocation_id": getattr(context, "aws_request_id", None),
+                "faas.coldstart": _cold_start["value"],
+                "http.request.method": event.get("httpMethod") if isinstance(event, dict) else None,
+                "url.path": (event.get("rawPath") or event.get("path")) if isinstance(event, dict) else None,
+                "task": event.get("task") if isinstance(event, dict) else None,
+            }
+            _cold_start["value"] = False
+            try:
+                with span(name, kind=SERVER if outer else INTERNAL,
+                          parent=event_traceparent(event) if outer else None, **attributes) as server_span:
+                    response = handler(event, context)
+                    status = response.get("statusCode") if isinstance(response, dict) else None
+                    if status is not None:
+                        server_span.set_attribute("http.response.status_code", status)
+                        if status >= 500:
+                            server_span.error = f"HTTP {status}"
+                    return response
+            finally:
+                if outer:
+                    flush(name)
+        return wrapper
+    return decorator
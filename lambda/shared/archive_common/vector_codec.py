@@ -0,0 +1,84 @@
+"""Compact vector encoding for RPC payloads (see sql/vector_codec.sql).
+
+Vectors are sent as base64 of their little-endian float32 (or lossy float16)
+bytes instead of a JSON array of decimals. float16 is for query embeddings
+only; vectors written to board always go as float32 (STORED_FORMAT). NumPy
+is used when the package has it, imported on the first encode so it stays
+out of the cold start; the stdlib fallback produces the same bytes.
+"""
+import base64
+import os
+import struct
+import sys
+from array import array
+
+# json (plain RPC parameters), float32 or float16
+WIRE_FORMAT = os.environ.get("VECTOR_WIRE_FORMAT", "json")
+# Format of vectors sent to set_board_vector_b64, whatever WIRE_FORMAT is
+STORED_FORMAT = "float32"
+
+_NUMPY_DTYPES = {"float32": "<f4", "float16": "<f2"}
+_numpy = {}
+
+
+def _np():
+    """numpy, or None when the package does not bundle it."""
+    if "module" not in _numpy:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy["module"] = numpy
+    return _numpy["module"]
+
+
+def encode_vector(vector, fmt="float32"):
+    """base64 of the vector's little-endian bytes in the given format."""
+    if fmt not in _NUMPY_DTYPES:
+        raise ValueError(f"Unknown vector format: {fmt}")
+    np = _np()
+    if np is not None:
+        data = np.asarray(vector, dtype=_NUMPY_DTYPES[fmt]).tobytes()
+    elif fmt == "float32":
+        packed = array("f", vector)
+        if sys.byteorder != "little":
+            packed.byteswap()
+        data = packed.tobytes()
+    else:
+        data = struct.pack(f"<{len(vector)}e", *vector)
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_vector(encoded, fmt="float32"):
+    """Inverse of encode_vector; returns a list of floats."""
+    data = base64.b64decode(encoded)
+    if fmt == "float32":
+        return list(struct.unpack(f"<{len(data) // 4}f", data))
+    if fmt == "float16":
+        return list(struct.unpack(f"<{len(data) // 2}e", data))
+    raise ValueError(f"Unknown vector format: {fmt}")
+
+
+def match_boards_call(embedding, user_id, match_threshold, match_count,
+                      search_mode="exact", fmt=None):
+    """RPC name and parameters for a board search in the configured wire format.
+
+    search_mode "exact" uses match_boards, anything else match_boards_quantized;
+    compact formats go through match_boards_b64 which dispatches the same way.
+    """
+    fmt = fmt or WIRE_FORMAT
+    params = {
+        "query_user_id": user_id,
+        "match_threshold": match_threshold,
+        "match_count": match_count,
+    }
+    if fmt != "json":
+        params["query_embedding_b64"] = encode_vector(embedding, fmt)
+        params["vector_format"] = fmt
+        params["search_mode"] = search_mode
+        return "match_boards_b64", params
+    params["query_embedding"] = embedding
+    if search_mode == "exact":
+        return "match_boards", params
+    params["search_mode"] = search_mode
+    return "match_boards_quantized", params
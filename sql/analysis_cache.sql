@@ -0,0 +1,67 @@
+-- Result cache for deepseek-analysis (quick_insight / analysis).
+--
+-- cache_key is a hash of the task, its prompt version and the normalized
+-- inputs, so identical requests skip the LLM until expires_at. board_ids lists
+-- every board the result was derived from; changing or deleting any of them
+-- drops the cached result (see invalidate_analysis_cache_for_board).
+CREATE TABLE IF NOT EXISTS analysis_cache (
+  cache_key text PRIMARY KEY,
+  task text NOT NULL,
+  user_id uuid,
+  board_ids text[] NOT NULL DEFAULT '{}',
+  result jsonb NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS analysis_cache_board_ids_idx ON analysis_cache USING gin (board_ids);
+CREATE INDEX IF NOT EXISTS analysis_cache_user_id_idx ON analysis_cache (user_id);
+CREATE INDEX IF NOT EXISTS analysis_cache_expires_at_idx ON analysis_cache (expires_at);
+
+-- Only the service role (lambdas) reads and writes the cache
+ALTER TABLE analysis_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION invalidate_analysis_cache_for_board()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  vector_columns text[] := ARRAY[
+    'vector', 'vector_half', 'vector_bits', 'embedding_model', 'vector_next', 'embedding_model_next'
+  ];
+BEGIN
+  -- Re-embedding only rewrites vectors; the cached text is still valid
+  IF TG_OP = 'UPDATE' AND (to_jsonb(OLD) - vector_columns) = (to_jsonb(NEW) - vector_columns) THEN
+    RETURN NULL;
+  END IF;
+
+  DELETE FROM analysis_cache
+  WHERE board_ids @> ARRAY[OLD.board_id::text];
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS board_invalidate_analysis_cache ON board;
+CREATE TRIGGER board_invalidate_analysis_cache
+  AFTER UPDATE OR DELETE ON board
+  FOR EACH ROW
+  EXECUTE FUNCTION invalidate_analysis_cache_for_board();
+
+-- Explicit invalidation, e.g. after compression rewrites a user's history
+CREATE OR REPLACE FUNCTION invalidate_analysis_cache(p_user_id uuid)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM analysis_cache WHERE user_id = p_user_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION purge_expired_analysis_cache()
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM analysis_cache WHERE expires_at <= now();
+END;
+$$;
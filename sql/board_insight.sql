@@ -0,0 +1,23 @@
+-- Pre-generated quick insights, written by deepseek-analysis when
+-- embedding-lambda invokes it asynchronously after a board is embedded.
+--
+-- content_hash is sha256 hex of the compact JSON object
+-- {"date": ..., "description": ..., "tags": [sorted tag names]} with sorted
+-- keys and no whitespace (see board_content_hash in embedding-lambda), so the
+-- UI can look up the insight for exactly the content it just saved.
+CREATE TABLE IF NOT EXISTS board_insight (
+  board_id uuid NOT NULL REFERENCES board (board_id) ON DELETE CASCADE,
+  user_id uuid NOT NULL,
+  content_hash text NOT NULL,
+  action text NOT NULL DEFAULT 'create',
+  insight text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (board_id, content_hash, action)
+);
+
+ALTER TABLE board_insight ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS board_insight_select_own ON board_insight;
+CREATE POLICY board_insight_select_own ON board_insight
+  FOR SELECT
+  USING (user_id = auth.uid());
@@ -0,0 +1,236 @@
+-- Embedding model versioning and zero-downtime re-embedding.
+--
+-- board.embedding_model records which model produced board.vector. To move to
+-- a new model, set embedding_config.next_model: embedding-lambda then
+-- dual-writes vector_next for every saved board, the embedding-jobs backfill
+-- fills vector_next for the rest (resuming from embedding_backfill_checkpoint),
+-- and promote_embedding_model() swaps the shadow vectors in atomically once
+-- every board is covered. The new model must produce 1024-dim vectors.
+--
+-- Writers cache embedding_config for up to EMBEDDING_CONFIG_TTL_SECONDS, so a
+-- warm lambda can still embed with the old model right after a promotion.
+-- reject_stale_model_vector() keeps those vectors out of board.vector: the
+-- shadow vector is used when the writer had one for the active model,
+-- otherwise the vector is cleared and the embedding-jobs repair task
+-- (sql/embedding_repair.sql) re-embeds the board with the active model.
+ALTER TABLE board ADD COLUMN IF NOT EXISTS embedding_model text;
+ALTER TABLE board ADD COLUMN IF NOT EXISTS vector_next VECTOR(1024);
+ALTER TABLE board ADD COLUMN IF NOT EXISTS embedding_model_next text;
+
+-- Vectors written before model tracking all came from voyage-3
+UPDATE board SET embedding_model = 'voyage-3'
+WHERE vector IS NOT NULL AND embedding_model IS NULL;
+
+CREATE TABLE IF NOT EXISTS embedding_config (
+  id boolean PRIMARY KEY DEFAULT true CHECK (id),
+  active_model text NOT NULL,
+  next_model text,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+INSERT INTO embedding_config (active_model) VALUES ('voyage-3')
+ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE embedding_config ENABLE ROW LEVEL SECURITY;
+
+-- deepseek-call reads the active model with the user's session
+DROP POLICY IF EXISTS embedding_config_read ON embedding_config;
+CREATE POLICY embedding_config_read ON embedding_config
+  FOR SELECT
+  USING (true);
+
+CREATE TABLE IF NOT EXISTS embedding_backfill_checkpoint (
+  target_model text PRIMARY KEY,
+  last_board_id uuid,
+  processed INT NOT NULL DEFAULT 0,
+  failed INT NOT NULL DEFAULT 0,
+  passes INT NOT NULL DEFAULT 0,
+  started_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  completed_at timestamptz
+);
+
+ALTER TABLE embedding_backfill_checkpoint ENABLE ROW LEVEL SECURITY;
+
+-- A content edit invalidates the shadow vector unless the same update
+-- carries a fresh one (embedding-lambda dual-write). Together with the
+-- content check in apply_shadow_vectors (a backfill write for content that
+-- has since changed is dropped) a stale shadow vector is never promoted.
+CREATE OR REPLACE FUNCTION clear_stale_shadow_vector()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  vector_columns text[] := ARRAY[
+    'vector', 'vector_half', 'vector_bits', 'embedding_model', 'vector_next', 'embedding_model_next'
+  ];
+BEGIN
+  IF NEW.vector_next IS NOT DISTINCT FROM OLD.vector_next
+     AND (to_jsonb(NEW) - vector_columns) IS DISTINCT FROM (to_jsonb(OLD) - vector_columns) THEN
+    NEW.vector_next := NULL;
+    NEW.embedding_model_next := NULL;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS board_clear_stale_shadow_vector ON board;
+CREATE TRIGGER board_clear_stale_shadow_vector
+  BEFORE UPDATE ON board
+  FOR EACH ROW
+  EXECUTE FUNCTION clear_stale_shadow_vector();
+
+CREATE OR REPLACE FUNCTION reject_stale_model_vector()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  current_model text;
+BEGIN
+  IF NEW.vector IS NULL THEN
+    RETURN NEW;
+  END IF;
+  SELECT active_model INTO current_model FROM embedding_config;
+  IF current_model IS NULL OR NEW.embedding_model IS NOT DISTINCT FROM current_model THEN
+    RETURN NEW;
+  END IF;
+  IF NEW.vector_next IS NOT NULL AND NEW.embedding_model_next = current_model THEN
+    NEW.vector := NEW.vector_next;
+    NEW.embedding_model := current_model;
+  ELSE
+    NEW.vector := NULL;
+    NEW.embedding_model := NULL;
+  END IF;
+  NEW.vector_next := NULL;
+  NEW.embedding_model_next := NULL;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS board_reject_stale_model_vector ON board;
+CREATE TRIGGER board_reject_stale_model_vector
+  BEFORE INSERT OR UPDATE OF vector, embedding_model ON board
+  FOR EACH ROW
+  EXECUTE FUNCTION reject_stale_model_vector();
+
+-- Vectors already written by a stale model go back to the repair queue
+UPDATE board SET vector = NULL, embedding_model = NULL
+WHERE vector IS NOT NULL
+  AND embedding_model IS DISTINCT FROM (SELECT active_model FROM embedding_config);
+
+-- Fingerprint of the board fields an embedding is computed from. Batch
+-- functions hand it out with the content and the apply functions write a
+-- vector only if the board still matches, so an edit made while the batch
+-- was being embedded is never overwritten by a vector of the old content.
+CREATE OR REPLACE FUNCTION board_content_fingerprint(
+  p_description text,
+  p_tags text[],
+  p_date date,
+  p_image text
+)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT md5(jsonb_build_array(p_description, p_tags, p_date, p_image)::text);
+$$;
+
+-- Next keyset page of boards still missing a shadow vector for p_model
+DROP FUNCTION IF EXISTS embedding_backfill_batch(text, uuid, INT);
+CREATE OR REPLACE FUNCTION embedding_backfill_batch(
+  p_model text,
+  p_after uuid DEFAULT NULL,
+  p_limit INT DEFAULT 64
+)
+RETURNS TABLE (
+  board_id uuid,
+  user_id uuid,
+  description text,
+  date date,
+  tags text[],
+  image text,
+  content_hash text
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT board.board_id, board.user_id, board.description, board.date, board.tags, board.image,
+         board_content_fingerprint(board.description, board.tags, board.date, board.image)
+  FROM board
+  WHERE
+    (p_after IS NULL OR board.board_id > p_after)
+    AND board.embedding_model_next IS DISTINCT FROM p_model
+  ORDER BY board.board_id
+  LIMIT p_limit;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION embedding_backfill_remaining(p_model text)
+RETURNS bigint
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT count(*) FROM board WHERE embedding_model_next IS DISTINCT FROM p_model;
+$$;
+
+-- p_rows: [{"board_id": ..., "content_hash": ..., "vector": [...]}, ...] with
+-- content_hash from embedding_backfill_batch. Boards edited since are
+-- skipped (their shadow vector was cleared, or dual-written for the new
+-- content) and left for the next pass; returns the number applied.
+CREATE OR REPLACE FUNCTION apply_shadow_vectors(p_model text, p_rows jsonb)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated INT;
+BEGIN
+  UPDATE board
+  SET vector_next = (r.value->>'vector')::vector(1024),
+      embedding_model_next = p_model
+  FROM jsonb_array_elements(p_rows) r
+  WHERE board.board_id = (r.value->>'board_id')::uuid
+    AND board_content_fingerprint(board.description, board.tags, board.date, board.image)
+        = r.value->>'content_hash';
+  GET DIAGNOSTICS updated = ROW_COUNT;
+  RETURN updated;
+END;
+$$;
+
+-- Atomically switches search to the new model: match_boards keeps reading
+-- board.vector, which every board gets from vector_next in one transaction
+CREATE OR REPLACE FUNCTION promote_embedding_model(p_model text)
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  remaining bigint;
+  promoted bigint;
+BEGIN
+  -- Block concurrent board writes so no board slips in uncovered
+  LOCK TABLE board IN SHARE ROW EXCLUSIVE MODE;
+
+  SELECT embedding_backfill_remaining(p_model) INTO remaining;
+  IF remaining > 0 THEN
+    RAISE EXCEPTION 'Cannot promote %: % boards have no shadow vector', p_model, remaining;
+  END IF;
+
+  -- Config first, so reject_stale_model_vector() accepts the swapped vectors
+  UPDATE embedding_config
+  SET active_model = p_model, next_model = NULL, updated_at = now();
+
+  UPDATE board
+  SET vector = vector_next,
+      embedding_model = embedding_model_next,
+      vector_next = NULL,
+      embedding_model_next = NULL
+  WHERE embedding_model_next = p_model;
+  GET DIAGNOSTICS promoted = ROW_COUNT;
+
+  UPDATE embedding_backfill_checkpoint
+  SET completed_at = now(), updated_at = now()
+  WHERE target_model = p_model;
+
+  RETURN promoted;
+END;
+$$;
@@ -0,0 +1,140 @@
+-- Write-behind embedding queue.
+--
+-- In write-behind mode embedding-lambda only enqueues the board and returns;
+-- the embedding-jobs drain_queue task claims jobs in micro-batches and embeds
+-- them with one Voyage request. There is one job per board: saving a board
+-- again while its job is queued replaces the payload and bumps job_version,
+-- and a worker only applies its result if the version it claimed is still
+-- current.
+--
+-- Requires sql/embedding_backfill.sql (board.embedding_model, vector_next).
+CREATE TABLE IF NOT EXISTS embedding_queue (
+  board_id uuid PRIMARY KEY REFERENCES board (board_id) ON DELETE CASCADE,
+  user_id uuid NOT NULL,
+  payload jsonb NOT NULL,
+  job_version bigint NOT NULL DEFAULT 1,
+  attempts INT NOT NULL DEFAULT 0,
+  last_error text,
+  enqueued_at timestamptz NOT NULL DEFAULT now(),
+  locked_until timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS embedding_queue_enqueued_at_idx ON embedding_queue (enqueued_at);
+
+ALTER TABLE embedding_queue ENABLE ROW LEVEL SECURITY;
+
+-- p_payload: {"description", "tags", "date", "image", "traceparent"}
+CREATE OR REPLACE FUNCTION enqueue_embedding_job(p_board_id uuid, p_user_id uuid, p_payload jsonb)
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  new_version bigint;
+BEGIN
+  INSERT INTO embedding_queue (board_id, user_id, payload)
+  VALUES (p_board_id, p_user_id, p_payload)
+  ON CONFLICT (board_id)
+  DO UPDATE SET
+    payload = EXCLUDED.payload,
+    job_version = embedding_queue.job_version + 1,
+    attempts = 0,
+    last_error = NULL,
+    enqueued_at = now()
+  RETURNING job_version INTO new_version;
+  RETURN new_version;
+END;
+$$;
+
+-- Leases up to p_limit unlocked jobs, oldest first; concurrent workers skip
+-- each other's rows
+CREATE OR REPLACE FUNCTION claim_embedding_jobs(
+  p_limit INT DEFAULT 32,
+  p_lease_seconds INT DEFAULT 120,
+  p_max_attempts INT DEFAULT 5
+)
+RETURNS TABLE (
+  board_id uuid,
+  user_id uuid,
+  payload jsonb,
+  job_version bigint
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  UPDATE embedding_queue q
+  SET locked_until = now() + make_interval(secs => p_lease_seconds),
+      attempts = q.attempts + 1
+  WHERE q.board_id IN (
+    SELECT c.board_id
+    FROM embedding_queue c
+    WHERE (c.locked_until IS NULL OR c.locked_until < now())
+      AND c.attempts < p_max_attempts
+    ORDER BY c.enqueued_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING q.board_id, q.user_id, q.payload, q.job_version;
+END;
+$$;
+
+-- p_rows: [{"board_id", "job_version", "vector", "vector_next"?}, ...]
+-- Writes vectors for jobs still at the claimed version and removes them;
+-- superseded jobs are unlocked so the newer payload gets embedded. Returns
+-- the boards whose vector landed, for insight pre-generation.
+DROP FUNCTION IF EXISTS complete_embedding_jobs(text, text, jsonb);
+CREATE OR REPLACE FUNCTION complete_embedding_jobs(p_model text, p_next_model text, p_rows jsonb)
+RETURNS TABLE (board_id uuid)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  applied uuid[];
+BEGIN
+  WITH current_jobs AS (
+    DELETE FROM embedding_queue q
+    USING jsonb_array_elements(p_rows) r
+    WHERE q.board_id = (r.value->>'board_id')::uuid
+      AND q.job_version = (r.value->>'job_version')::bigint
+    RETURNING q.board_id AS job_board_id, r.value AS row_data
+  ), updated AS (
+    UPDATE board
+    SET vector = (j.row_data->>'vector')::vector(1024),
+        embedding_model = p_model,
+        vector_next = CASE WHEN j.row_data ? 'vector_next'
+                           THEN (j.row_data->>'vector_next')::vector(1024) ELSE board.vector_next END,
+        embedding_model_next = CASE WHEN j.row_data ? 'vector_next'
+                                    THEN p_next_model ELSE board.embedding_model_next END
+    FROM current_jobs j
+    WHERE board.board_id = j.job_board_id
+    -- After BEFORE triggers, so a refused vector shows up as NULL
+    RETURNING board.board_id AS updated_id, board.vector IS NOT NULL AS landed
+  )
+  SELECT COALESCE(array_agg(updated.updated_id) FILTER (WHERE updated.landed), '{}')
+  INTO applied
+  FROM updated;
+
+  UPDATE embedding_queue q
+  SET locked_until = NULL
+  FROM jsonb_array_elements(p_rows) r
+  WHERE q.board_id = (r.value->>'board_id')::uuid;
+
+  RETURN QUERY SELECT unnest(applied);
+END;
+$$;
+
+-- p_rows: [{"board_id", "error"}, ...]; retried after a backoff of
+-- 30s * 2^attempts until claim_embedding_jobs' p_max_attempts, after which
+-- the job stays in the table as a dead letter and the repair task covers
+-- the board
+CREATE OR REPLACE FUNCTION fail_embedding_jobs(p_rows jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE embedding_queue q
+  SET last_error = r.value->>'error',
+      locked_until = now() + make_interval(secs => 30 * power(2, q.attempts)::int)
+  FROM jsonb_array_elements(p_rows) r
+  WHERE q.board_id = (r.value->>'board_id')::uuid;
+END;
+$$;
@@ -0,0 +1,150 @@
+-- Repair for boards whose embedding never landed.
+--
+-- A failed embedding used to leave a zero vector behind, which match_boards
+-- had to filter row by row. Zero vectors are now stored as NULL, so "needs an
+-- embedding" is simply vector IS NULL, backed by a partial index, and the
+-- embedding-jobs repair task re-embeds those boards, recording failures with
+-- a retry count and backoff in embedding_repair.
+--
+-- Requires sql/embedding_backfill.sql (board.embedding_model,
+-- board_content_fingerprint).
+CREATE OR REPLACE FUNCTION normalize_zero_vector()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF NEW.vector IS NOT NULL AND vector_norm(NEW.vector) = 0 THEN
+    NEW.vector := NULL;
+    NEW.embedding_model := NULL;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS board_normalize_zero_vector ON board;
+CREATE TRIGGER board_normalize_zero_vector
+  BEFORE INSERT OR UPDATE OF vector ON board
+  FOR EACH ROW
+  EXECUTE FUNCTION normalize_zero_vector();
+
+UPDATE board SET vector = NULL, embedding_model = NULL
+WHERE vector IS NOT NULL AND vector_norm(vector) = 0;
+
+CREATE INDEX IF NOT EXISTS board_missing_vector_idx
+  ON board (board_id)
+  WHERE vector IS NULL;
+
+CREATE TABLE IF NOT EXISTS embedding_repair (
+  board_id uuid PRIMARY KEY REFERENCES board (board_id) ON DELETE CASCADE,
+  attempts INT NOT NULL DEFAULT 0,
+  last_error text,
+  last_attempt_at timestamptz,
+  next_attempt_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE embedding_repair ENABLE ROW LEVEL SECURITY;
+
+-- Boards without a vector that are due for another attempt. Boards younger
+-- than p_min_age are skipped: embedding-lambda is probably still on them.
+-- content_hash (board_content_fingerprint) goes back to apply_board_vectors.
+DROP FUNCTION IF EXISTS embedding_repair_batch(INT, INT, interval);
+CREATE OR REPLACE FUNCTION embedding_repair_batch(
+  p_limit INT DEFAULT 64,
+  p_max_attempts INT DEFAULT 5,
+  p_min_age interval DEFAULT '5 minutes'
+)
+RETURNS TABLE (
+  board_id uuid,
+  user_id uuid,
+  description text,
+  date date,
+  tags text[],
+  image text,
+  attempts INT,
+  content_hash text
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT board.board_id, board.user_id, board.description, board.date, board.tags, board.image,
+         COALESCE(r.attempts, 0),
+         board_content_fingerprint(board.description, board.tags, board.date, board.image)
+  FROM board
+  LEFT JOIN embedding_repair r ON r.board_id = board.board_id
+  WHERE
+    board.vector IS NULL
+    AND board.created_at < now() - p_min_age
+    AND (r.board_id IS NULL OR (r.attempts < p_max_attempts AND r.next_attempt_at <= now()))
+  ORDER BY board.board_id
+  LIMIT p_limit;
+END;
+$$;
+
+-- p_rows: [{"board_id": ..., "content_hash": ..., "vector": [...]}, ...] with
+-- content_hash from embedding_repair_batch. A vector is written only to a
+-- board that still has none and still has that content. Returns one row per
+-- submitted board:
+--   applied     the vector landed; the repair record is cleared
+--   superseded  the board got a vector elsewhere meanwhile (embedding-lambda)
+--   rejected    nothing landed: the content changed, or a trigger refused the
+--               vector (zero vector, model no longer active); record a failure
+DROP FUNCTION IF EXISTS apply_board_vectors(text, jsonb);
+CREATE OR REPLACE FUNCTION apply_board_vectors(p_model text, p_rows jsonb)
+RETURNS TABLE (board_id uuid, outcome text)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  applied uuid[];
+BEGIN
+  WITH updated AS (
+    UPDATE board
+    SET vector = (r.value->>'vector')::vector(1024),
+        embedding_model = p_model
+    FROM jsonb_array_elements(p_rows) r
+    WHERE board.board_id = (r.value->>'board_id')::uuid
+      AND board.vector IS NULL
+      AND board_content_fingerprint(board.description, board.tags, board.date, board.image)
+          = r.value->>'content_hash'
+    -- After BEFORE triggers, so a refused vector shows up as NULL
+    RETURNING board.board_id AS updated_id, board.vector IS NOT NULL AS landed
+  )
+  SELECT COALESCE(array_agg(updated.updated_id) FILTER (WHERE updated.landed), '{}')
+  INTO applied
+  FROM updated;
+
+  -- Boards that now have a vector, this one or a newer one, need no repair
+  DELETE FROM embedding_repair
+  USING board
+  WHERE embedding_repair.board_id = board.board_id
+    AND board.vector IS NOT NULL
+    AND board.board_id IN (SELECT (r.value->>'board_id')::uuid FROM jsonb_array_elements(p_rows) r);
+
+  RETURN QUERY
+  SELECT submitted.id,
+         CASE
+           WHEN submitted.id = ANY(applied) THEN 'applied'
+           WHEN b.vector IS NOT NULL THEN 'superseded'
+           ELSE 'rejected'
+         END
+  FROM (SELECT (r.value->>'board_id')::uuid AS id FROM jsonb_array_elements(p_rows) r) submitted
+  LEFT JOIN board b ON b.board_id = submitted.id;
+END;
+$$;
+
+-- Exponential backoff: 2, 4, 8, ... minutes between attempts
+CREATE OR REPLACE FUNCTION record_embedding_repair_failure(p_board_id uuid, p_error text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO embedding_repair (board_id, attempts, last_error, last_attempt_at, next_attempt_at)
+  VALUES (p_board_id, 1, p_error, now(), now() + interval '2 minutes')
+  ON CONFLICT (board_id)
+  DO UPDATE SET
+    attempts = embedding_repair.attempts + 1,
+    last_error = p_error,
+    last_attempt_at = now(),
+    next_attempt_at = now() + make_interval(mins => power(2, embedding_repair.attempts + 1)::int);
+END;
+$$;
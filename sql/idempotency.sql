@@ -0,0 +1,100 @@
+-- Idempotency-Key records for mutating lambdas (embedding-lambda,
+-- data-compression). See lambda/shared/archive_common/idempotency.py.
+CREATE TABLE IF NOT EXISTS idempotency_key (
+  scope text NOT NULL,
+  idempotency_key text NOT NULL,
+  request_hash text NOT NULL,
+  status text NOT NULL DEFAULT 'in_progress',
+  response jsonb,
+  locked_until timestamptz NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (scope, idempotency_key),
+  CHECK (status IN ('in_progress', 'completed'))
+);
+
+-- Only the service role (lambdas) reads and writes keys
+ALTER TABLE idempotency_key ENABLE ROW LEVEL SECURITY;
+
+-- outcome: claimed (caller should run the request), completed (replay
+-- stored_response), in_progress (another request holds the key) or
+-- mismatch (key reused with a different request body)
+CREATE OR REPLACE FUNCTION claim_idempotency_key(
+  p_scope text,
+  p_key text,
+  p_request_hash text,
+  p_lock_seconds INT DEFAULT 120
+)
+RETURNS TABLE (
+  outcome text,
+  stored_response jsonb
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  existing idempotency_key%ROWTYPE;
+BEGIN
+  INSERT INTO idempotency_key (scope, idempotency_key, request_hash, locked_until)
+  VALUES (p_scope, p_key, p_request_hash, now() + make_interval(secs => p_lock_seconds))
+  ON CONFLICT DO NOTHING;
+
+  IF FOUND THEN
+    RETURN QUERY SELECT 'claimed'::text, NULL::jsonb;
+    RETURN;
+  END IF;
+
+  SELECT * INTO existing
+  FROM idempotency_key k
+  WHERE k.scope = p_scope AND k.idempotency_key = p_key
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    -- Released between our insert and select; the caller retries
+    RETURN QUERY SELECT 'in_progress'::text, NULL::jsonb;
+  ELSIF existing.request_hash <> p_request_hash THEN
+    RETURN QUERY SELECT 'mismatch'::text, NULL::jsonb;
+  ELSIF existing.status = 'completed' THEN
+    RETURN QUERY SELECT 'completed'::text, existing.response;
+  ELSIF existing.locked_until < now() THEN
+    -- The previous holder died mid-flight; take the key over
+    UPDATE idempotency_key k
+    SET locked_until = now() + make_interval(secs => p_lock_seconds),
+        updated_at = now()
+    WHERE k.scope = p_scope AND k.idempotency_key = p_key;
+    RETURN QUERY SELECT 'claimed'::text, NULL::jsonb;
+  ELSE
+    RETURN QUERY SELECT 'in_progress'::text, NULL::jsonb;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION complete_idempotency_key(p_scope text, p_key text, p_response jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE idempotency_key
+  SET status = 'completed', response = p_response, updated_at = now()
+  WHERE scope = p_scope AND idempotency_key = p_key;
+END;
+$$;
+
+-- Failed requests give the key back so the client can retry it
+CREATE OR REPLACE FUNCTION release_idempotency_key(p_scope text, p_key text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM idempotency_key
+  WHERE scope = p_scope AND idempotency_key = p_key AND status = 'in_progress';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION purge_idempotency_keys(p_older_than interval DEFAULT '24 hours')
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM idempotency_key WHERE created_at < now() - p_older_than;
+END;
+$$;
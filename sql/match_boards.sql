@@ -25,7 +25,6 @@ BEGIN
   WHERE
     board.vector IS NOT NULL
     AND board.user_id = query_user_id
-    AND board.vector::text != array_fill(0, ARRAY[1024])::vector(1024)::text
   ORDER BY board.vector <=> query_embedding
   LIMIT match_count;
 END;
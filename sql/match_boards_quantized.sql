@@ -0,0 +1,84 @@
+-- Compact copies of board.vector for search (pgvector >= 0.7.0).
+--
+-- vector_half is the float16 copy (2 KB/board instead of 4 KB) and
+-- vector_bits the binary-quantized copy (128 bytes/board). Both are generated
+-- from board.vector, so existing writers need no change. Either section can be
+-- applied on its own.
+ALTER TABLE board
+  ADD COLUMN IF NOT EXISTS vector_half halfvec(1024)
+  GENERATED ALWAYS AS (vector::halfvec(1024)) STORED;
+
+CREATE INDEX IF NOT EXISTS board_vector_half_hnsw_idx
+  ON board USING hnsw (vector_half halfvec_cosine_ops);
+
+ALTER TABLE board
+  ADD COLUMN IF NOT EXISTS vector_bits bit(1024)
+  GENERATED ALWAYS AS (binary_quantize(vector)::bit(1024)) STORED;
+
+CREATE INDEX IF NOT EXISTS board_vector_bits_hnsw_idx
+  ON board USING hnsw (vector_bits bit_hamming_ops);
+
+-- Same signature and result as match_boards, but candidates are found on the
+-- compact column ('halfvec' or 'binary') and the top
+-- match_count * rerank_factor are re-ranked with exact cosine on board.vector.
+CREATE OR REPLACE FUNCTION match_boards_quantized(
+  query_embedding VECTOR(1024),
+  query_user_id uuid,
+  match_threshold FLOAT DEFAULT 0.5,
+  match_count INT DEFAULT 10,
+  search_mode text DEFAULT 'halfvec',
+  rerank_factor INT DEFAULT 4
+)
+RETURNS TABLE (
+  board_id uuid,
+  user_id uuid,
+  description text,
+  date date,
+  similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF search_mode = 'binary' THEN
+    RETURN QUERY
+    SELECT
+      candidate.board_id,
+      candidate.user_id,
+      candidate.description,
+      candidate.date,
+      1 - (candidate.vector <=> query_embedding) AS similarity
+    FROM (
+      SELECT board.board_id, board.user_id, board.description, board.date, board.vector
+      FROM board
+      WHERE
+        board.vector IS NOT NULL
+        AND board.user_id = query_user_id
+      ORDER BY board.vector_bits <~> binary_quantize(query_embedding)::bit(1024)
+      LIMIT match_count * rerank_factor
+    ) candidate
+    ORDER BY candidate.vector <=> query_embedding
+    LIMIT match_count;
+  ELSIF search_mode = 'halfvec' THEN
+    RETURN QUERY
+    SELECT
+      candidate.board_id,
+      candidate.user_id,
+      candidate.description,
+      candidate.date,
+      1 - (candidate.vector <=> query_embedding) AS similarity
+    FROM (
+      SELECT board.board_id, board.user_id, board.description, board.date, board.vector
+      FROM board
+      WHERE
+        board.vector IS NOT NULL
+        AND board.user_id = query_user_id
+      ORDER BY board.vector_half <=> query_embedding::halfvec(1024)
+      LIMIT match_count * rerank_factor
+    ) candidate
+    ORDER BY candidate.vector <=> query_embedding
+    LIMIT match_count;
+  ELSE
+    RAISE EXCEPTION 'Unknown search_mode: %', search_mode;
+  END IF;
+END;
+$$;
@@ -0,0 +1,155 @@
+-- Per-user semantic answer cache for deepseek-call.
+--
+-- A cached answer is reused for a new query whose embedding is within the
+-- caller's cosine distance threshold, but only while the user's boards are
+-- unchanged: every board insert/update/delete bumps board_set_version, and
+-- entries are only matched against the current version.
+CREATE TABLE IF NOT EXISTS board_set_version (
+  user_id uuid PRIMARY KEY,
+  version bigint NOT NULL DEFAULT 0,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE board_set_version ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS board_set_version_select_own ON board_set_version;
+CREATE POLICY board_set_version_select_own ON board_set_version
+  FOR SELECT
+  USING (user_id = auth.uid());
+
+CREATE OR REPLACE FUNCTION bump_board_set_version()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  affected_user uuid := COALESCE(NEW.user_id, OLD.user_id);
+  shadow_columns text[] := ARRAY['vector_next', 'embedding_model_next'];
+BEGIN
+  -- Backfill writes to the shadow column don't change search results
+  IF TG_OP = 'UPDATE' AND (to_jsonb(OLD) - shadow_columns) = (to_jsonb(NEW) - shadow_columns) THEN
+    RETURN NULL;
+  END IF;
+
+  INSERT INTO board_set_version (user_id, version)
+  VALUES (affected_user, 1)
+  ON CONFLICT (user_id)
+  DO UPDATE SET version = board_set_version.version + 1, updated_at = now();
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS board_bump_board_set_version ON board;
+CREATE TRIGGER board_bump_board_set_version
+  AFTER INSERT OR UPDATE OR DELETE ON board
+  FOR EACH ROW
+  EXECUTE FUNCTION bump_board_set_version();
+
+CREATE TABLE IF NOT EXISTS semantic_answer_cache (
+  id bigserial PRIMARY KEY,
+  user_id uuid NOT NULL,
+  model text NOT NULL,
+  query text NOT NULL,
+  embedding VECTOR(1024) NOT NULL,
+  board_set_version bigint NOT NULL,
+  answer jsonb NOT NULL,
+  hit_count INT NOT NULL DEFAULT 0,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  last_hit_at timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS semantic_answer_cache_user_idx
+  ON semantic_answer_cache (user_id, model, board_set_version);
+
+ALTER TABLE semantic_answer_cache ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS semantic_answer_cache_own ON semantic_answer_cache;
+CREATE POLICY semantic_answer_cache_own ON semantic_answer_cache
+  FOR ALL
+  USING (user_id = auth.uid())
+  WITH CHECK (user_id = auth.uid());
+
+-- Nearest cached answer for the user's current board set. Always returns one
+-- row carrying the current board_set_version (answer is NULL when nothing is
+-- cached), so the caller can report the nearest distance even on a miss and
+-- store its new answer against the version it searched.
+CREATE OR REPLACE FUNCTION match_semantic_cache(
+  query_embedding VECTOR(1024),
+  query_user_id uuid,
+  p_model text,
+  max_distance FLOAT DEFAULT 0.08
+)
+RETURNS TABLE (
+  cache_id bigint,
+  cached_query text,
+  answer jsonb,
+  distance FLOAT,
+  hit boolean,
+  board_set_version bigint
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  current_version bigint;
+  nearest record;
+BEGIN
+  SELECT COALESCE(
+    (SELECT v.version FROM board_set_version v WHERE v.user_id = query_user_id), 0
+  ) INTO current_version;
+
+  SELECT c.id, c.query, c.answer, c.embedding <=> query_embedding AS dist
+  INTO nearest
+  FROM semantic_answer_cache c
+  WHERE
+    c.user_id = query_user_id
+    AND c.model = p_model
+    AND c.board_set_version = current_version
+  ORDER BY c.embedding <=> query_embedding
+  LIMIT 1;
+
+  IF FOUND AND nearest.dist <= max_distance THEN
+    UPDATE semantic_answer_cache c
+    SET hit_count = c.hit_count + 1, last_hit_at = now()
+    WHERE c.id = nearest.id;
+  END IF;
+
+  RETURN QUERY SELECT
+    nearest.id,
+    nearest.query,
+    nearest.answer,
+    nearest.dist,
+    COALESCE(nearest.dist <= max_distance, false),
+    current_version;
+END;
+$$;
+
+-- Stores an answer and drops the user's entries for older board sets
+CREATE OR REPLACE FUNCTION store_semantic_cache(
+  query_user_id uuid,
+  p_model text,
+  p_query text,
+  query_embedding VECTOR(1024),
+  p_board_set_version bigint,
+  p_answer jsonb,
+  max_entries INT DEFAULT 200
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  DELETE FROM semantic_answer_cache
+  WHERE user_id = query_user_id AND board_set_version < p_board_set_version;
+
+  INSERT INTO semantic_answer_cache (user_id, model, query, embedding, board_set_version, answer)
+  VALUES (query_user_id, p_model, p_query, query_embedding, p_board_set_version, p_answer);
+
+  DELETE FROM semantic_answer_cache
+  WHERE id IN (
+    SELECT id FROM semantic_answer_cache
+    WHERE user_id = query_user_id
+    ORDER BY created_at DESC
+    OFFSET max_entries
+  );
+END;
+$$;
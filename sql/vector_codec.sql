@@ -0,0 +1,142 @@
+-- Compact vector transfer for RPCs.
+--
+-- PostgREST RPC parameters travel as JSON, so a 1024-float vector is ~20 KB of
+-- decimal text to format, send and parse. These functions accept the raw
+-- little-endian IEEE-754 bytes instead, base64-encoded: 5.5 KB for float32,
+-- 2.7 KB for float16 (lossy, ~3 significant digits). See
+-- lambda/shared/archive_common/vector_codec.py for the encoder.
+--
+-- Requires sql/match_boards_quantized.sql and sql/embedding_backfill.sql.
+CREATE OR REPLACE FUNCTION vector_from_float32(p_bytes bytea)
+RETURNS vector
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+  SELECT array_agg(
+    (CASE WHEN sign_bit = 1 THEN -1 ELSE 1 END) *
+    (CASE
+       WHEN exponent = 0 THEN mantissa * power(2::float8, -149)
+       ELSE (1 + mantissa / 8388608.0::float8) * power(2::float8, exponent - 127)
+     END)
+    ORDER BY i
+  )::real[]::vector
+  FROM (
+    SELECT i, bits / 2147483648 AS sign_bit, (bits / 8388608) % 256 AS exponent, bits % 8388608 AS mantissa
+    FROM (
+      SELECT i,
+             get_byte(p_bytes, 4 * i)
+             + get_byte(p_bytes, 4 * i + 1) * 256
+             + get_byte(p_bytes, 4 * i + 2) * 65536
+             + get_byte(p_bytes, 4 * i + 3)::bigint * 16777216 AS bits
+      FROM generate_series(0, length(p_bytes) / 4 - 1) AS i
+    ) raw
+  ) parts;
+$$;
+
+CREATE OR REPLACE FUNCTION vector_from_float16(p_bytes bytea)
+RETURNS vector
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+  SELECT array_agg(
+    (CASE WHEN sign_bit = 1 THEN -1 ELSE 1 END) *
+    (CASE
+       WHEN exponent = 0 THEN mantissa * power(2::float8, -24)
+       ELSE (1 + mantissa / 1024.0::float8) * power(2::float8, exponent - 15)
+     END)
+    ORDER BY i
+  )::real[]::vector
+  FROM (
+    SELECT i, bits / 32768 AS sign_bit, (bits / 1024) % 32 AS exponent, bits % 1024 AS mantissa
+    FROM (
+      SELECT i, get_byte(p_bytes, 2 * i) + get_byte(p_bytes, 2 * i + 1) * 256 AS bits
+      FROM generate_series(0, length(p_bytes) / 2 - 1) AS i
+    ) raw
+  ) parts;
+$$;
+
+-- p_format: 'float32' or 'float16'
+CREATE OR REPLACE FUNCTION vector_from_b64(p_data text, p_format text DEFAULT 'float32')
+RETURNS vector
+LANGUAGE plpgsql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+BEGIN
+  IF p_format = 'float32' THEN
+    RETURN vector_from_float32(decode(p_data, 'base64'));
+  ELSIF p_format = 'float16' THEN
+    RETURN vector_from_float16(decode(p_data, 'base64'));
+  END IF;
+  RAISE EXCEPTION 'Unknown vector format: %', p_format;
+END;
+$$;
+
+-- match_boards / match_boards_quantized with a base64 query embedding
+CREATE OR REPLACE FUNCTION match_boards_b64(
+  query_embedding_b64 text,
+  query_user_id uuid,
+  match_threshold FLOAT DEFAULT 0.5,
+  match_count INT DEFAULT 10,
+  vector_format text DEFAULT 'float32',
+  search_mode text DEFAULT 'exact'
+)
+RETURNS TABLE (
+  board_id uuid,
+  user_id uuid,
+  description text,
+  date date,
+  similarity FLOAT
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  query_embedding VECTOR(1024) := vector_from_b64(query_embedding_b64, vector_format);
+BEGIN
+  IF search_mode = 'exact' THEN
+    RETURN QUERY SELECT * FROM match_boards(query_embedding, query_user_id, match_threshold, match_count);
+  ELSE
+    RETURN QUERY SELECT * FROM match_boards_quantized(
+      query_embedding, query_user_id, match_threshold, match_count, search_mode
+    );
+  END IF;
+END;
+$$;
+
+-- Vector write for embedding-lambda; returns the number of rows updated.
+-- Stored vectors are float32 only: float16 would store the rounding error in
+-- every board, so it is accepted for query embeddings (match_boards_b64) alone.
+CREATE OR REPLACE FUNCTION set_board_vector_b64(
+  p_board_id uuid,
+  p_user_id uuid,
+  p_vector text,
+  p_model text,
+  p_format text DEFAULT 'float32',
+  p_vector_next text DEFAULT NULL,
+  p_next_model text DEFAULT NULL
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated INT;
+BEGIN
+  IF p_format IS DISTINCT FROM 'float32' THEN
+    RAISE EXCEPTION 'Stored vectors must be float32, got %', p_format;
+  END IF;
+  IF p_vector_next IS NULL THEN
+    UPDATE board
+    SET vector = vector_from_b64(p_vector, p_format),
+        embedding_model = p_model
+    WHERE board_id = p_board_id AND user_id = p_user_id;
+  ELSE
+    UPDATE board
+    SET vector = vector_from_b64(p_vector, p_format),
+        embedding_model = p_model,
+        vector_next = vector_from_b64(p_vector_next, p_format),
+        embedding_model_next = p_next_model
+    WHERE board_id = p_board_id AND user_id = p_user_id;
+  END IF;
+  GET DIAGNOSTICS updated = ROW_COUNT;
+  RETURN updated;
+END;
+$$;